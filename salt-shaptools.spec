@@ -46,8 +46,12 @@ Salt modules and states for SAP Applications and SLE-HA components management
 pwd
 mkdir -p %{buildroot}/srv/salt/_modules
 mkdir -p %{buildroot}/srv/salt/_states
+mkdir -p %{buildroot}/srv/salt/_grains
+mkdir -p %{buildroot}/srv/salt/_beacons
 cp -R salt/modules/hanamod.py %{buildroot}/srv/salt/_modules
 cp -R salt/states/hanamod.py %{buildroot}/srv/salt/_states
+cp -R salt/grains/hanamod.py %{buildroot}/srv/salt/_grains
+cp -R salt/beacons/hanamod.py %{buildroot}/srv/salt/_beacons
 cp -R salt/modules/crmshmod.py %{buildroot}/srv/salt/_modules
 cp -R salt/states/crmshmod.py %{buildroot}/srv/salt/_states
 cp -R salt/modules/drbdmod.py %{buildroot}/srv/salt/_modules
@@ -69,9 +73,13 @@ cp -R salt/states/sapcarmod.py %{buildroot}/srv/salt/_states
 %endif
 /srv/salt/_modules
 /srv/salt/_states
+/srv/salt/_grains
+/srv/salt/_beacons
 
 %dir %attr(0755, root, salt) /srv/salt
 %dir %attr(0755, root, salt) /srv/salt/_modules
 %dir %attr(0755, root, salt) /srv/salt/_states
+%dir %attr(0755, root, salt) /srv/salt/_grains
+%dir %attr(0755, root, salt) /srv/salt/_beacons
 
 %changelog
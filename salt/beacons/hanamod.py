@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+'''
+Beacon to watch the SAP HANA system replication state
+
+.. versionadded:: pending
+
+:maturity:      alpha
+:depends:       python-shaptools
+:platform:      all
+
+:configuration: The beacon uses the hana execution module, so the sid, inst and password
+    values might be taken from the minion configuration as well. An event is only sent when
+    the running status, the system replication state or the replication status (if the
+    ``replication`` connection data is set) changes, including the old and new values.
+
+:usage:
+
+.. code-block:: yaml
+
+    beacons:
+      hana:
+        - sid: 'prd'
+        - inst: '00'
+        - password: 'Qwerty1234'
+        - replication:
+            host: 'hana01'
+            port: 30013
+            user: 'SYSTEM'
+            password: 'Qwerty1234'
+        - interval: 10
+'''
+
+# Import Python libs
+from __future__ import absolute_import, unicode_literals, print_function
+
+import logging
+
+from salt import exceptions
+
+
+__virtualname__ = 'hana'
+
+HANA_BEACON_KEY = 'hana.beacon'
+REPLICATION_KEYS = ['host', 'port', 'user', 'password']
+
+LOGGER = logging.getLogger(__name__)
+
+
+def __virtual__():  # pragma: no cover
+    '''
+    Only load if the hana module is in __salt__
+    '''
+    if 'hana.status_snapshot' in __salt__:
+        return __virtualname__
+    return (False, 'The hana beacon cannot be loaded: hana execution module is not available')
+
+
+def _parse_config(config):
+    '''
+    Get dictionary type configuration from the beacon list type configuration
+    '''
+    output = {}
+    for item in config:
+        output.update(item)
+    return output
+
+
+def validate(config):
+    '''
+    Validate the beacon configuration
+    '''
+    if not isinstance(config, list):
+        return False, 'Configuration for hana beacon must be a list'
+    config = _parse_config(config)
+    replication = config.get('replication')
+    if replication is not None:
+        if not isinstance(replication, dict) or \
+                any(key not in replication for key in REPLICATION_KEYS):
+            return False, 'replication configuration for hana beacon must be a dictionary '\
+                'with {} keys'.format(', '.join(REPLICATION_KEYS))
+    return True, 'Valid beacon configuration'
+
+
+def _get_status(config):
+    '''
+    Get the current running status, system replication state and replication status
+    '''
+    snapshot = __salt__['hana.status_snapshot'](
+        sid=config.get('sid'), inst=config.get('inst'), password=config.get('password'),
+        ttl=0)
+    status = {'running': snapshot['running'], 'sr_state': snapshot['sr_state']}
+    replication = config.get('replication')
+    if replication and snapshot['running'] and snapshot['sr_state'] == 'PRIMARY':
+        replication_status = __salt__['hana.sr_replication_status'](
+            host=replication['host'], port=replication['port'], user=replication['user'],
+            password=replication['password'])
+        status['replication'] = {
+            service: data['status']
+            for service, data in replication_status['services'].items()}
+        status['synced'] = replication_status['synced']
+    return status
+
+
+def beacon(config):
+    '''
+    Watch the SAP HANA system replication state and send an event when it changes
+
+    Example event data:
+
+    .. code-block:: python
+
+        {'tag': 'prd/00',
+         'sid': 'prd',
+         'inst': '00',
+         'old': {'running': True, 'sr_state': 'SECONDARY'},
+         'new': {'running': True, 'sr_state': 'PRIMARY'}}
+    '''
+    config = _parse_config(config)
+    try:
+        status = _get_status(config)
+    except (exceptions.CommandExecutionError, exceptions.SaltInvocationError) as err:
+        LOGGER.warning('HANA status cannot be retrieved by the hana beacon: %s', err)
+        return []
+
+    sid = config.get('sid') or __salt__['config.option']('hana.sid')
+    inst = config.get('inst') or __salt__['config.option']('hana.inst')
+    key = '{}-{}'.format(sid, inst)
+    previous = __context__.setdefault(HANA_BEACON_KEY, {}).get(key)
+    __context__[HANA_BEACON_KEY][key] = status
+    if previous is None or previous == status:
+        return []
+    return [{
+        'tag': '{}/{}'.format(sid, inst),
+        'sid': sid,
+        'inst': inst,
+        'old': previous,
+        'new': status
+    }]
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+'''
+Grains module to provide SAP HANA information to Salt
+
+.. versionadded:: pending
+
+:maturity:      alpha
+:platform:      all
+
+:configuration: The installed systems are discovered reading /usr/sap/sapservices and the
+    /hana/shared folder, and the system replication role reading the global.ini file of
+    every system, so no sapcontrol or hdbnsutil command is executed. The system replication
+    data is cached in the minion cache directory and only read again when the global.ini file
+    changes or after ``hana.grains_ttl`` seconds (300 by default).
+
+:usage:
+
+.. code-block:: bash
+
+    salt -C 'G@hana:sr_state:PRIMARY' test.ping
+    salt -C 'G@hana:sids:PRD' test.ping
+'''
+
+# Import Python libs
+from __future__ import absolute_import, unicode_literals, print_function
+
+import logging
+import os
+import re
+import json
+import time
+
+from salt.utils import files as salt_files
+
+
+__virtualname__ = 'hana'
+
+SAPSERVICES_FILE = '/usr/sap/sapservices'
+HANA_SHARED_FOLDER = '/hana/shared'
+GLOBAL_INI_FILE = '/usr/sap/{sid}/SYS/global/hdb/custom/config/global.ini'
+GRAINS_CACHE_FILE = 'hana_grains.json'
+SR_STATE_TTL = 300
+# Both sapservices formats (plain sapstartsrv command or systemd) include the profile path
+SAPSERVICES_PATTERN = re.compile(r'pf=/usr/sap/([A-Z][A-Z0-9]{2})/SYS/profile/\w+_HDB(\d{2})_')
+SID_PATTERN = re.compile(r'^[A-Z][A-Z0-9]{2}$')
+INSTANCE_PATTERN = re.compile(r'^HDB(\d{2})$')
+SR_SECONDARY_MODES = ['sync', 'syncmem', 'async']
+
+LOGGER = logging.getLogger(__name__)
+
+
+def __virtual__():  # pragma: no cover
+    '''
+    Only load if SAP HANA might be installed in the host
+    '''
+    if os.path.exists(SAPSERVICES_FILE) or os.path.isdir(HANA_SHARED_FOLDER):
+        return __virtualname__
+    return (False, 'The hana grains cannot be loaded: SAP HANA is not installed')
+
+
+def _read_sapservices():
+    '''
+    Get the HANA systems and instance numbers registered in the sapservices file
+    '''
+    instances = {}
+    try:
+        with salt_files.fopen(SAPSERVICES_FILE, 'r') as sapservices_ptr:
+            for line in sapservices_ptr:
+                found = SAPSERVICES_PATTERN.search(line)
+                if found and not line.lstrip().startswith('#'):
+                    instances[found.group(1)] = found.group(2)
+    except (IOError, OSError):
+        pass
+    return instances
+
+
+def _read_hana_shared():
+    '''
+    Get the HANA systems and instance numbers from the /hana/shared/<SID>/HDB<inst> folders
+    '''
+    instances = {}
+    try:
+        sids = [sid for sid in os.listdir(HANA_SHARED_FOLDER) if SID_PATTERN.match(sid)]
+    except OSError:
+        return instances
+    for sid in sids:
+        try:
+            folders = os.listdir(os.path.join(HANA_SHARED_FOLDER, sid))
+        except OSError:
+            continue
+        for folder in sorted(folders):
+            found = INSTANCE_PATTERN.match(folder)
+            if found:
+                instances[sid] = found.group(1)
+                break
+    return instances
+
+
+def _read_sr_config(ini_file):
+    '''
+    Get the system replication role, site name and mode from the system_replication section
+    of the global.ini file
+    '''
+    values = {}
+    section = None
+    try:
+        with salt_files.fopen(ini_file, 'r') as ini_ptr:
+            for line in ini_ptr:
+                line = line.strip()
+                if line.startswith('['):
+                    section = line.strip('[]').strip()
+                elif section == 'system_replication' and '=' in line:
+                    key, value = line.split('=', 1)
+                    values[key.strip()] = value.strip()
+    except (IOError, OSError):
+        pass
+
+    mode = values.get('actual_mode', values.get('mode', 'none')).lower()
+    if mode == 'primary':
+        sr_state = 'PRIMARY'
+    elif mode in SR_SECONDARY_MODES:
+        sr_state = 'SECONDARY'
+    else:
+        sr_state = 'DISABLED'
+    return {
+        'sr_state': sr_state,
+        'sr_site': values.get('site_name') if sr_state != 'DISABLED' else None,
+        'sr_mode': mode if sr_state != 'DISABLED' else None
+    }
+
+
+def _cache_path():
+    '''
+    Get the grains cache file path. None if the minion cache directory is not known
+    '''
+    cachedir = __opts__.get('cachedir')
+    return os.path.join(cachedir, GRAINS_CACHE_FILE) if cachedir else None
+
+
+def _load_cache(cache_path):
+    '''
+    Load the cached system replication data
+    '''
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with salt_files.fopen(cache_path, 'r') as cache_ptr:
+            return json.load(cache_ptr)
+    except (IOError, OSError, ValueError) as err:
+        LOGGER.debug('HANA grains cache %s cannot be read: %s', cache_path, err)
+        return {}
+
+
+def _save_cache(cache_path, cache):
+    '''
+    Store the system replication data
+    '''
+    if not cache_path:
+        return
+    try:
+        with salt_files.fopen(cache_path, 'w') as cache_ptr:
+            json.dump(cache, cache_ptr)
+    except (IOError, OSError) as err:
+        LOGGER.debug('HANA grains cache %s cannot be stored: %s', cache_path, err)
+
+
+def hana_grains():
+    '''
+    Get the installed SAP HANA systems and their system replication role
+
+    Returns:
+        dict: hana grain with the sids and sr_state lists (to be used in the targeting) and the
+        instance number, sr_state, sr_site and sr_mode of every system
+    '''
+    instances = _read_hana_shared()
+    instances.update(_read_sapservices())
+    if not instances:
+        return {}
+
+    ttl = __opts__.get('hana.grains_ttl', SR_STATE_TTL)
+    cache_path = _cache_path()
+    cache = _load_cache(cache_path)
+    current_time = time.time()
+    changed = set(cache) != set(instances)
+    systems = {}
+    for sid, inst in sorted(instances.items()):
+        ini_file = GLOBAL_INI_FILE.format(sid=sid)
+        try:
+            mtime = os.path.getmtime(ini_file)
+        except OSError:
+            mtime = None
+        cached = cache.get(sid)
+        if not cached or cached['mtime'] != mtime or current_time - cached['time'] >= ttl:
+            cached = {'mtime': mtime, 'time': current_time, 'sr': _read_sr_config(ini_file)}
+            cache[sid] = cached
+            changed = True
+        systems[sid] = dict(cached['sr'], inst=inst)
+
+    if changed:
+        _save_cache(cache_path, {sid: cache[sid] for sid in systems})
+    return {'hana': {
+        'sids': sorted(systems),
+        'sr_state': sorted(set(system['sr_state'] for system in systems.values())),
+        'systems': systems
+    }}
@@ -17,6 +17,30 @@ Module to provide SAP HANA functionality to Salt
     hana.sid: 'prd'
     hana.inst: '00'
     hana.password: 'Qwerty1234'
+
+    The opened database connections are kept in a pool during the minion
+    process lifetime to be reused by the next queries. The pool behaviour
+    can be tuned with these options (set ``hana.pool_max_size`` to 0 to
+    disable it):
+
+.. code-block:: yaml
+
+    hana.pool_max_size: 8
+    hana.pool_idle_timeout: 300
+
+    The status returned by ``hana.status_snapshot`` is cached during
+    ``hana.status_ttl`` seconds (10 by default).
+
+    The content of the SAP software media folders (LABEL.ASC and LABELIDX.ASC
+    files) is indexed in the minion cache directory, and refreshed when the
+    folders modification time changes. Sibling folders are read concurrently
+    using up to ``hana.media_scan_threads`` threads (8 by default).
+
+    The duration and result of the lifecycle operations (install, start, stop,
+    system replication and backup operations) are stored in the minion cache
+    directory and can be retrieved with ``hana.timings``. Set
+    ``hana.timing_events`` to True to send a ``salt/hana/<operation>/timing``
+    event after each operation as well.
 '''
 
 
@@ -28,17 +52,32 @@ import time
 import re
 import sys
 import os
+import contextlib
+import functools
+import inspect
+import threading
+import binascii
+import datetime
+import decimal
+import json
+import hashlib
+import random
+import socket
+import tarfile
+import fnmatch
+from multiprocessing.pool import ThreadPool
 
 if sys.version_info.major == 2: # pragma: no cover
     import imp
+    from salt.utils.decorators.signature import identical_signature_wrapper
 
 # Import six - Python 2 and 3 compatibility library
 # Salt no longer vendors six (>=salt-3006.0)
 # https://github.com/saltstack/salt/issues/63874
 try:
-    from salt.ext.six.moves import reload_module
+    from salt.ext.six.moves import reload_module, shlex_quote
 except ImportError:
-    from six.moves import reload_module
+    from six.moves import reload_module, shlex_quote
 
 # Import salt libs
 from salt import exceptions
@@ -59,6 +98,40 @@ __virtualname__ = 'hana'
 
 LABEL_FILE = 'LABEL.ASC'
 LABELIDX_FILE = 'LABELIDX.ASC'
+MEDIA_INDEX_KEY = 'hana.media_index'
+MEDIA_INDEX_FILE = 'hana_media_index.json'
+MEDIA_SCAN_THREADS = 8
+PYDBAPI_MANIFEST_FILE = '.pydbapi_manifest.json'
+MEDIA_COMPONENTS = {
+    'HDB_SERVER': '^HDB_SERVER:{version}.*:{platform}:.*',
+    'HDB_CLIENT': '^HDB_CLIENT:{version}.*:{platform}:.*',
+}
+
+HANA_INSTANCES_KEY = 'hana.instances'
+HANA_STATUS_KEY = 'hana.status'
+HANA_STATUS_TTL = 10
+HDB_POOL_KEY = 'hana.hdb_pool'
+HDB_POOL_MAX_SIZE = 8
+HDB_POOL_IDLE_TIMEOUT = 300
+QUERY_CHUNK_SIZE = 1000
+PORT_PROBE_TIMEOUT = 1
+MEMINFO_FILE = '/proc/meminfo'
+# SAP default global_allocation_limit: 90% of the first 64 GB and 97% of the rest (in MB)
+GAL_DEFAULT_THRESHOLD = 64 * 1024
+PRELOAD_LOAD_THREADS = 4
+HANA_TIMINGS_KEY = 'hana.timings'
+HANA_TIMINGS_FILE = 'hana_timings.jsonl'
+HANA_TIMINGS_MAX_ENTRIES = 500
+# The timings file is compacted to the last HANA_TIMINGS_MAX_ENTRIES records when it's bigger
+HANA_TIMINGS_MAX_SIZE = 512 * 1024
+_TIMINGS_LOCK = threading.Lock()
+HANA_INVENTORY_GRAIN = 'hana_inventory'
+HANA_CONFIG_FOLDER = '/usr/sap/{sid}/SYS/global/hdb/custom/config'
+SSH_PORT = 22
+# Source of the shared folder mount and the ids of the <sid>adm user, one value per line.
+# The values must be quoted with shlex_quote
+SCALE_OUT_FACTS_SCRIPT = "df -P {shared_path} | awk 'NR==2 {{print $1}}'; "\
+    "id -u {user} 2>/dev/null || echo -; id -g {user} 2>/dev/null || echo -"
 
 
 class SapFolderNotFoundError(Exception):
@@ -84,7 +157,8 @@ def _init(
         inst=None,
         password=None):
     '''
-    Returns an instance of the hana instance
+    Returns an instance of the hana instance. The instances are cached in the execution
+    context by sid, instance number and password hash
 
     sid
         HANA system id (PRD for example)
@@ -100,10 +174,185 @@ def _init(
     if password is None:
         password = __salt__['config.option']('hana.password', None)
 
-    try:
-        return hana.HanaInstance(sid, inst, password)
-    except TypeError as err:
-        raise exceptions.SaltInvocationError(err)
+    password_hash = hashlib.sha256('{}'.format(password).encode('utf-8')).hexdigest()
+    key = (sid, inst, password_hash)
+    instances = __context__.setdefault(HANA_INSTANCES_KEY, {})
+    if key not in instances:
+        try:
+            instances[key] = hana.HanaInstance(sid, inst, password)
+        except TypeError as err:
+            raise exceptions.SaltInvocationError(err)
+    return instances[key]
+
+
+def _invalidate(hana_inst=None):
+    '''
+    Remove a hana instance from the cache. Used after the calls changing the instance state.
+    All the status snapshots are removed if the instance is not given (installations)
+    '''
+    if hana_inst is None:
+        __context__.pop(HANA_STATUS_KEY, None)
+        return
+    instances = __context__.get(HANA_INSTANCES_KEY, {})
+    for key, value in list(instances.items()):
+        if value is hana_inst:
+            del instances[key]
+    __context__.get(HANA_STATUS_KEY, {}).pop(hana_inst, None)
+
+
+def _timings_path():
+    '''
+    Get the timings file path. None if the minion cache directory is not known
+    '''
+    cachedir = __opts__.get('cachedir')
+    return os.path.join(cachedir, HANA_TIMINGS_FILE) if cachedir else None
+
+
+def _read_timings_file(timings_path):
+    '''
+    Read the last timing records of the timings file (one JSON record per line)
+    '''
+    with salt_files.fopen(timings_path, 'r') as timings_ptr:
+        records = [json.loads(line) for line in timings_ptr if line.strip()]
+    return records[-HANA_TIMINGS_MAX_ENTRIES:]
+
+
+def _load_timings():
+    '''
+    Load the recorded timings from the minion cache directory (or the execution context)
+    '''
+    timings_path = _timings_path()
+    if timings_path and os.path.exists(timings_path):
+        try:
+            return _read_timings_file(timings_path)
+        except (IOError, OSError, ValueError) as err:
+            LOGGER.warning('Timings file %s cannot be read: %s', timings_path, err)
+    return list(__context__.get(HANA_TIMINGS_KEY, []))
+
+
+def _record_timing(record):
+    '''
+    Store an operation timing record and send it as an event if hana.timing_events is set.
+    The record is appended to the timings file, which is only rewritten to drop the oldest
+    records once it reaches HANA_TIMINGS_MAX_SIZE. The errors are only logged, as the
+    timings must not change the operation result
+    '''
+    with _TIMINGS_LOCK:
+        records = __context__.setdefault(HANA_TIMINGS_KEY, [])
+        records.append(record)
+        del records[:-HANA_TIMINGS_MAX_ENTRIES]
+        timings_path = _timings_path()
+        if timings_path:
+            try:
+                if not os.path.isdir(os.path.dirname(timings_path)):
+                    os.makedirs(os.path.dirname(timings_path))
+                with salt_files.fopen(timings_path, 'a') as timings_ptr:
+                    timings_ptr.write('{}\n'.format(json.dumps(record)))
+                if os.path.getsize(timings_path) > HANA_TIMINGS_MAX_SIZE:
+                    compacted = _read_timings_file(timings_path)
+                    with salt_files.fopen('{}.tmp'.format(timings_path), 'w') as timings_ptr:
+                        for compacted_record in compacted:
+                            timings_ptr.write('{}\n'.format(json.dumps(compacted_record)))
+                    os.rename('{}.tmp'.format(timings_path), timings_path)
+            except (IOError, OSError, ValueError) as err:
+                LOGGER.warning('Timings cannot be stored in %s: %s', timings_path, err)
+
+    if __salt__['config.option']('hana.timing_events', False):
+        try:
+            __salt__['event.send']('salt/hana/{}/timing'.format(record['operation']), record)
+        except Exception as err:  # pylint: disable=broad-except
+            LOGGER.warning('Timing event of %s cannot be sent: %s', record['operation'], err)
+
+
+def _timed(command):
+    '''
+    Decorator to record the duration and the result of a HANA operation
+
+    command
+        shaptools command run by the operation (HanaInstance.start for example)
+    '''
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            try:
+                call_args = inspect.getcallargs(func, *args, **kwargs)
+            except TypeError:
+                call_args = kwargs
+            record = {
+                'operation': func.__name__,
+                'command': command,
+                'sid': call_args.get('sid'),
+                'inst': call_args.get('inst'),
+                'start': time.time(),
+                'status': 'success'
+            }
+            try:
+                return func(*args, **kwargs)
+            except Exception as err:
+                record['status'] = 'error'
+                record['error'] = '{}'.format(err)
+                raise
+            finally:
+                record['duration'] = time.time() - record['start']
+                _record_timing(record)
+        # The wrapper must have the function signature, otherwise the loader passes the
+        # __pub_* arguments to it. inspect.signature follows __wrapped__ in python 3
+        if sys.version_info.major == 2:  # pragma: no cover
+            return identical_signature_wrapper(func, wrapper)
+        return functools.wraps(func)(wrapper)
+    return decorator
+
+
+def timings(
+        operation=None,
+        sid=None,
+        last=None,
+        summary=False):
+    '''
+    Get the recorded duration and result of the HANA lifecycle operations (install, start,
+    stop, system replication and backup operations)
+
+    operation
+        Get only the timings of this operation (start for example)
+    sid
+        Get only the timings of this HANA system
+    last
+        Get only the last N timings
+    summary
+        Return the number of executions, errors, and the average and maximum durations by
+        operation instead of the timings list
+
+    Returns:
+        list: Timing records (operation, shaptools command, sid, inst, start timestamp,
+        duration in seconds, status and error) from the oldest to the newest, or a dictionary
+        by operation if summary is set
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.timings operation=start last=5
+        salt '*' hana.timings summary=True
+    '''
+    records = [
+        record for record in _load_timings()
+        if (operation is None or record['operation'] == operation) and
+        (sid is None or record['sid'] == sid)]
+    if last:
+        records = records[-int(last):]
+    if not summary:
+        return records
+
+    operations = {}
+    for record in records:
+        data = operations.setdefault(
+            record['operation'], {'count': 0, 'errors': 0, 'average': 0, 'max': 0})
+        data['count'] += 1
+        data['errors'] += int(record['status'] != 'success')
+        data['average'] += record['duration']
+        data['max'] = max(data['max'], record['duration'])
+    for data in operations.values():
+        data['average'] = data['average'] / float(data['count'])
+    return operations
 
 
 def is_installed(
@@ -216,6 +465,7 @@ def update_hdb_pwd_file(
     except IOError as err:
         raise exceptions.CommandExecutionError(err)
 
+@_timed('HanaInstance.install')
 def install(
         software_path,
         conf_file,
@@ -246,13 +496,17 @@ def install(
             software_path, conf_file, root_user, root_password, hdb_pwd_file)
     except hana.HanaError as err:
         raise exceptions.CommandExecutionError(err)
+    finally:
+        _invalidate()
 
+@_timed('HanaInstance.add_hosts')
 def add_hosts(
         add_hosts,
         hdblcm_folder,
         root_user,
         root_password,
-        hdb_pwd_file):
+        hdb_pwd_file,
+        batch_size=None):
     '''
     Add additional hosts to SAP HANA system
 
@@ -266,18 +520,148 @@ def add_hosts(
         Root user password
     hdb_pwd_file
         Path where XML password file exists
+    batch_size
+        Number of hosts added by every hdblcm execution. All of them at once by default
+
+    Returns:
+        dict: Duration in seconds of the hdblcm execution that added every host
+
     CLI Example:
 
     .. code-block:: bash
 
         salt '*' hana.add_hosts hana03:role=standby,hana05:role=worker /hana/shared/SID/hdblcm root root /root/hdb_passwords.xml
     '''
+    entries = _parse_add_hosts(add_hosts)
+    batch_size = batch_size or len(entries)
+    durations = {}
+    for index in range(0, len(entries), batch_size):
+        batch = entries[index:index+batch_size]
+        start_time = time.time()
+        try:
+            hana.HanaInstance.add_hosts(
+                ','.join(entry for _, entry in batch), hdblcm_folder, root_user,
+                root_password, hdb_pwd_file)
+        except hana.HanaError as err:
+            raise exceptions.CommandExecutionError(err)
+        duration = time.time() - start_time
+        durations.update((host, duration) for host, _ in batch)
+    return durations
+
+
+def _parse_add_hosts(add_hosts):
+    '''
+    Split an hdblcm addhosts value (hana03:role=standby,hana05) in (host, entry) tuples
+    '''
+    if not isinstance(add_hosts, (list, tuple)):
+        add_hosts = add_hosts.split(',')
+    return [(entry.split(':')[0].strip(), entry.strip()) for entry in add_hosts if entry.strip()]
+
+
+def _get_host_facts(run_all, host, shared_path, user, timeout):
+    '''
+    Get the shared folder mount source and the <sid>adm user ids of a host (the current one
+    if host is None). The remote hosts are checked using ssh in batch mode. The cmd.run_all
+    function is given, as the loader dunders are not available in the worker threads
+    '''
+    script = SCALE_OUT_FACTS_SCRIPT.format(
+        shared_path=shlex_quote(shared_path), user=shlex_quote(user))
+    if host is None:
+        result = run_all(script, python_shell=True)
+    else:
+        # ssh joins the command arguments and runs them with the remote user shell, so the
+        # script is quoted again to be run by sh
+        result = run_all(
+            ['ssh', '-o', 'BatchMode=yes', '-o', 'ConnectTimeout={}'.format(timeout), '--',
+             host, 'sh', '-c', shlex_quote(script)], python_shell=False)
+    lines = result['stdout'].splitlines()
+    if result['retcode'] or len(lines) < 3:
+        raise exceptions.CommandExecutionError(
+            'facts cannot be retrieved: {}'.format(result['stderr'] or result['stdout']))
+    return {'shared': lines[0], 'uid': lines[1], 'gid': lines[2]}
+
+
+def validate_hosts(
+        add_hosts,
+        sid,
+        shared_path='/hana/shared',
+        parallel=None,
+        timeout=10):
+    '''
+    Validate concurrently the hosts to be added to a scale-out system before running hdblcm.
+    For every host it checks that the ssh port is reachable, the shared folder is mounted
+    from the same source as in the current host and the <sid>adm user (if it already exists)
+    has the same uid and gid as in the current host
+
+    add_hosts
+        hosts to add (same format as in hdblcm config)
+    sid
+        HANA system id
+    shared_path
+        HANA shared folder path
+    parallel
+        Maximum number of hosts validated at the same time. All of them by default
+    timeout
+        ssh connection timeout in seconds
+
+    Returns:
+        dict: Overall validation result, the result, errors and duration of every host and
+        warnings (the <sid>adm user ids are not checked if the user doesn't exist in the
+        current host)
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.validate_hosts hana03:role=standby,hana05:role=worker prd
+    '''
+    hosts = [host for host, _ in _parse_add_hosts(add_hosts)]
+    if not hosts:
+        raise exceptions.SaltInvocationError('add_hosts must be provided')
+    user = '{}adm'.format(sid.lower())
+    run_all = __salt__['cmd.run_all']
     try:
-        hana.HanaInstance.add_hosts(
-            add_hosts, hdblcm_folder, root_user, root_password, hdb_pwd_file)
-    except hana.HanaError as err:
-        raise exceptions.CommandExecutionError(err)
+        reference = _get_host_facts(run_all, None, shared_path, user, timeout)
+    except exceptions.CommandExecutionError as err:
+        raise exceptions.CommandExecutionError('Current host {}'.format(err))
+    warnings = []
+    check_ids = reference['uid'] != '-'
+    if not check_ids:
+        warnings.append(
+            '{} user does not exist in the current host, its uid/gid are not checked'.format(
+                user))
+
+    def _validate(host):
+        start_time = time.time()
+        errors = []
+        if not _is_port_open(host, SSH_PORT, timeout):
+            errors.append('ssh port {} is not reachable'.format(SSH_PORT))
+        else:
+            try:
+                facts = _get_host_facts(run_all, host, shared_path, user, timeout)
+            except exceptions.CommandExecutionError as err:
+                errors.append('{}'.format(err))
+            else:
+                if facts['shared'] != reference['shared']:
+                    errors.append('{} is mounted from {} instead of {}'.format(
+                        shared_path, facts['shared'], reference['shared']))
+                if check_ids and facts['uid'] != '-' and (facts['uid'], facts['gid']) != (
+                        reference['uid'], reference['gid']):
+                    errors.append('{} user has uid/gid {}/{} instead of {}/{}'.format(
+                        user, facts['uid'], facts['gid'], reference['uid'], reference['gid']))
+        return host, {
+            'valid': not errors, 'errors': errors, 'duration': time.time() - start_time}
+
+    workers = ThreadPool(parallel or len(hosts))
+    try:
+        results = dict(workers.map(_validate, hosts))
+    finally:
+        workers.close()
+    return {'valid': all(result['valid'] for result in results.values()), 'hosts': results,
+            'warnings': warnings}
 
+
+@_timed('HanaInstance.uninstall')
 def uninstall(
         root_user,
         root_password,
@@ -315,6 +699,8 @@ def uninstall(
         hana_inst.uninstall(root_user, root_password, **kwargs)
     except hana.HanaError as err:
         raise exceptions.CommandExecutionError(err)
+    finally:
+        _invalidate(hana_inst)
 
 
 def is_running(
@@ -344,6 +730,59 @@ def is_running(
     return hana_inst.is_running()
 
 
+def status_snapshot(
+        sid=None,
+        inst=None,
+        password=None,
+        ttl=None):
+    '''
+    Get the installation, running and system replication status of SAP HANA in one call.
+    The status is cached during ttl seconds and cleared by the calls changing the instance
+    state (start, stop, sr_* operations, etc)
+
+    sid
+        HANA system id (PRD for example)
+    inst
+        HANA instance number (00 for example)
+    password
+        HANA instance password
+    ttl
+        Seconds to reuse the cached status. hana.status_ttl option value is used by default.
+        Set 0 to get the current status
+
+    Returns:
+        dict: installed and running booleans and sr_state (PRIMARY, SECONDARY or DISABLED,
+        None if HANA is not installed)
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.status_snapshot prd '"00"' pass
+    '''
+    hana_inst = _init(sid, inst, password)
+    if ttl is None:
+        ttl = __salt__['config.option']('hana.status_ttl', HANA_STATUS_TTL)
+
+    snapshots = __context__.setdefault(HANA_STATUS_KEY, {})
+    current_time = time.time()
+    if hana_inst in snapshots:
+        snapshot_time, snapshot = snapshots[hana_inst]
+        if current_time - snapshot_time < ttl:
+            return dict(snapshot)
+
+    snapshot = {'installed': hana_inst.is_installed(), 'running': False, 'sr_state': None}
+    # The rest of the commands would fail if HANA is not installed
+    if snapshot['installed']:
+        snapshot['running'] = hana_inst.is_running()
+        try:
+            snapshot['sr_state'] = hana_inst.get_sr_state()
+        except hana.HanaError as err:
+            raise exceptions.CommandExecutionError(err)
+    snapshots[hana_inst] = (current_time, snapshot)
+    return dict(snapshot)
+
+
 # pylint:disable=W1401
 def get_version(
         sid=None,
@@ -372,6 +811,91 @@ def get_version(
         raise exceptions.CommandExecutionError(err)
 
 
+def _get_tenants(sid):
+    '''
+    Get the tenant databases names from the custom configuration folders (DB_<TENANT>)
+    '''
+    config_folder = HANA_CONFIG_FOLDER.format(sid=sid.upper())
+    try:
+        folders = os.listdir(config_folder)
+    except OSError:
+        return []
+    return sorted(folder[3:] for folder in folders if folder.startswith('DB_'))
+
+
+def inventory(
+        sid=None,
+        inst=None,
+        password=None,
+        cache_ttl=None):
+    '''
+    Get the SAP HANA instance inventory in one call: installation and running status,
+    version, system replication state, site name and mode and the tenants list. Meant to be
+    used to collect the status of many minions with one publish
+
+    sid
+        HANA system id (PRD for example)
+    inst
+        HANA instance number (00 for example)
+    password
+        HANA instance password
+    cache_ttl
+        Store the inventory in the hana_inventory grain and reuse it during cache_ttl seconds.
+        Not cached by default
+
+    Returns:
+        dict: sid, inst, installed, running, version, sr_state, sr_site, sr_mode,
+        sr_operation_mode, tenants and the timestamp when the data was collected
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.inventory prd '"00"' pass
+        salt '*' hana.inventory prd '"00"' pass cache_ttl=300
+    '''
+    hana_inst = _init(sid, inst, password)
+    key = '{}-{}'.format(hana_inst.sid, hana_inst.inst)
+    current_time = time.time()
+    if cache_ttl:
+        cached = __grains__.get(HANA_INVENTORY_GRAIN, {}).get(key)
+        if cached and current_time - cached.get('timestamp', 0) < cache_ttl:
+            return cached
+
+    snapshot = status_snapshot(sid, inst, password)
+    data = {
+        'sid': hana_inst.sid,
+        'inst': hana_inst.inst,
+        'installed': snapshot['installed'],
+        'running': snapshot['running'],
+        'version': None,
+        'sr_state': snapshot['sr_state'],
+        'sr_site': None,
+        'sr_mode': None,
+        'sr_operation_mode': None,
+        'tenants': [],
+        'timestamp': current_time
+    }
+    if snapshot['installed']:
+        try:
+            data['version'] = hana_inst.get_version()
+            if data['sr_state'] != 'DISABLED':
+                details = hana_inst.get_sr_state_details()
+                data['sr_site'] = details.get('site name')
+                data['sr_mode'] = details.get('mode')
+                data['sr_operation_mode'] = details.get('operation mode')
+        except hana.HanaError as err:
+            raise exceptions.CommandExecutionError(err)
+        data['tenants'] = _get_tenants(hana_inst.sid)
+
+    if cache_ttl:
+        cached = dict(__grains__.get(HANA_INVENTORY_GRAIN, {}))
+        cached[key] = data
+        __salt__['grains.setval'](HANA_INVENTORY_GRAIN, cached)
+    return data
+
+
+@_timed('HanaInstance.start')
 def start(
         sid=None,
         inst=None,
@@ -397,8 +921,11 @@ def start(
         hana_inst.start()
     except hana.HanaError as err:
         raise exceptions.CommandExecutionError(err)
+    finally:
+        _invalidate(hana_inst)
 
 
+@_timed('HanaInstance.stop')
 def stop(
         sid=None,
         inst=None,
@@ -424,6 +951,8 @@ def stop(
         hana_inst.stop()
     except hana.HanaError as err:
         raise exceptions.CommandExecutionError(err)
+    finally:
+        _invalidate(hana_inst)
 
 
 def get_sr_state(
@@ -456,6 +985,99 @@ def get_sr_state(
         raise exceptions.CommandExecutionError(err)
 
 
+def _run_many(action, instances, password, parallel):
+    '''
+    Run an instance action (hana.start or hana.stop) in several HANA instances concurrently.
+    The action is run through the loader function, got here as the loader dunders are not
+    available in the worker threads
+    '''
+    if not instances:
+        raise exceptions.SaltInvocationError('instances must be provided')
+    parsed_instances = []
+    for instance in instances:
+        if not isinstance(instance, dict) or 'sid' not in instance or 'inst' not in instance:
+            raise exceptions.SaltInvocationError(
+                'Every instance must be a dictionary with sid, inst and optionally password '
+                'values')
+        parsed_instances.append(
+            (instance['sid'], instance['inst'], instance.get('password', password)))
+    action = __salt__[action]
+
+    def _run(instance):
+        sid, inst, inst_password = instance
+        start_time = time.time()
+        try:
+            action(sid=sid, inst=inst, password=inst_password)
+            result = {'result': True}
+        except (exceptions.CommandExecutionError, exceptions.SaltInvocationError) as err:
+            result = {'result': False, 'comment': '{}'.format(err)}
+        result['duration'] = time.time() - start_time
+        return '{}-{}'.format(sid, inst), result
+
+    workers = ThreadPool(parallel or len(parsed_instances))
+    try:
+        return dict(workers.map(_run, parsed_instances))
+    finally:
+        workers.close()
+
+
+def start_many(
+        instances,
+        password=None,
+        parallel=None):
+    '''
+    Start several HANA instances (running in the same host for example) concurrently
+
+    instances
+        List of instances. Each entry is a dictionary with sid, inst and optionally password
+        values
+    password
+        HANA instances password, used if it's not set in the instance entry
+    parallel
+        Maximum number of instances started at the same time. All of them by default
+
+    Returns:
+        dict: Result, duration and error comment (if it fails) of every instance, with
+        SID-INSTANCE as key
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.start_many '[{"sid": "prd", "inst": "00"}, {"sid": "qas", "inst": "01"}]' pass
+    '''
+    return _run_many('hana.start', instances, password, parallel)
+
+
+def stop_many(
+        instances,
+        password=None,
+        parallel=None):
+    '''
+    Stop several HANA instances (running in the same host for example) concurrently
+
+    instances
+        List of instances. Each entry is a dictionary with sid, inst and optionally password
+        values
+    password
+        HANA instances password, used if it's not set in the instance entry
+    parallel
+        Maximum number of instances stopped at the same time. All of them by default
+
+    Returns:
+        dict: Result, duration and error comment (if it fails) of every instance, with
+        SID-INSTANCE as key
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.stop_many '[{"sid": "prd", "inst": "00"}, {"sid": "qas", "inst": "01"}]' pass
+    '''
+    return _run_many('hana.stop', instances, password, parallel)
+
+
+@_timed('HanaInstance.sr_enable_primary')
 def sr_enable_primary(
         name,
         sid=None,
@@ -484,8 +1106,11 @@ def sr_enable_primary(
         hana_inst.sr_enable_primary(name)
     except hana.HanaError as err:
         raise exceptions.CommandExecutionError(err)
+    finally:
+        _invalidate(hana_inst)
 
 
+@_timed('HanaInstance.sr_disable_primary')
 def sr_disable_primary(
         sid=None,
         inst=None,
@@ -511,8 +1136,11 @@ def sr_disable_primary(
         hana_inst.sr_disable_primary()
     except hana.HanaError as err:
         raise exceptions.CommandExecutionError(err)
+    finally:
+        _invalidate(hana_inst)
 
 
+@_timed('HanaInstance.sr_register_secondary')
 def sr_register_secondary(
         name,
         remote_host,
@@ -572,8 +1200,11 @@ def sr_register_secondary(
             **kwargs)
     except hana.HanaError as err:
         raise exceptions.CommandExecutionError(err)
+    finally:
+        _invalidate(hana_inst)
 
 
+@_timed('HanaInstance.sr_changemode_secondary')
 def sr_changemode_secondary(
         new_mode,
         sid=None,
@@ -602,8 +1233,11 @@ def sr_changemode_secondary(
         hana_inst.sr_changemode_secondary(new_mode)
     except hana.HanaError as err:
         raise exceptions.CommandExecutionError(err)
+    finally:
+        _invalidate(hana_inst)
 
 
+@_timed('HanaInstance.sr_unregister_secondary')
 def sr_unregister_secondary(
         primary_name,
         sid=None,
@@ -632,6 +1266,8 @@ def sr_unregister_secondary(
         hana_inst.sr_unregister_secondary(primary_name)
     except hana.HanaError as err:
         raise exceptions.CommandExecutionError(err)
+    finally:
+        _invalidate(hana_inst)
 
 
 def check_user_key(
@@ -710,6 +1346,7 @@ def create_user_key(
         raise exceptions.CommandExecutionError(err)
 
 
+@_timed('HanaInstance.create_backup')
 def create_backup(
         database,
         backup_name,
@@ -718,7 +1355,9 @@ def create_backup(
         user_password=None,
         sid=None,
         inst=None,
-        password=None):
+        password=None,
+        tenants=None,
+        parallel=None):
     '''
     Create the primary node backup.
 
@@ -741,21 +1380,138 @@ def create_backup(
         HANA instance number (00 for example)
     password
         HANA instance password
+    tenants
+        List of additional databases (tenants) to backup. The databases are backed up
+        concurrently and the tenant name is appended to their backup name
+        (backup_PRD for example)
+    parallel
+        Maximum number of databases backed up at the same time. All of them by default
+
+    The number of parallel channels used by the data backups with Backint is set with the
+    parallel_data_backup_backint_channels parameter of the SYSTEMDB global.ini file
+    (hana.set_ini_parameter). It is not changed here, as it's kept for all the later backups.
 
     CLI Example:
 
     .. code-block:: bash
 
         salt '*' hana.create_backup key pass SYSTEMDB backup prd '"00"' pass
+        salt '*' hana.create_backup SYSTEMDB backup key tenants='[PRD]'
     '''
     hana_inst = _init(sid, inst, password)
+    databases = [database] + [tenant for tenant in tenants or [] if tenant != database]
+    if len(databases) == 1:
+        try:
+            hana_inst.create_backup(
+                database, backup_name, key_name, user_name, user_password)
+        except hana.HanaError as err:
+            raise exceptions.CommandExecutionError(err)
+        return
+
+    def _backup(backup_database):
+        name = backup_name if backup_database == database else '{}_{}'.format(
+            backup_name, backup_database)
+        try:
+            hana_inst.create_backup(
+                backup_database, name, key_name, user_name, user_password)
+        except hana.HanaError as err:
+            return '{}: {}'.format(backup_database, err)
+        return None
+
+    workers = ThreadPool(parallel or len(databases))
     try:
-        hana_inst.create_backup(
-            database, backup_name, key_name, user_name, user_password)
-    except hana.HanaError as err:
-        raise exceptions.CommandExecutionError(err)
+        errors = [error for error in workers.map(_backup, databases) if error]
+    finally:
+        workers.close()
+    if errors:
+        raise exceptions.CommandExecutionError(
+            'Backup failed in some databases: {}'.format(', '.join(errors)))
+
+
+def backup_progress(
+        host,
+        port,
+        user,
+        password,
+        databases=None):
+    '''
+    Get the progress of the last complete data backup of every database from the backup
+    catalog (M_BACKUP_CATALOG and M_BACKUP_CATALOG_FILES). The expected size and the estimated
+    remaining time are calculated using the previous successful backup of the same database
+
+    host
+        Host where HANA is running
+    port
+        SYSTEMDB SQL port
+    user
+        User to connect to the database
+    password
+        Password to connect to the database
+    databases
+        List of databases to check. All of them by default
+
+    Returns:
+        dict: By database, the backup id, state (running, successful, failed...), written
+        bytes, elapsed seconds, throughput in MB/s, expected bytes, percentage and estimated
+        remaining seconds (these 3 are None if there is not a previous backup)
+
+    CLI Example:
 
+    .. code-block:: bash
 
+        salt '*' hana.backup_progress 192.168.10.15 30013 SYSTEM pass
+    '''
+    statement = 'SELECT C.DATABASE_NAME, C.BACKUP_ID, C.STATE_NAME, '\
+        'SECONDS_BETWEEN(C.SYS_START_TIME, IFNULL(C.SYS_END_TIME, CURRENT_TIMESTAMP)), '\
+        'SUM(F.BACKUP_SIZE) FROM SYS_DATABASES.M_BACKUP_CATALOG C '\
+        'JOIN SYS_DATABASES.M_BACKUP_CATALOG_FILES F '\
+        'ON C.DATABASE_NAME = F.DATABASE_NAME AND C.BACKUP_ID = F.BACKUP_ID '\
+        'WHERE C.ENTRY_TYPE_NAME = \'complete data backup\''
+    parameters = []
+    if databases:
+        statement += ' AND C.DATABASE_NAME IN ({})'.format(', '.join('?' for _ in databases))
+        parameters.extend(databases)
+    statement += ' GROUP BY C.DATABASE_NAME, C.BACKUP_ID, C.STATE_NAME, C.SYS_START_TIME, '\
+        'C.SYS_END_TIME ORDER BY C.SYS_START_TIME DESC'
+    try:
+        with _hdb_connection(host, port, user, password) as connector:
+            cursor = _get_cursor(connector)
+            try:
+                cursor.execute(statement, parameters)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+    except Exception as err:  # pylint: disable=broad-except
+        raise exceptions.CommandExecutionError(
+            'Backup catalog cannot be read on {}:{}: {}'.format(host, port, err))
+
+    progress = {}
+    for database_name, backup_id, state, elapsed, size in rows:
+        size = int(size or 0)
+        if database_name not in progress:
+            elapsed = int(elapsed or 0)
+            progress[database_name] = {
+                'backup_id': backup_id,
+                'state': state,
+                'bytes': size,
+                'elapsed': elapsed,
+                'throughput': round(size / (1024.0 * 1024.0) / elapsed, 2) if elapsed else 0,
+                'expected_bytes': None,
+                'percentage': None,
+                'eta': None
+            }
+        elif progress[database_name]['expected_bytes'] is None and state == 'successful':
+            current = progress[database_name]
+            current['expected_bytes'] = size
+            if size:
+                current['percentage'] = round(min(current['bytes'] * 100.0 / size, 100), 2)
+            if current['state'] == 'running' and current['bytes'] and current['elapsed']:
+                current['eta'] = int(max(size - current['bytes'], 0) * current['elapsed'] /
+                                     current['bytes'])
+    return progress
+
+
+@_timed('HanaInstance.sr_cleanup')
 def sr_cleanup(
         sid=None,
         inst=None,
@@ -784,6 +1540,8 @@ def sr_cleanup(
         hana_inst.sr_cleanup(force)
     except hana.HanaError as err:
         raise exceptions.CommandExecutionError(err)
+    finally:
+        _invalidate(hana_inst)
 
 
 def set_ini_parameter(
@@ -914,97 +1672,1263 @@ def unset_ini_parameter(
         raise exceptions.CommandExecutionError(err)
 
 
-def wait_for_connection(
-        host,
-        port,
-        user,
-        password,
-        timeout=60,
-        interval=5):
+def _disconnect(connector):
+    '''
+    Close a database connection ignoring the errors, as the connection might be already broken
     '''
-    Wait until HANA is ready trying to connect to the database
+    try:
+        connector.disconnect()
+    except Exception as err:  # pylint: disable=broad-except
+        LOGGER.debug('Error closing HANA database connection: %s', err)
 
-    host
-        Host where HANA is running
-    port
-        HANA database port
-    user
-        User to connect to the database
-    password
-        Password to connect to the database
-    timeout
-        Timeout to try to connect to the database
-    interval
-        Interval to try the connection
 
-    CLI Example:
+def _is_alive(connector):
+    '''
+    Check if a database connection is still usable
+    '''
+    try:
+        return bool(connector.isconnected())
+    except Exception:  # pylint: disable=broad-except
+        return False
 
-    .. code-block:: bash
 
-        salt '*' hana.wait_for_hana 192.168.10.15 30015 SYSTEM pass
+class HdbConnectionPool(object):
     '''
-    connector = hdb_connector.HdbConnector()
-    current_time = time.time()
-    current_timeout = current_time + timeout
-    while current_time <= current_timeout:
-        try:
-            connector.connect(host, port, user=user, password=password)
-            connector.disconnect()
-            break
+    Pool of opened HANA database connections indexed by (host, port, user, password digest),
+    so a connection is only reused with the same credentials it was opened with
 
-        except base_connector.ConnectionError:
-            time.sleep(interval)
-            current_time = time.time()
-    else:
-        raise exceptions.CommandExecutionError(
-            'HANA database not available after {} seconds in {}:{}'.format(
-                timeout, host, port
-            ))
+    Idle connections are kept up to max_size, closed when they are not used for more than
+    idle_timeout seconds and checked before being reused
+    '''
 
+    def __init__(self, max_size=HDB_POOL_MAX_SIZE, idle_timeout=HDB_POOL_IDLE_TIMEOUT):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._idle.values())
+
+    @staticmethod
+    def _key(host, port, user, password):
+        digest = hashlib.sha256('{}'.format(password).encode('utf-8')).hexdigest()
+        return (host, port, user, digest)
+
+    def _evict_expired(self, now):
+        for key, entries in list(self._idle.items()):
+            alive = []
+            for connector, last_used in entries:
+                if now - last_used > self.idle_timeout:
+                    LOGGER.debug('Closing idle HANA connection to %s:%s', key[0], key[1])
+                    _disconnect(connector)
+                else:
+                    alive.append((connector, last_used))
+            if alive:
+                self._idle[key] = alive
+            else:
+                del self._idle[key]
 
-def query(
-        host,
+    def borrow(self, host, port, user, password):
+        '''
+        Get an opened connection, reusing an idle one if it is still alive
+
+        Raises:
+            base_connector.ConnectionError: If a new connection cannot be opened
+        '''
+        key = self._key(host, port, user, password)
+        with self._lock:
+            self._evict_expired(time.time())
+            entries = self._idle.get(key, [])
+            while entries:
+                connector, _ = entries.pop()
+                if _is_alive(connector):
+                    return connector
+                _disconnect(connector)
+
+        connector = hdb_connector.HdbConnector()
+        connector.connect(host, port, user=user, password=password)
+        return connector
+
+    def release(self, connector, host, port, user, password):
+        '''
+        Give back a connection to the pool. It is closed if the pool is full
+        '''
+        key = self._key(host, port, user, password)
+        with self._lock:
+            if len(self) < self.max_size:
+                self._idle.setdefault(key, []).append((connector, time.time()))
+                return
+        _disconnect(connector)
+
+    def discard(self, connector):
+        '''
+        Close a broken connection without giving it back to the pool
+        '''
+        _disconnect(connector)
+
+    def close_all(self):
+        '''
+        Close all the idle connections
+
+        Returns:
+            int: Number of closed connections
+        '''
+        with self._lock:
+            entries = [entry for key_entries in self._idle.values() for entry in key_entries]
+            self._idle = {}
+        for connector, _ in entries:
+            _disconnect(connector)
+        return len(entries)
+
+
+def _get_hdb_pool():
+    '''
+    Get the connection pool stored in the execution context, creating it if needed
+    '''
+    if HDB_POOL_KEY not in __context__:
+        __context__[HDB_POOL_KEY] = HdbConnectionPool(
+            max_size=__salt__['config.option']('hana.pool_max_size', HDB_POOL_MAX_SIZE),
+            idle_timeout=__salt__['config.option'](
+                'hana.pool_idle_timeout', HDB_POOL_IDLE_TIMEOUT))
+    return __context__[HDB_POOL_KEY]
+
+
+@contextlib.contextmanager
+def _hdb_connection(host, port, user, password, pool=None):
+    '''
+    Borrow a connection from the pool and give it back once it is used. Connections
+    raising a connection error are discarded. The pool must be given when it is used
+    in worker threads, as the loader dunders are not available there
+    '''
+    if pool is None:
+        pool = _get_hdb_pool()
+    connector = pool.borrow(host, port, user, password)
+    broken = False
+    try:
+        yield connector
+    except base_connector.ConnectionError:
+        broken = True
+        raise
+    finally:
+        if broken:
+            pool.discard(connector)
+        else:
+            pool.release(connector, host, port, user, password)
+
+
+def close_connections():
+    '''
+    Close the HANA database connections kept opened in the connection pool
+
+    Returns:
+        int: Number of closed connections
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.close_connections
+    '''
+    if HDB_POOL_KEY not in __context__:
+        return 0
+    return __context__[HDB_POOL_KEY].close_all()
+
+
+def _is_port_open(host, port, timeout=PORT_PROBE_TIMEOUT):
+    '''
+    Check if a TCP port accepts connections. Much cheaper than a database login
+    '''
+    try:
+        sock = socket.create_connection((host, int(port)), timeout=timeout)
+    except (socket.error, socket.timeout):
+        return False
+    sock.close()
+    return True
+
+
+def wait_for_connection(
+        host,
+        port,
+        user,
+        password,
+        timeout=60,
+        interval=5,
+        initial_interval=0.5,
+        backoff=2,
+        jitter=0.1,
+        probe_port=True,
+        details=False):
+    '''
+    Wait until HANA is ready trying to connect to the database. The time between
+    attempts starts with initial_interval and grows exponentially up to interval
+
+    host
+        Host where HANA is running
+    port
+        HANA database port
+    user
+        User to connect to the database
+    password
+        Password to connect to the database
+    timeout
+        Timeout to try to connect to the database
+    interval
+        Maximum interval to try the connection
+    initial_interval
+        Interval after the first failed attempt
+    backoff
+        Factor applied to the interval after every failed attempt
+    jitter
+        Random variation applied to every interval (0.1 means +/-10%)
+    probe_port
+        Check if the database port is opened before trying to login
+    details
+        Return the elapsed time and the number of attempts
+
+    Returns:
+        dict: elapsed time and attempts if details is True, None otherwise
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.wait_for_connection 192.168.10.15 30015 SYSTEM pass
+    '''
+    result = _wait_for_connection(
+        _get_hdb_pool(), host, port, user, password, timeout, interval,
+        initial_interval, backoff, jitter, probe_port)
+    return result if details else None
+
+
+def _wait_for_connection(
+        pool, host, port, user, password, timeout, interval,
+        initial_interval=0.5, backoff=2, jitter=0.1, probe_port=True, stop_event=None):
+    '''
+    Try to connect to the database until it is available using the given connection pool.
+    It doesn't use the loader dunders, so it can run in worker threads. The attempts are
+    cancelled when stop_event is set
+
+    Returns:
+        dict: elapsed time and attempts
+    '''
+    start_time = time.time()
+    current_timeout = start_time + timeout
+    current_interval = initial_interval
+    attempts = 0
+    while True:
+        attempts += 1
+        if not probe_port or _is_port_open(host, port):
+            try:
+                # The opened connection is kept in the pool to be used by the next queries
+                connector = pool.borrow(host, port, user, password)
+                pool.release(connector, host, port, user, password)
+                return {'elapsed': time.time() - start_time, 'attempts': attempts}
+            except base_connector.ConnectionError:
+                pass
+
+        remaining = current_timeout - time.time()
+        if remaining <= 0:
+            raise exceptions.CommandExecutionError(
+                'HANA database not available after {} seconds in {}:{}'.format(
+                    timeout, host, port
+                ))
+        delay = min(current_interval * random.uniform(1 - jitter, 1 + jitter), remaining)
+        if stop_event is None:
+            time.sleep(delay)
+        elif stop_event.wait(delay) or stop_event.is_set():
+            raise exceptions.CommandExecutionError(
+                'Waiting for HANA database in {}:{} cancelled'.format(host, port))
+        current_interval = min(current_interval * backoff, interval)
+
+
+def _parse_target(target):
+    '''
+    Get host, port, user and password from a database target. The target might be a
+    host:port string or a dictionary with host, port and optionally user and password
+    '''
+    try:
+        if isinstance(target, dict):
+            return (target['host'], int(target['port']),
+                    target.get('user'), target.get('password'))
+        host, port = '{}'.format(target).rsplit(':', 1)
+        if not host:
+            raise ValueError('empty host')
+        return host, int(port), None, None
+    except (KeyError, TypeError, ValueError):
+        raise exceptions.SaltInvocationError(
+            'Invalid database target {}. host:port or a dictionary with host and port '
+            'values expected'.format(target))
+
+
+def wait_for_connections(
+        targets,
+        user,
+        password,
+        timeout=60,
+        interval=5,
+        quorum=None,
+        parallel=None):
+    '''
+    Wait until several HANA databases (SYSTEMDB and tenants for example) are ready. The
+    databases are checked concurrently
+
+    targets
+        List of databases to check. Each entry is a host:port string or a dictionary
+        with host, port and optionally user and password values
+    user
+        User to connect to the databases
+    password
+        Password to connect to the databases
+    timeout
+        Timeout to try to connect to every database
+    interval
+        Maximum interval to try the connection
+    quorum
+        Number of available databases needed. All of them by default. Once the quorum is
+        reached the rest of the databases are not waited for
+    parallel
+        Maximum number of databases checked at the same time. All of them by default
+
+    Returns:
+        dict: Result of every checked database with the available flag, the elapsed
+        time and the attempts
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.wait_for_connections '["hana01:30013", "hana01:30041"]' SYSTEM pass
+    '''
+    if not targets:
+        raise exceptions.SaltInvocationError('targets must be provided')
+    parsed_targets = [_parse_target(target) for target in targets]
+    if quorum is None:
+        quorum = len(parsed_targets)
+    # The loader dunders are not available in the worker threads, so the pool is got here
+    pool = _get_hdb_pool()
+    stop_event = threading.Event()
+
+    def _wait(target):
+        host, port, target_user, target_password = target
+        try:
+            result = _wait_for_connection(
+                pool, host, port, target_user or user, target_password or password,
+                timeout, interval, stop_event=stop_event)
+            result['available'] = True
+        except exceptions.CommandExecutionError as err:
+            result = {'available': False, 'comment': str(err)}
+        return '{}:{}'.format(host, port), result
+
+    workers = ThreadPool(parallel or len(parsed_targets))
+    results = {}
+    available = 0
+    try:
+        for name, result in workers.imap_unordered(_wait, parsed_targets):
+            results[name] = result
+            available += int(result['available'])
+            if available >= quorum:
+                break
+    finally:
+        # Stop the databases still being waited for once the quorum is reached
+        stop_event.set()
+        workers.close()
+
+    if available < quorum:
+        raise exceptions.CommandExecutionError(
+            'Only {} of {} required HANA databases available after {} seconds. '
+            'Not available: {}'.format(
+                available, quorum, timeout,
+                ', '.join(sorted(name for name, result in results.items()
+                                 if not result['available']))))
+    return results
+
+
+def query(
+        host,
+        port,
+        user,
+        password,
+        query):
+    '''
+    Execute a query on a HANA database
+
+    host
+        Host where HANA is running
+    port
+        HANA database port
+    user
+        User to connect to the database
+    password
+        Password to connect to the database
+    query
+        Query to execute on database
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.query 192.168.10.15 30015 SYSTEM pass 'SELECT * FROM SCHEMAS'
+    '''
+
+    try:
+        with _hdb_connection(host, port, user, password) as connector:
+            connector.query(query)
+
+    except base_connector.QueryError as err:
+        if str(err) == "query failed: (0, 'No result set')":
+            pass # This is not error, but an empty query result.
+        else:
+            raise exceptions.CommandExecutionError(
+                'HANA database query not successful on {}:{} with query "{}"'.format(
+                    host, port, query
+                )
+            )
+
+
+def _get_connection(connector):
+    '''
+    Get the DB-API connection of the connector. hdb_connector doesn't expose it, but both
+    supported apis (dbapi and pyhdb) are DB-API compliant
+    '''
+    connection = getattr(connector, '_connection', None)
+    if connection is None:
+        raise exceptions.CommandExecutionError(
+            'The database connection is not available in the installed shaptools version')
+    return connection
+
+
+def _get_cursor(connector):
+    '''
+    Get a DB-API cursor from the connector
+    '''
+    return _get_connection(connector).cursor()
+
+
+def _format_value(value):
+    '''
+    Convert the database values which cannot be serialized by salt
+    '''
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (bytearray, memoryview)):
+        return binascii.hexlify(value).decode()
+    return value
+
+
+def _format_rows(rows):
+    '''
+    Convert the rows returned by a cursor in a list of serializable lists
+    '''
+    return [[_format_value(value) for value in row] for row in rows]
+
+
+def _split_sql_script(script):
+    '''
+    Split a SQL script in statements using the semicolon separator. Semicolons
+    within quoted strings are ignored and the comments (-- and /* */) are removed
+    '''
+    statements = []
+    current = []
+    quote = None
+    index = 0
+    while index < len(script):
+        char = script[index]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in ('\'', '"'):
+            quote = char
+        elif script.startswith('--', index):
+            end = script.find('\n', index)
+            index = len(script) if end == -1 else end
+            continue
+        elif script.startswith('/*', index):
+            end = script.find('*/', index + 2)
+            index = len(script) if end == -1 else end + 2
+            current.append(' ')
+            continue
+        elif char == ';':
+            statements.append(''.join(current).strip())
+            current = []
+            index += 1
+            continue
+        current.append(char)
+        index += 1
+    statements.append(''.join(current).strip())
+    return [statement for statement in statements if statement]
+
+
+def _execute_statement(cursor, statement):
+    '''
+    Execute a query_batch entry in the given cursor. The entry might be a string or a
+    dictionary with the statement and its parameters. If the parameters are a list of rows
+    executemany is used
+    '''
+    if not isinstance(statement, dict):
+        cursor.execute(statement)
+        return statement
+
+    sql = statement['statement']
+    parameters = statement.get('parameters')
+    if not parameters:
+        cursor.execute(sql)
+    elif all(isinstance(row, (list, tuple)) for row in parameters):
+        cursor.executemany(sql, parameters)
+    else:
+        cursor.execute(sql, parameters)
+    return sql
+
+
+def query_batch(
+        host,
+        port,
+        user,
+        password,
+        statements=None,
+        script=None,
+        transaction=True):
+    '''
+    Execute a batch of statements on a HANA database using one connection
+
+    host
+        Host where HANA is running
+    port
+        HANA database port
+    user
+        User to connect to the database
+    password
+        Password to connect to the database
+    statements
+        List of statements to execute. Each entry might be a SQL string or a dictionary
+        with the statement and its parameters. If the parameters are a list of rows
+        the statement is executed for every row (executemany):
+        {'statement': 'INSERT INTO T VALUES (?, ?)', 'parameters': [[1, 'a'], [2, 'b']]}
+    script
+        SQL script with statements separated by semicolon. Executed after the statements
+    transaction
+        Execute all the statements in a unique transaction. If some of them fails, the
+        previous changes are rolled back
+
+    Returns:
+        dict: Total duration and the results of every statement (statement, rowcount,
+        duration and records if the statement returns a result set)
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.query_batch 192.168.10.15 30015 SYSTEM pass script='CREATE SCHEMA S1; CREATE SCHEMA S2'
+    '''
+    statements = list(statements or [])
+    if script:
+        statements.extend(_split_sql_script(script))
+    if not statements:
+        raise exceptions.SaltInvocationError('statements or script must be provided')
+
+    results = []
+    start_time = time.time()
+    try:
+        with _hdb_connection(host, port, user, password) as connector:
+            connection = _get_connection(connector)
+            if transaction and hasattr(connection, 'setautocommit'):
+                connection.setautocommit(False)
+            cursor = _get_cursor(connector)
+            try:
+                for index, statement in enumerate(statements):
+                    statement_time = time.time()
+                    try:
+                        sql = _execute_statement(cursor, statement)
+                    except Exception as err:  # pylint: disable=broad-except
+                        if transaction:
+                            connection.rollback()
+                        raise exceptions.CommandExecutionError(
+                            'HANA database batch failed on statement {} "{}": {}'.format(
+                                index, statement, err))
+                    result = {'statement': sql, 'rowcount': cursor.rowcount}
+                    if cursor.description:
+                        result['records'] = _format_rows(cursor.fetchall())
+                    result['duration'] = time.time() - statement_time
+                    results.append(result)
+                if transaction:
+                    connection.commit()
+            finally:
+                cursor.close()
+                if transaction and hasattr(connection, 'setautocommit'):
+                    connection.setautocommit(True)
+    except base_connector.ConnectionError as err:
+        raise exceptions.CommandExecutionError(
+            'HANA database not available in {}:{}: {}'.format(host, port, err))
+
+    return {'duration': time.time() - start_time, 'results': results}
+
+
+def _fetch_chunks(cursor, chunk_size, limit=None):
+    '''
+    Yield the cursor rows in chunks of chunk_size rows, up to limit rows
+    '''
+    fetched = 0
+    while limit is None or fetched < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - fetched)
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        fetched += len(rows)
+        yield rows
+
+
+def _skip_rows(cursor, chunk_size, count):
+    '''
+    Skip the first count rows of the cursor result set, fetching them in chunks
+    '''
+    for _ in _fetch_chunks(cursor, chunk_size, count):
+        pass
+
+
+def query_chunked(
+        host,
+        port,
+        user,
+        password,
+        query,
+        chunk_size=QUERY_CHUNK_SIZE,
+        max_rows=None,
+        offset=0,
+        output_file=None):
+    '''
+    Execute a query on a HANA database fetching the result set in chunks, so big result sets
+    are not loaded in memory. The rows are written in a file (one JSON list per line) or a page
+    of them is returned with the offset to use to get the next page. The query is executed
+    as given and the rows before the offset are skipped with the cursor. HANA doesn't
+    guarantee the rows order without an ORDER BY clause, so the query must have it to use
+    an offset (otherwise the pages might repeat or miss rows)
+
+    host
+        Host where HANA is running
+    port
+        HANA database port
+    user
+        User to connect to the database
+    password
+        Password to connect to the database
+    query
+        Query to execute on database
+    chunk_size
+        Number of rows fetched from the database at once
+    max_rows
+        Maximum number of rows to return or write. If output_file is not set, chunk_size is
+        used by default
+    offset
+        Number of rows to skip. Use the returned next_offset value to get the next page.
+        max_rows must be set and the query must be ordered (ORDER BY) to use it
+    output_file
+        File where the rows are written
+
+    Returns:
+        dict: Column names, number of rows, their size in bytes, the duration and the
+        records (or the output file). next_offset is None when there are no more rows
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.query_chunked 192.168.10.15 30015 SYSTEM pass 'SELECT * FROM M_CS_TABLES' max_rows=100
+        salt '*' hana.query_chunked 192.168.10.15 30015 SYSTEM pass 'SELECT * FROM T ORDER BY ID' max_rows=100 offset=100
+    '''
+    if not output_file and max_rows is None:
+        max_rows = chunk_size
+    if offset and max_rows is None:
+        raise exceptions.SaltInvocationError('max_rows must be set to use offset')
+    if offset and not re.search(
+            r'\bORDER\s+BY\b', ' '.join(_split_sql_script(query)), re.IGNORECASE):
+        raise exceptions.SaltInvocationError(
+            'The query must have an ORDER BY clause to use offset')
+
+    start_time = time.time()
+    try:
+        with _hdb_connection(host, port, user, password) as connector:
+            cursor = _get_cursor(connector)
+            try:
+                try:
+                    cursor.execute(query)
+                except Exception as err:  # pylint: disable=broad-except
+                    raise exceptions.CommandExecutionError(
+                        'HANA database query not successful on {}:{} with query "{}": '
+                        '{}'.format(host, port, query, err))
+                if not cursor.description:
+                    raise exceptions.CommandExecutionError(
+                        'HANA database query "{}" does not return a result set'.format(query))
+
+                result = {'columns': [column[0] for column in cursor.description]}
+                if offset:
+                    _skip_rows(cursor, chunk_size, offset)
+                rows = 0
+                size = 0
+                if output_file:
+                    with salt_files.fopen(output_file, 'w') as output_ptr:
+                        for chunk in _fetch_chunks(cursor, chunk_size, max_rows):
+                            for row in _format_rows(chunk):
+                                line = '{}\n'.format(json.dumps(row))
+                                output_ptr.write(line)
+                                size += len(line.encode('utf-8'))
+                            rows += len(chunk)
+                    result['file'] = output_file
+                else:
+                    records = []
+                    for chunk in _fetch_chunks(cursor, chunk_size, max_rows):
+                        records.extend(_format_rows(chunk))
+                    size = len(json.dumps(records).encode('utf-8'))
+                    rows = len(records)
+                    result['records'] = records
+
+                more_rows = max_rows is not None and rows == max_rows and \
+                    cursor.fetchone() is not None
+            finally:
+                cursor.close()
+    except base_connector.ConnectionError as err:
+        raise exceptions.CommandExecutionError(
+            'HANA database not available in {}:{}: {}'.format(host, port, err))
+
+    result['rows'] = rows
+    result['bytes'] = size
+    result['next_offset'] = offset + rows if more_rows else None
+    result['duration'] = time.time() - start_time
+    return result
+
+
+def get_ini_parameters(
+        host,
+        port,
+        user,
+        password,
+        file_name,
+        layer='SYSTEM',
+        layer_name=None,
+        sections=None):
+    '''
+    Get the current HANA ini configuration parameters values from the M_INIFILE_CONTENTS view
+
+    host
+        Host where HANA is running
+    port
+        HANA database port (SYSTEMDB port to get the system wide parameters)
+    user
+        User to connect to the database
+    password
+        Password to connect to the database
+    file_name
+        INI configuration file name (global.ini for example). A list of file names can be
+        provided to get the values of all of them in the same query
+    layer
+        Configuration layer (DEFAULT, SYSTEM, DATABASE or HOST)
+    layer_name
+        Tenant name (DATABASE layer) or host name (HOST layer)
+    sections
+        List of sections to get. All the sections are returned by default
+
+    Returns:
+        dict: Parameters values by section and parameter name. If file_name is a list, the
+        values are grouped by file name first
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.get_ini_parameters 192.168.10.15 30013 SYSTEM pass global.ini sections='[memorymanager]'
+    '''
+    file_names = file_name if isinstance(file_name, list) else [file_name]
+    statement = 'SELECT FILE_NAME, SECTION, KEY, VALUE FROM SYS.M_INIFILE_CONTENTS '\
+        'WHERE FILE_NAME IN ({}) AND LAYER_NAME = ?'.format(', '.join('?' for _ in file_names))
+    parameters = file_names + [layer]
+    if layer_name and layer == 'HOST':
+        statement += ' AND HOST = ?'
+        parameters.append(layer_name)
+    elif layer_name and layer == 'DATABASE':
+        # The tenant of the DATABASE layer values is stored in the TENANT_NAME column
+        statement += ' AND TENANT_NAME = ?'
+        parameters.append(layer_name)
+    if sections:
+        statement += ' AND SECTION IN ({})'.format(', '.join('?' for _ in sections))
+        parameters.extend(sections)
+
+    ini_parameters = {}
+    try:
+        with _hdb_connection(host, port, user, password) as connector:
+            cursor = _get_cursor(connector)
+            try:
+                cursor.execute(statement, parameters)
+                for ini_file, section, key, value in cursor.fetchall():
+                    ini_parameters.setdefault(ini_file, {}).setdefault(section, {})[key] = value
+            finally:
+                cursor.close()
+    except base_connector.ConnectionError as err:
+        raise exceptions.CommandExecutionError(
+            'HANA database not available in {}:{}: {}'.format(host, port, err))
+    except Exception as err:  # pylint: disable=broad-except
+        raise exceptions.CommandExecutionError(
+            'HANA ini parameters of {} cannot be read on {}:{}: {}'.format(
+                ', '.join(file_names), host, port, err))
+    if isinstance(file_name, list):
+        return ini_parameters
+    return ini_parameters.get(file_name, {})
+
+
+def _get_physical_memory():
+    '''
+    Get the host physical memory in MB
+    '''
+    try:
+        with salt_files.fopen(MEMINFO_FILE, 'r') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemTotal:'):
+                    return int(line.split()[1]) // 1024
+    except (IOError, OSError, ValueError, IndexError) as err:
+        raise exceptions.CommandExecutionError(
+            'Physical memory cannot be read from {}: {}'.format(MEMINFO_FILE, err))
+    raise exceptions.CommandExecutionError(
+        'Physical memory not found in {}'.format(MEMINFO_FILE))
+
+
+def _get_memory_utilization(host, port, user, password):
+    '''
+    Get the current allocation limit and used physical memory of a HANA system in MB, from the
+    M_HOST_RESOURCE_UTILIZATION view. The highest values are used in scale-out systems
+    '''
+    statement = 'SELECT MAX(ALLOCATION_LIMIT), MAX(USED_PHYSICAL_MEMORY) '\
+        'FROM SYS.M_HOST_RESOURCE_UTILIZATION'
+    try:
+        with _hdb_connection(host, port, user, password) as connector:
+            cursor = _get_cursor(connector)
+            try:
+                cursor.execute(statement)
+                allocation_limit, used_memory = cursor.fetchone()
+            finally:
+                cursor.close()
+        if allocation_limit is None or used_memory is None:
+            raise ValueError('no utilization data available')
+        return int(allocation_limit) // (1024 * 1024), int(used_memory) // (1024 * 1024)
+    except Exception as err:  # pylint: disable=broad-except
+        raise exceptions.CommandExecutionError(
+            'HANA memory utilization cannot be read on {}:{}: {}'.format(host, port, err))
+
+
+def calculate_allocation_limits(
+        instances,
+        percentage=None,
+        reserve=0,
+        memory=None):
+    '''
+    Calculate the global_allocation_limit of the HANA instances running in the same host, as in
+    the cost-optimized scenarios (a QAS system running with the PRD secondary for example).
+    The assignable memory is split among the instances using their weights. The current memory
+    usage of the instances is read if the connection data is provided, and a warning is added
+    if it's higher than the calculated limit
+
+    instances
+        Dictionary with the instances identifier (SID for example) as key and a dictionary
+        with the instance data as value. All the entries are optional:
+
+        - weight: Relative share of the assignable memory (1 by default)
+        - host, port, user, password: SQL connection data to read the current memory usage
+    percentage
+        Percentage of the physical memory (after subtracting the reserve) assignable to the
+        HANA instances. If it's not set, the SAP default is used (90% of the first 64 GB and
+        97% of the rest)
+    reserve
+        Memory in MB kept for the operating system and other applications
+    memory
+        Physical memory in MB. It's read from the host by default
+
+    Returns:
+        dict: Physical and assignable memory, the calculated global_allocation_limit value in MB
+        of each instance (with their current limit and used memory if available) and warnings
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.calculate_allocation_limits '{"PRD": {"weight": 3}, "QAS": {"weight": 1}}' reserve=16384
+    '''
+    if not instances:
+        raise exceptions.SaltInvocationError('At least one instance must be provided')
+    if percentage is not None and not 0 < percentage <= 100:
+        raise exceptions.SaltInvocationError('percentage must be between 0 and 100')
+
+    memory = _get_physical_memory() if memory is None else int(memory)
+    available = memory - int(reserve)
+    if available <= 0:
+        raise exceptions.CommandExecutionError(
+            'The reserved memory ({} MB) is higher than the physical memory ({} MB)'.format(
+                reserve, memory))
+    if percentage is not None:
+        assignable = int(available * percentage / 100)
+    else:
+        assignable = int(min(available, GAL_DEFAULT_THRESHOLD) * 0.9 +
+                         max(available - GAL_DEFAULT_THRESHOLD, 0) * 0.97)
+
+    weights = {
+        name: float((data or {}).get('weight', 1)) for name, data in instances.items()}
+    if any(weight <= 0 for weight in weights.values()):
+        raise exceptions.SaltInvocationError('The instances weight must be positive')
+    total_weight = sum(weights.values())
+
+    result = {'memory': memory, 'assignable': assignable, 'instances': {}, 'warnings': []}
+    for name, data in sorted(instances.items()):
+        data = data or {}
+        limit = int(assignable * weights[name] / total_weight)
+        instance_result = {'global_allocation_limit': limit}
+        if data.get('host') and data.get('port'):
+            current_limit, used_memory = _get_memory_utilization(
+                data['host'], data['port'], data.get('user'), data.get('password'))
+            instance_result['current_limit'] = current_limit
+            instance_result['used'] = used_memory
+            if used_memory > limit:
+                result['warnings'].append(
+                    '{} uses {} MB, more than the calculated limit of {} MB'.format(
+                        name, used_memory, limit))
+        result['instances'][name] = instance_result
+    return result
+
+
+def _next_interval(current_interval, interval, max_interval, progressed):
+    '''
+    Get the next polling interval: the initial interval if there is some progress, the double
+    of the current one (up to max_interval) otherwise
+    '''
+    if progressed:
+        return interval
+    return min(current_interval * 2, max_interval)
+
+
+def _parse_table(table):
+    '''
+    Split a SCHEMA.TABLE string
+    '''
+    schema, _, table_name = table.partition('.')
+    if not schema or not table_name:
+        raise exceptions.SaltInvocationError(
+            'Table {} must be provided as SCHEMA.TABLE'.format(table))
+    return schema, table_name
+
+
+def _get_preload_status(host, port, user, password, tables=None):
+    '''
+    Get the load status of the column tables from the M_CS_TABLES view. Partitioned tables
+    have one entry per partition. Without tables, only the tables flagged for preload are
+    checked, as the rest of them are not loaded by HANA after a start
+    '''
+    statement = 'SELECT LOADED, COUNT(*), SUM(MEMORY_SIZE_IN_TOTAL) FROM SYS.M_CS_TABLES C'
+    parameters = []
+    if tables:
+        statement += ' WHERE {}'.format(
+            ' OR '.join('(SCHEMA_NAME = ? AND TABLE_NAME = ?)' for _ in tables))
+        for schema, table_name in tables:
+            parameters.extend([schema, table_name])
+    else:
+        statement += (
+            ' WHERE EXISTS (SELECT 1 FROM SYS.TABLES T WHERE T.SCHEMA_NAME = C.SCHEMA_NAME'
+            ' AND T.TABLE_NAME = C.TABLE_NAME AND T.PRELOAD = \'TRUE\')')
+    statement += ' GROUP BY LOADED'
+
+    status = {'loaded': 0, 'partially': 0, 'unloaded': 0, 'loaded_bytes': 0}
+    try:
+        with _hdb_connection(host, port, user, password) as connector:
+            cursor = _get_cursor(connector)
+            try:
+                cursor.execute(statement, parameters)
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+    except Exception as err:  # pylint: disable=broad-except
+        raise exceptions.CommandExecutionError(
+            'Column tables load status cannot be read on {}:{}: {}'.format(host, port, err))
+
+    for loaded, count, memory_size in rows:
+        key = {'TRUE': 'loaded', 'PARTIALLY': 'partially'}.get(loaded, 'unloaded')
+        status[key] += int(count)
+        status['loaded_bytes'] += int(memory_size or 0)
+    status['total'] = status['loaded'] + status['partially'] + status['unloaded']
+    status['percentage'] = \
+        round(status['loaded'] * 100.0 / status['total'], 2) if status['total'] else 100.0
+    return status
+
+
+def _load_table(host, port, user, password, table, pool=None):
+    '''
+    Load a column table in memory. The LOAD statement returns once the table is loaded
+
+    Returns:
+        str: Error message if the table cannot be loaded, None otherwise
+    '''
+    statement = 'LOAD "{}"."{}" ALL'.format(*[name.replace('"', '""') for name in table])
+    try:
+        with _hdb_connection(host, port, user, password, pool) as connector:
+            cursor = _get_cursor(connector)
+            try:
+                cursor.execute(statement)
+            finally:
+                cursor.close()
+    except Exception as err:  # pylint: disable=broad-except
+        return '{}'.format(err)
+    return None
+
+
+def wait_for_preload(
+        host,
+        port,
+        user,
+        password,
+        tables=None,
+        load=False,
+        threshold=100,
+        timeout=3600,
+        interval=5,
+        max_interval=60):
+    '''
+    Wait until the column tables are loaded in memory (after a HANA start with
+    preload_column_tables enabled for example), polling the M_CS_TABLES view. The polling
+    interval is doubled while the load doesn't progress (up to max_interval) and reset to the
+    initial interval when it does
+
+    host
+        Host where HANA is running
+    port
+        HANA database port
+    user
+        User to connect to the database
+    password
+        Password to connect to the database
+    tables
+        List of tables to check, in SCHEMA.TABLE format. The tables flagged for preload
+        (PRELOAD column of the TABLES view) by default. The tables reloaded because they were
+        loaded before the restart (reload_tables parameter) must be given explicitly
+    load
+        Trigger the load of the given tables (they are loaded concurrently with up to 4
+        connections)
+    threshold
+        Percentage of loaded tables to consider the preload completed
+    timeout
+        Timeout in seconds to wait for the preload
+    interval
+        Initial interval in seconds between the load status checks
+    max_interval
+        Maximum interval in seconds between the load status checks
+
+    Returns:
+        dict: Number of loaded, partially loaded and unloaded tables, loaded percentage, loaded
+        memory in bytes, load throughput in bytes/s and elapsed time in seconds
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.wait_for_preload 192.168.10.15 30015 SYSTEM pass threshold=95
+        salt '*' hana.wait_for_preload 192.168.10.15 30015 SYSTEM pass tables='[SAPABAP1.VBAP]' load=True
+    '''
+    if load and not tables:
+        raise exceptions.SaltInvocationError('tables must be provided to load them')
+    parsed_tables = [_parse_table(table) for table in tables or []]
+
+    start_time = time.time()
+    workers = None
+    loads = None
+    if load:
+        # The loader dunders are not available in the worker threads, so the pool is got here
+        pool = _get_hdb_pool()
+        workers = ThreadPool(min(len(parsed_tables), PRELOAD_LOAD_THREADS))
+        loads = workers.map_async(
+            lambda table: _load_table(host, port, user, password, table, pool), parsed_tables)
+
+    try:
+        current_interval = interval
+        first_check = None
+        previous_loaded = None
+        while True:
+            status = _get_preload_status(host, port, user, password, parsed_tables)
+            current_time = time.time()
+            if first_check is None:
+                first_check = (current_time, status['loaded_bytes'])
+            check_time = current_time - first_check[0]
+            status['throughput'] = \
+                int((status['loaded_bytes'] - first_check[1]) / check_time) if check_time else 0
+            status['elapsed'] = current_time - start_time
+            LOGGER.debug(
+                'Column tables preload status: %s%% loaded (%s/%s), %s bytes/s',
+                status['percentage'], status['loaded'], status['total'], status['throughput'])
+            if status['percentage'] >= threshold:
+                return status
+
+            if loads is not None and loads.ready():
+                errors = [
+                    '{}.{}: {}'.format(table[0], table[1], error)
+                    for table, error in zip(parsed_tables, loads.get()) if error]
+                if errors:
+                    raise exceptions.CommandExecutionError(
+                        'Column tables cannot be loaded: {}'.format(', '.join(errors)))
+
+            remaining = timeout - status['elapsed']
+            if remaining <= 0:
+                raise exceptions.CommandExecutionError(
+                    'Column tables preload not completed after {} seconds: {}% loaded'.format(
+                        timeout, status['percentage']))
+
+            current_interval = _next_interval(
+                current_interval, interval, max_interval,
+                previous_loaded is None or status['loaded'] != previous_loaded)
+            previous_loaded = status['loaded']
+            time.sleep(min(current_interval, remaining))
+    finally:
+        if workers:
+            workers.close()
+
+
+def sr_replication_status(
+        host,
         port,
         user,
         password,
-        query):
+        secondary=None):
     '''
-    Execute a query on a HANA database
+    Get the system replication status of the services from the M_SERVICE_REPLICATION view.
+    The query must be executed in the primary node
 
     host
-        Host where HANA is running
+        Host where the primary HANA is running
     port
-        HANA database port
+        HANA database port (SYSTEMDB port to get the status of all the databases)
     user
         User to connect to the database
     password
         Password to connect to the database
-    query
-        Query to execute on database
+    secondary
+        Secondary host name. All the secondaries by default
+
+    Returns:
+        dict: Replication status by service (host:port) and secondary, number of active
+        services, shipped full replica bytes and data volume size to ship
 
     CLI Example:
 
     .. code-block:: bash
 
-        salt '*' hana.query 192.168.10.15 30015 SYSTEM pass 'SELECT * FROM SCHEMAS'
+        salt '*' hana.sr_replication_status 192.168.10.15 30013 SYSTEM pass
     '''
-
-    connector = hdb_connector.HdbConnector()
+    statement = 'SELECT HOST, PORT, SECONDARY_HOST, REPLICATION_STATUS, '\
+        'SHIPPED_LAST_FULL_REPLICA_SIZE FROM SYS.M_SERVICE_REPLICATION'
+    parameters = []
+    if secondary:
+        statement += ' WHERE SECONDARY_HOST = ?'
+        parameters.append(secondary)
     try:
-        connector.connect(host, port, user=user, password=password)
-        result = connector.query(query)
+        with _hdb_connection(host, port, user, password) as connector:
+            cursor = _get_cursor(connector)
+            try:
+                cursor.execute(statement, parameters)
+                rows = cursor.fetchall()
+                cursor.execute(
+                    'SELECT SUM(USED_SIZE) FROM SYS.M_VOLUME_FILES WHERE FILE_TYPE = \'DATA\'')
+                data_size = cursor.fetchone()[0]
+            finally:
+                cursor.close()
+    except Exception as err:  # pylint: disable=broad-except
+        raise exceptions.CommandExecutionError(
+            'System replication status cannot be read on {}:{}: {}'.format(host, port, err))
 
-    except base_connector.QueryError as err:
-        if str(err) == "query failed: (0, 'No result set')":
-            pass # This is not error, but an empty query result.
-        else:
+    status = {'services': {}, 'active': 0, 'shipped_bytes': 0,
+              'data_bytes': int(data_size or 0)}
+    for service_host, service_port, secondary_host, replication_status, shipped in rows:
+        status['services']['{}:{}'.format(service_host, service_port)] = {
+            'secondary': secondary_host, 'status': replication_status}
+        status['active'] += 1 if replication_status == 'ACTIVE' else 0
+        status['shipped_bytes'] += int(shipped or 0)
+    status['total'] = len(rows)
+    status['synced'] = bool(rows) and status['active'] == status['total']
+    return status
+
+
+def wait_for_sr_sync(
+        host,
+        port,
+        user,
+        password,
+        secondary=None,
+        timeout=86400,
+        interval=10,
+        max_interval=300):
+    '''
+    Wait until the system replication of all the services is ACTIVE (the initial full data
+    shipping is completed after registering a secondary for example), polling the
+    M_SERVICE_REPLICATION view in the primary node. The polling interval is doubled while
+    the shipping doesn't progress (up to max_interval) and reset to the initial interval
+    when it does
+
+    host
+        Host where the primary HANA is running
+    port
+        HANA database port (SYSTEMDB port to get the status of all the databases)
+    user
+        User to connect to the database
+    password
+        Password to connect to the database
+    secondary
+        Secondary host name. All the secondaries by default
+    timeout
+        Timeout in seconds to wait for the synchronization
+    interval
+        Initial interval in seconds between the status checks
+    max_interval
+        Maximum interval in seconds between the status checks
+
+    Returns:
+        dict: Replication status (as returned by sr_replication_status), shipping throughput
+        in bytes/s, estimated remaining time in seconds (None if unknown) and elapsed time
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.wait_for_sr_sync 192.168.10.15 30013 SYSTEM pass secondary=hana02
+    '''
+    start_time = time.time()
+    current_interval = interval
+    first_check = None
+    previous_shipped = None
+    while True:
+        status = sr_replication_status(host, port, user, password, secondary)
+        current_time = time.time()
+        if first_check is None:
+            first_check = (current_time, status['shipped_bytes'])
+        check_time = current_time - first_check[0]
+        status['throughput'] = \
+            int((status['shipped_bytes'] - first_check[1]) / check_time) if check_time else 0
+        pending = status['data_bytes'] - status['shipped_bytes']
+        status['eta'] = int(pending / status['throughput']) \
+            if status['throughput'] and pending > 0 else None
+        status['elapsed'] = current_time - start_time
+        LOGGER.info(
+            'System replication status: %s/%s services active, %s bytes shipped, %s bytes/s, '
+            'ETA %s seconds', status['active'], status['total'], status['shipped_bytes'],
+            status['throughput'], status['eta'])
+        if status['synced']:
+            return status
+
+        remaining = timeout - status['elapsed']
+        if remaining <= 0:
             raise exceptions.CommandExecutionError(
-                'HANA database query not successful on {}:{} with query "{}"'.format(
-                    host, port, query
-                )
-            )
-    finally:
-        connector.disconnect()
+                'System replication not synchronized after {} seconds: {} of {} services '
+                'active ({}), {} bytes shipped, {} bytes/s, ETA {} seconds'.format(
+                    timeout, status['active'], status['total'], ', '.join(
+                        '{} {}'.format(service, data['status'])
+                        for service, data in sorted(status['services'].items())),
+                    status['shipped_bytes'], status['throughput'], status['eta']))
+
+        current_interval = _next_interval(
+            current_interval, interval, max_interval,
+            previous_shipped is None or status['shipped_bytes'] != previous_shipped)
+        previous_shipped = status['shipped_bytes']
+        time.sleep(min(current_interval, remaining))
 
 
 def reload_hdb_connector():  # pragma: no cover
@@ -1043,9 +2967,195 @@ def reload_hdb_connector():  # pragma: no cover
     reload_module(hdb_connector)
 
 
-def _find_sap_folder(software_folders, folder_pattern, recursion_level=0):
+def _read_label(folder):
+    '''
+    Read the LABEL.ASC file content of a folder. None if the file doesn't exist
+    '''
+    try:
+        with salt_files.fopen('{}/{}'.format(folder, LABEL_FILE), 'r') as label_file_ptr:
+            return label_file_ptr.read().strip()
+    except IOError:
+        return None
+
+
+def _read_labelidx(folder):
+    '''
+    Read the LABELIDX.ASC file entries of a folder. None if the file doesn't exist
+    '''
+    try:
+        with salt_files.fopen('{}/{}'.format(folder, LABELIDX_FILE), 'r') as labelidx_file_ptr:
+            return labelidx_file_ptr.read().splitlines()
+    except IOError:
+        return None
+
+
+def _read_subfolders(folder):
+    '''
+    Get the subfolder names of a folder, sorted to walk the media always in the same order
+    '''
+    try:
+        # scandir gets the entry type without an additional stat call per entry
+        if hasattr(os, 'scandir'):
+            return sorted(entry.name for entry in os.scandir(folder) if entry.is_dir())
+        return sorted(found_dir for found_dir in os.listdir(folder)  # pragma: no cover
+                      if os.path.isdir(os.path.join(folder, found_dir)))
+    except OSError:
+        LOGGER.debug('%s folder cannot be listed', folder)
+        return []
+
+
+_FOLDER_READERS = {
+    'label': _read_label,
+    'labelidx': _read_labelidx,
+    'subfolders': _read_subfolders
+}
+
+
+def _media_index_path():
+    '''
+    Get the path of the media index file
+    '''
+    return os.path.join(__opts__.get('cachedir', '/var/cache/salt/minion'), MEDIA_INDEX_FILE)
+
+
+def _load_media_index(reset=False):
+    '''
+    Load the media index in the execution context. Once it is loaded it is used to find
+    the SAP folders
+
+    reset
+        Start a new empty index
+    '''
+    if MEDIA_INDEX_KEY in __context__ and not reset:
+        return __context__[MEDIA_INDEX_KEY]
+    folders = {}
+    if not reset:
+        try:
+            with salt_files.fopen(_media_index_path(), 'r') as index_file_ptr:
+                folders = json.load(index_file_ptr)
+        except (IOError, ValueError):
+            LOGGER.debug('Media index not available in %s', _media_index_path())
+    __context__[MEDIA_INDEX_KEY] = {'folders': folders, 'dirty': reset}
+    return __context__[MEDIA_INDEX_KEY]
+
+
+def _save_media_index():
+    '''
+    Store the media index if it has changed. The entries of the removed folders are dropped.
+    The index is written in a temporary file renamed then, so the concurrent jobs don't
+    leave a truncated file
+    '''
+    index = __context__.get(MEDIA_INDEX_KEY)
+    if not index or not index['dirty']:
+        return
+    index['folders'] = {
+        folder: entry for folder, entry in index['folders'].items() if os.path.isdir(folder)}
+    index_path = _media_index_path()
+    tmp_path = '{}.{}.tmp'.format(index_path, os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(index_path)):
+            os.makedirs(os.path.dirname(index_path))
+        with salt_files.fopen(tmp_path, 'w') as index_file_ptr:
+            json.dump(index['folders'], index_file_ptr)
+        os.rename(tmp_path, index_path)
+        index['dirty'] = False
+    except (IOError, OSError) as err:
+        LOGGER.warning('Media index cannot be stored in %s: %s', index_path, err)
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _read_folder_data(folder, data_types, indexed, entry=None):
+    '''
+    Read the LABEL.ASC content, LABELIDX.ASC entries or subfolders of a SAP media folder.
+    If the media index is loaded (indexed), the data of the folder index entry is used
+    while the folder modification time doesn't change. It doesn't use the loader dunders,
+    so it can run in worker threads
+
+    data_types
+        List of label, labelidx or subfolders
+    entry
+        Media index entry of the folder
+
+    Returns:
+        tuple: data by type, updated index entry (None if it hasn't changed)
+    '''
+    if indexed:
+        try:
+            mtime = os.stat(folder).st_mtime
+        except OSError:
+            indexed = False
+    if not indexed:
+        return {data_type: _FOLDER_READERS[data_type](folder) for data_type in data_types}, None
+
+    changed = False
+    if entry is None or entry['mtime'] != mtime:
+        entry = {'mtime': mtime}
+        changed = True
+    for data_type in data_types:
+        if data_type not in entry:
+            if not changed:
+                entry = dict(entry)
+                changed = True
+            entry[data_type] = _FOLDER_READERS[data_type](folder)
+    return {data_type: entry[data_type] for data_type in data_types}, \
+        entry if changed else None
+
+
+def _update_media_index(index, folder, entry):
+    '''
+    Store the updated index entry of a folder
+    '''
+    if index is not None and entry is not None:
+        index['folders'][folder] = entry
+        index['dirty'] = True
+
+
+def _get_folder_data(folder, data_type):
+    '''
+    Get the LABEL.ASC content, LABELIDX.ASC entries or subfolders of a SAP media folder.
+    If the media index is loaded, the stored data is used while the folder modification
+    time doesn't change
+
+    data_type
+        label, labelidx or subfolders
+    '''
+    index = __context__.get(MEDIA_INDEX_KEY)
+    data, entry = _read_folder_data(
+        folder, [data_type], index is not None,
+        index['folders'].get(folder) if index is not None else None)
+    _update_media_index(index, folder, entry)
+    return data[data_type]
+
+
+def _read_folder_labels(folder, folder_pattern, indexed, entry):
+    '''
+    Read the LABEL.ASC file of a folder, and the LABELIDX.ASC file if the label doesn't
+    match the pattern. It runs in the worker threads, so the media index entry is given
+    and the updated one returned to be stored by the caller
+
+    Returns:
+        tuple: LABEL.ASC content, True if it matches the pattern, LABELIDX.ASC entries,
+        updated index entry (None if it hasn't changed)
+    '''
+    data, new_entry = _read_folder_data(folder, ['label'], indexed, entry)
+    label_content = data['label']
+    matched = label_content is not None and bool(folder_pattern.match(label_content))
+    labelidx_content = None
+    if not matched:
+        data, labelidx_entry = _read_folder_data(
+            folder, ['labelidx'], indexed, new_entry or entry)
+        labelidx_content = data['labelidx']
+        new_entry = labelidx_entry or new_entry
+    return label_content, matched, labelidx_content, new_entry
+
+
+def _find_sap_folder(software_folders, folder_pattern, recursion_level=0, workers=None):
     '''
-    Find a SAP folder following a recursive approach using the LABEL and LABELIDX files
+    Find a SAP folder following a recursive approach using the LABEL and LABELIDX files.
+    The label files of sibling folders are read concurrently, but the folders are checked
+    in the given order. The worker threads only read the files, the media index is
+    used and updated here
 
     Args:
         software_folder (list): List of subfolder where the SAP folder is looked for`
@@ -1054,51 +3164,384 @@ def _find_sap_folder(software_folders, folder_pattern, recursion_level=0):
             Examples:
                 1 means to check recursively in the subfolder present in software_folders folders
                 2 means to check in the first subfolder and the folder within
+        workers (ThreadPool): Threads pool used to read the folders. It is created in the
+            first call and used by the recursive ones
     '''
-    for folder in software_folders:
-        label = '{}/{}'.format(folder, LABEL_FILE)
-        try:
-            with salt_files.fopen(label, 'r') as label_file_ptr:
-                label_content = label_file_ptr.read().strip()
-                if folder_pattern.match(label_content):
-                    return folder
-                else:
-                    LOGGER.debug(
-                        '%s folder does not contain %s pattern', folder, folder_pattern.pattern)
-        except IOError:
-            LOGGER.debug('%s file not found in %s. Skipping folder', LABEL_FILE, folder)
-
-        labelidx = '{}/{}'.format(folder, LABELIDX_FILE)
-        try:
-            with salt_files.fopen(labelidx, 'r') as labelidx_file_ptr:
-                labelidx_content = labelidx_file_ptr.read().splitlines()
+    own_workers = None
+    if workers is None:
+        threads = __salt__['config.option']('hana.media_scan_threads', MEDIA_SCAN_THREADS)
+        if threads > 1:
+            workers = own_workers = ThreadPool(threads)
+    index = __context__.get(MEDIA_INDEX_KEY)
+    indexed = index is not None
+    folders = [(folder, index['folders'].get(folder) if indexed else None)
+               for folder in software_folders]
+    try:
+        if workers:
+            labels = workers.imap(
+                lambda item: _read_folder_labels(item[0], folder_pattern, indexed, item[1]),
+                folders)
+        else:
+            labels = (_read_folder_labels(folder, folder_pattern, indexed, entry)
+                      for folder, entry in folders)
+
+        for folder in software_folders:
+            label_content, matched, labelidx_content, entry = next(labels)
+            _update_media_index(index, folder, entry)
+            if label_content is None:
+                LOGGER.debug('%s file not found in %s. Skipping folder', LABEL_FILE, folder)
+            elif matched:
+                return folder
+            else:
+                LOGGER.debug(
+                    '%s folder does not contain %s pattern', folder, folder_pattern.pattern)
+
+            if labelidx_content is not None:
                 new_folders = [
                     '{}/{}'.format(folder, new_folder) for new_folder in labelidx_content]
                 try:
-                    return _find_sap_folder(new_folders, folder_pattern)
+                    return _find_sap_folder(new_folders, folder_pattern, 0, workers)
                 except SapFolderNotFoundError:
                     continue
-        except IOError:
-            LOGGER.debug('%s file not found in %s. Skipping folder', LABELIDX_FILE, folder)
+            else:
+                LOGGER.debug('%s file not found in %s. Skipping folder', LABELIDX_FILE, folder)
 
-        if recursion_level:
-            subfolders = [os.path.join(folder, found_dir) for found_dir in
-                          os.listdir(folder) if os.path.isdir(os.path.join(folder, found_dir))]
-            try:
-                return _find_sap_folder(subfolders, folder_pattern, recursion_level-1)
-            except SapFolderNotFoundError:
-                continue
+            if recursion_level:
+                subfolders = [os.path.join(folder, found_dir) for found_dir in
+                              _get_folder_data(folder, 'subfolders')]
+                try:
+                    return _find_sap_folder(
+                        subfolders, folder_pattern, recursion_level-1, workers)
+                except SapFolderNotFoundError:
+                    continue
+    finally:
+        if own_workers:
+            own_workers.terminate()
 
     raise SapFolderNotFoundError(
         'SAP folder with {} pattern not found'.format(folder_pattern.pattern))
 
 
+def _walk_sap_folders(software_folders, recursion_level):
+    '''
+    Walk the SAP folders as _find_sap_folder does, yielding the folders with a LABEL.ASC file
+    and its content. The folders data is stored in the media index if it's loaded
+    '''
+    for folder in software_folders:
+        label_content = _get_folder_data(folder, 'label')
+        if label_content is not None:
+            yield folder, label_content
+        labelidx_content = _get_folder_data(folder, 'labelidx')
+        if labelidx_content is not None:
+            for found in _walk_sap_folders(
+                    ['{}/{}'.format(folder, new_folder) for new_folder in labelidx_content], 0):
+                yield found
+        if recursion_level:
+            for found in _walk_sap_folders(
+                    [os.path.join(folder, found_dir) for found_dir in
+                     _get_folder_data(folder, 'subfolders')],
+                    recursion_level-1):
+                yield found
+
+
+def index_media(
+        software_folders,
+        recursion_level=1,
+        force=False):
+    '''
+    Index the SAP software media folders, so the next software lookups (as in extract_pydbapi)
+    don't need to read all the LABEL.ASC and LABELIDX.ASC files again. The index is stored in
+    the minion cache directory and the folders are read again if their modification time
+    changes
+
+    software_folders
+        Folders list where the SAP software is located
+    recursion_level
+        Number of subfolder levels to check
+    force
+        Discard the current index and read all the folders again
+
+    Returns:
+        dict: Found LABEL.ASC contents by folder
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.index_media '["/sapmedia/HANA", "/sapmedia/NW"]'
+    '''
+    if not isinstance(software_folders, list):
+        raise TypeError(
+            "software_folders must be a list, not {} type".format(type(software_folders).__name__)
+        )
+    _load_media_index(reset=force)
+    try:
+        return dict(_walk_sap_folders(software_folders, recursion_level))
+    finally:
+        _save_media_index()
+
+
+def find_media(
+        software_folders,
+        components=None,
+        patterns=None,
+        recursion_level=1,
+        hana_version='20',
+        all_matches=False):
+    '''
+    Find several SAP software components in the media folders at once, walking the folders
+    tree only one time. The components are identified by their LABEL.ASC file content
+
+    software_folders
+        Folders list where the SAP software is located
+    components
+        List of the default components to look for. Available options: HDB_SERVER and
+        HDB_CLIENT (both by default)
+    patterns
+        Dictionary with additional components to look for, with the component name as key and
+        the LABEL.ASC regular expression as value (e.g. SAPCAR, SWPM or the NetWeaver kernel
+        media)
+    recursion_level
+        Number of subfolder levels to check
+    hana_version
+        HANA version used in the HDB_SERVER and HDB_CLIENT default patterns
+    all_matches
+        Return all the folders matching each component instead of the first one. If False,
+        the walk stops as soon as all the components are found
+
+    Returns:
+        dict: Found folder (or folders list if all_matches is set) by component. The not found
+        components have None (or an empty list) as value
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.find_media '["/sapmedia"]'
+        salt '*' hana.find_media '["/sapmedia"]' components='[HDB_CLIENT]' patterns='{"SWPM": "^SWPM"}'
+    '''
+    if not isinstance(software_folders, list):
+        raise TypeError(
+            "software_folders must be a list, not {} type".format(type(software_folders).__name__)
+        )
+    current_platform = hana.HanaInstance.get_platform()
+    media_patterns = {}
+    for component in components if components is not None else sorted(MEDIA_COMPONENTS):
+        if component not in MEDIA_COMPONENTS:
+            raise exceptions.SaltInvocationError(
+                'Unknown component {}. Available options: {}'.format(
+                    component, ', '.join(sorted(MEDIA_COMPONENTS))))
+        media_patterns[component] = re.compile(MEDIA_COMPONENTS[component].format(
+            version=hana_version, platform=current_platform))
+    for component, pattern in (patterns or {}).items():
+        media_patterns[component] = re.compile(pattern)
+    if not media_patterns:
+        raise exceptions.SaltInvocationError('No component to look for')
+
+    found = {component: [] for component in media_patterns}
+    _load_media_index()
+    try:
+        for folder, label_content in _walk_sap_folders(software_folders, recursion_level):
+            for component, pattern in media_patterns.items():
+                if pattern.match(label_content) and (all_matches or not found[component]):
+                    found[component].append(folder)
+            if not all_matches and all(found.values()):
+                break
+    finally:
+        _save_media_index()
+
+    if all_matches:
+        return found
+    return {component: folders[0] if folders else None for component, folders in found.items()}
+
+
+def _find_pydbapi(name, software_folders, hana_version):
+    '''
+    Find the HANA pydbapi client archive in the software folders
+    '''
+    current_platform = hana.HanaInstance.get_platform()
+    hana_client_pattern = re.compile(MEDIA_COMPONENTS['HDB_CLIENT'].format(
+        version=hana_version, platform=current_platform))
+    _load_media_index()
+    try:
+        # recursion_level is set to 1 because the HANA client
+        # is extracted in SAP_HANA_CLIENT if the file is compressed as SAR
+        hana_client_folder = _find_sap_folder(
+            software_folders, hana_client_pattern, recursion_level=1)
+    except SapFolderNotFoundError:
+        raise exceptions.CommandExecutionError('HANA client not found')
+    finally:
+        _save_media_index()
+    return '{}/client/{}'.format(hana_client_folder, name)
+
+
+def _file_sha256(path):
+    '''
+    Get the sha256 checksum of a file reading it by chunks
+    '''
+    checksum = hashlib.sha256()
+    with salt_files.fopen(path, 'rb') as file_ptr:
+        for chunk in iter(lambda: file_ptr.read(1024 * 1024), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def _write_pydbapi_manifest(pydbapi_file, output_dir, files):
+    '''
+    Store the extracted archive data and the extracted files list in the output folder, so
+    the next runs can check if the extraction is still up to date
+    '''
+    manifest_path = os.path.join(output_dir, PYDBAPI_MANIFEST_FILE)
+    try:
+        stat = os.stat(pydbapi_file)
+        manifest = {
+            'archive': pydbapi_file,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'sha256': _file_sha256(pydbapi_file),
+            'files': files
+        }
+        with salt_files.fopen(manifest_path, 'w') as manifest_ptr:
+            json.dump(manifest, manifest_ptr)
+    except (IOError, OSError) as err:
+        LOGGER.warning('pydbapi manifest cannot be stored in %s: %s', manifest_path, err)
+
+
+def is_pydbapi_extracted(
+        name,
+        software_folders,
+        output_dir,
+        hana_version='20'):
+    '''
+    Check if the HANA pydbapi python client is already extracted in the output folder from the
+    same archive that is currently in the software folders. The manifest stored in the output
+    folder by extract_pydbapi is used for that. The archive checksum is only computed if its
+    size is the same but the modification time has changed. If the checksum matches, the new
+    modification time is stored in the manifest
+
+    name
+        Name of the pydbapi client archive
+    software_folders
+        Folders list where the HANA client is located
+    output_dir
+        Folder where the package is extracted
+    hana_version
+        HANA version of the client
+
+    Returns:
+        bool: True if the extracted files are up to date, False otherwise
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.is_pydbapi_extracted hdbcli-2.4.tar.gz '["/sapmedia"]' /tmp/pydbapi
+    '''
+    if not isinstance(software_folders, list):
+        raise TypeError(
+            "software_folders must be a list, not {} type".format(type(software_folders).__name__)
+        )
+    pydbapi_file = _find_pydbapi(name, software_folders, hana_version)
+    manifest_path = os.path.join(output_dir, PYDBAPI_MANIFEST_FILE)
+    try:
+        with salt_files.fopen(manifest_path, 'r') as manifest_ptr:
+            manifest = json.load(manifest_ptr)
+        stat = os.stat(pydbapi_file)
+    except (IOError, OSError, ValueError) as err:
+        LOGGER.debug('pydbapi manifest %s cannot be checked: %s', manifest_path, err)
+        return False
+
+    if manifest.get('archive') != pydbapi_file or manifest.get('size') != stat.st_size:
+        return False
+    if manifest.get('mtime') != stat.st_mtime:
+        if manifest.get('sha256') != _file_sha256(pydbapi_file):
+            return False
+        # Same content, so the new mtime is stored to avoid computing the checksum again
+        manifest['mtime'] = stat.st_mtime
+        try:
+            with salt_files.fopen(manifest_path, 'w') as manifest_ptr:
+                json.dump(manifest, manifest_ptr)
+        except (IOError, OSError) as err:
+            LOGGER.warning('pydbapi manifest cannot be stored in %s: %s', manifest_path, err)
+    return all(os.path.lexists(os.path.join(output_dir, extracted_file))
+               for extracted_file in manifest.get('files', []))
+
+
+def _is_unchanged(member, path):
+    '''
+    Check if the tar member is already extracted in path with the same size and mtime
+    '''
+    try:
+        stat = os.lstat(path)
+    except OSError:
+        return False
+    return stat.st_size == member.size and int(stat.st_mtime) == int(member.mtime)
+
+
+def _extract_tar(tar_file, output_dir, members=None):
+    '''
+    Extract a tar file in process, streaming its content. The regular files already present
+    in output_dir with the same size and modification time are skipped
+
+    tar_file
+        Tar file path (it can be compressed)
+    output_dir
+        Folder where the file is extracted
+    members
+        List of shell-style patterns (e.g. hdbcli*). Only the matching members are extracted
+
+    Returns:
+        dict: Extracted and skipped members, written bytes and extraction speed
+    '''
+    extracted = []
+    skipped = []
+    written = 0
+    start_time = time.time()
+    output_dir = os.path.abspath(output_dir)
+    # python versions with extraction filters warn if no filter is set
+    extract_kwargs = {'filter': 'tar'} if hasattr(tarfile, 'tar_filter') else {}
+    try:
+        # streaming mode reads the file sequentially only once
+        with tarfile.open(tar_file, 'r|*') as tar:
+            for member in tar:
+                if members and not any(
+                        fnmatch.fnmatch(member.name, pattern) for pattern in members):
+                    continue
+                path = os.path.abspath(os.path.join(output_dir, member.name))
+                if os.path.commonprefix([path, output_dir + os.sep]) != output_dir + os.sep:
+                    raise exceptions.CommandExecutionError(
+                        '{} member is outside of the output folder'.format(member.name))
+                if member.isfile() and _is_unchanged(member, path):
+                    skipped.append(member.name)
+                    continue
+                if member.isdir() and os.path.isdir(path):
+                    continue
+                tar.extract(member, output_dir, **extract_kwargs)
+                extracted.append(member.name)
+                written += member.size if member.isfile() else 0
+    except (tarfile.TarError, IOError, OSError) as err:
+        raise exceptions.CommandExecutionError(
+            'Error extracting {}: {}'.format(tar_file, err))
+
+    duration = time.time() - start_time
+    return {
+        'extracted': extracted,
+        'skipped': skipped,
+        'bytes': written,
+        'duration': duration,
+        'bytes_per_second': int(written / duration) if duration else written
+    }
+
+
 def extract_pydbapi(
         name,
         software_folders,
         output_dir,
         hana_version='20',
-        additional_extract_options=None):
+        additional_extract_options=None,
+        native=False,
+        members=None,
+        details=False):
     '''
     Extract HANA pydbapi python client from the provided software folders
 
@@ -1111,24 +3554,46 @@ def extract_pydbapi(
     output_dir
         Folder where the package is extracted
     additional_extract_options
-        Additional options to pass to the tar extraction command
+        Additional options to pass to the tar extraction command. Not used in native mode
+    native
+        Extract the file in process using python tarfile instead of the tar command. The files
+        already extracted with the same size and modification time are skipped
+    members
+        List of shell-style patterns of the files to extract, used in native mode
+        (e.g. ['hdbcli*', 'setup.py'])
+    details
+        Return the pydbapi file path and the extraction details (native mode only) as a
+        dictionary
+
+    CLI Example:
+
+    .. code-block:: bash
+
+        salt '*' hana.extract_pydbapi hdbcli-2.4.tar.gz '["/sapmedia"]' /tmp/pydbapi native=True
     '''
     if not isinstance(software_folders, list):
         raise TypeError(
             "software_folders must be a list, not {} type".format(type(software_folders).__name__)
         )
-    current_platform = hana.HanaInstance.get_platform()
     tar_options_str = ('{} -xvf'.format(additional_extract_options)
                        if additional_extract_options else '-xvf')
-    hana_client_pattern = re.compile('^HDB_CLIENT:{}.*:{}:.*'.format(
-        hana_version, current_platform))
-    try:
-        # recursion_level is set to 1 because the HANA client
-        # is extracted in SAP_HANA_CLIENT if the file is compressed as SAR
-        hana_client_folder = _find_sap_folder(
-            software_folders, hana_client_pattern, recursion_level=1)
-    except SapFolderNotFoundError:
-        raise exceptions.CommandExecutionError('HANA client not found')
-    pydbapi_file = '{}/client/{}'.format(hana_client_folder, name)
-    __salt__['archive.tar'](options=tar_options_str, tarfile=pydbapi_file, cwd=output_dir)
+    pydbapi_file = _find_pydbapi(name, software_folders, hana_version)
+    if native:
+        extraction = _extract_tar(pydbapi_file, output_dir, members)
+        LOGGER.info(
+            '%s extracted in %.2f seconds: %d files, %d skipped, %d bytes/s', pydbapi_file,
+            extraction['duration'], len(extraction['extracted']), len(extraction['skipped']),
+            extraction['bytes_per_second'])
+        files = extraction['extracted'] + extraction['skipped']
+    else:
+        output = __salt__['archive.tar'](
+            options=tar_options_str, tarfile=pydbapi_file, cwd=output_dir)
+        # the verbose tar output lists the extracted files
+        files = [line.strip() for line in output if line.strip()] \
+            if isinstance(output, list) else []
+        extraction = {}
+    _write_pydbapi_manifest(pydbapi_file, output_dir, files)
+    if details:
+        extraction['pydbapi'] = pydbapi_file
+        return extraction
     return pydbapi_file
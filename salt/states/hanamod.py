@@ -58,6 +58,12 @@ State module to provide SAP HANA functionality to Salt
 # Import python libs
 from __future__ import absolute_import, unicode_literals, print_function
 
+import logging
+import os
+import json
+import hashlib
+from multiprocessing.pool import ThreadPool
+
 # Import six - Python 2 and 3 compatibility library
 # Salt no longer vendors six (>=salt-3006.0)
 # https://github.com/saltstack/salt/issues/63874
@@ -68,12 +74,15 @@ except ImportError:
 
 # Import salt libs
 from salt import exceptions
+from salt.utils import files as salt_files
 
+LOGGER = logging.getLogger(__name__)
 
 __virtualname__ = 'hana'
 
 TMP_CONFIG_FILE = '/tmp/hana.conf'
 TMP_HDB_PWD_FILE = '/root/hdb_passwords.xml'
+INSTALL_CHECKPOINT_FILE = 'hana_install_{}.json'
 INI_PARAM_PRELOAD_CS = {'section_name': 'system_replication', 'parameter_name': 'preload_column_tables'}
 INI_PARAM_GAL = {'section_name': 'memorymanager', 'parameter_name': 'global_allocation_limit'}
 # This keys are retrieved from the xml passwords file created by hdbclm
@@ -110,13 +119,80 @@ def _parse_dict(dict_params):
     return output
 
 
+def _install_checkpoint_path(sid):
+    '''
+    Get the installation checkpoint file path. None if the minion cache directory is not known
+    '''
+    cachedir = __opts__.get('cachedir')
+    return os.path.join(cachedir, INSTALL_CHECKPOINT_FILE.format(sid)) if cachedir else None
+
+
+def _hide_passwords(parameters):
+    '''
+    Replace the passwords of the parameters (and of the nested dictionaries) by their digest
+    '''
+    return {
+        key: hashlib.sha256('{}'.format(value).encode('utf-8')).hexdigest()
+        if key in PASSWORD_KEYS and value is not None
+        else _hide_passwords(value) if isinstance(value, dict) else value
+        for key, value in parameters.items()}
+
+
+def _install_fingerprint(**parameters):
+    '''
+    Get a hash of the installation parameters. The passwords are included as a digest, and
+    the content of the passwords file with its hash, so a checkpoint is not used if any
+    credential changes
+    '''
+    parameters = _hide_passwords(parameters)
+    if parameters.get('hdb_pwd_file'):
+        parameters['hdb_pwd_file_hash'] = __salt__['cp.hash_file'](parameters['hdb_pwd_file'])
+    data = json.dumps(parameters, sort_keys=True, default=str)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def _load_install_checkpoint(checkpoint_path, fingerprint):
+    '''
+    Load the completed installation phases. Only the phases of an installation with the same
+    parameters whose output file still exists are returned
+    '''
+    if not checkpoint_path or not os.path.exists(checkpoint_path):
+        return {}
+    try:
+        with salt_files.fopen(checkpoint_path, 'r') as checkpoint_ptr:
+            checkpoint = json.load(checkpoint_ptr)
+    except (IOError, OSError, ValueError) as err:
+        LOGGER.warning('Installation checkpoint %s cannot be read: %s', checkpoint_path, err)
+        return {}
+    if checkpoint.get('fingerprint') != fingerprint:
+        return {}
+    return {phase: output for phase, output in checkpoint.get('phases', {}).items()
+            if os.path.isfile(output)}
+
+
+def _save_install_checkpoint(checkpoint_path, fingerprint, phases):
+    '''
+    Store the completed installation phases. The errors are only logged, as a missing
+    checkpoint only means that the phases are executed again
+    '''
+    if not checkpoint_path:
+        return
+    try:
+        with salt_files.fopen(checkpoint_path, 'w') as checkpoint_ptr:
+            json.dump({'fingerprint': fingerprint, 'phases': phases}, checkpoint_ptr)
+    except (IOError, OSError) as err:
+        LOGGER.warning('Installation checkpoint %s cannot be stored: %s', checkpoint_path, err)
+
+
 def available(
         name,
         port,
         user,
         password,
         timeout=60,
-        interval=5):
+        interval=5,
+        targets=None,
+        quorum=None):
     '''
     Wait until HANA is ready trying to connect to the database
 
@@ -132,6 +208,25 @@ def available(
         Timeout to try to connect to the database
     interval:
         Interval to try the connection
+    targets:
+        List of databases to check concurrently (SYSTEMDB and tenants in MDC systems).
+        Each entry is a port of the current host, a host:port string or a dictionary
+        with host, port and optionally user and password values. port is ignored
+        if it is set
+    quorum:
+        Number of available databases needed when targets is used. All of them by default
+
+    .. code-block:: yaml
+
+        hana01:
+          hana.available:
+            - port: 30013
+            - user: 'SYSTEM'
+            - password: 'Qwerty1234'
+            - targets:
+              - 30013
+              - 30041
+              - hana02:30044
     '''
     host = name
 
@@ -140,26 +235,133 @@ def available(
            'result': False,
            'comment': ''}
 
+    if targets:
+        targets = [
+            '{}:{}'.format(host, target)
+            if isinstance(target, six.integer_types) or six.text_type(target).isdigit()
+            else target
+            for target in targets]
+
     if __opts__['test']:
         ret['result'] = None
         ret['comment'] = 'hana connection would be checked'
+        if targets:
+            ret['comment'] = 'hana connection would be checked in {}'.format(
+                ', '.join(targets))
         return ret
 
     try:
-        __salt__['hana.wait_for_connection'](
-            host=host,
+        if targets:
+            results = __salt__['hana.wait_for_connections'](
+                targets=targets,
+                user=user,
+                password=password,
+                timeout=timeout,
+                interval=interval,
+                quorum=quorum)
+        else:
+            __salt__['hana.wait_for_connection'](
+                host=host,
+                port=port,
+                user=user,
+                password=password,
+                timeout=timeout,
+                interval=interval)
+    except (exceptions.CommandExecutionError, exceptions.SaltInvocationError) as err:
+        ret['comment'] = six.text_type(err)
+        return ret
+
+    ret['result'] = True
+    if targets:
+        ret['comment'] = 'HANA databases available: {}'.format(', '.join(
+            '{} ({:.1f}s)'.format(target, result['elapsed'])
+            for target, result in sorted(results.items()) if result['available']))
+    else:
+        ret['comment'] = 'HANA is available'
+
+    return ret
+
+
+def preloaded(
+        name,
+        port,
+        user,
+        password,
+        tables=None,
+        load=False,
+        threshold=100,
+        timeout=3600,
+        interval=5,
+        max_interval=60):
+    '''
+    Wait until the HANA column tables are loaded in memory
+
+    name:
+        Host where HANA is running
+    port:
+        HANA database port
+    user:
+        User to connect to the database
+    password:
+        Password to connect to the database
+    tables:
+        List of tables to check, in SCHEMA.TABLE format. The tables flagged for preload by
+        default
+    load:
+        Trigger the load of the given tables
+    threshold:
+        Percentage of loaded tables to consider the preload completed
+    timeout:
+        Timeout in seconds to wait for the preload
+    interval:
+        Initial interval in seconds between the load status checks
+    max_interval:
+        Maximum interval in seconds between the load status checks
+
+    .. code-block:: yaml
+
+        hana01:
+          hana.preloaded:
+            - port: 30015
+            - user: 'SYSTEM'
+            - password: 'Qwerty1234'
+            - threshold: 95
+            - require:
+              - hana: hana01
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': False,
+           'comment': ''}
+
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = 'Column tables preload would be checked on {}:{}'.format(name, port)
+        return ret
+
+    try:
+        status = __salt__['hana.wait_for_preload'](
+            host=name,
             port=port,
             user=user,
             password=password,
+            tables=tables,
+            load=load,
+            threshold=threshold,
             timeout=timeout,
-            interval=interval)
+            interval=interval,
+            max_interval=max_interval)
     except exceptions.CommandExecutionError as err:
         ret['comment'] = six.text_type(err)
         return ret
 
     ret['result'] = True
-    ret['comment'] = 'HANA is available'
-
+    ret['comment'] = 'Column tables preload completed on {}:{}: {}% loaded ({}/{}) in '\
+        '{:.1f} seconds, {} bytes/s'.format(
+            name, port, status['percentage'], status['loaded'], status['total'],
+            status['elapsed'], status['throughput'])
+    if load:
+        ret['changes']['loaded'] = tables
     return ret
 
 
@@ -175,7 +377,8 @@ def installed(
         remove_pwd_files=True,
         sapadm_password=None,
         system_user_password=None,
-        extra_parameters={}):
+        extra_parameters={},
+        resume=False):
     """
     Install SAP HANA if the platform is not installed yet. There are two ways of
     using in. The configuration file might be imported from the master to the minions
@@ -215,6 +418,14 @@ def installed(
         password of the database SYSTEM (superuser) user
     extra_parameters
         Optional configuration parameters (exact name as in the config file as a key)
+    resume
+        Reuse the phases completed by a previous failed execution with the same parameters
+        (the XML password file and the configuration file). The completed phases are
+        recorded in the minion cache directory, only if resume is set (so it must be set in
+        the failed execution too). False by default
+
+    The configuration template generation and the XML password file download run
+    concurrently.
     """
     sid = name
 
@@ -237,17 +448,41 @@ def installed(
         ret['changes']['sid'] = sid
         return ret
 
+    checkpoint_path = None
+    fingerprint = None
+    phases = {}
+    if resume:
+        checkpoint_path = _install_checkpoint_path(sid)
+        fingerprint = _install_fingerprint(
+            sid=sid, inst=inst, password=password, software_path=software_path,
+            root_user=root_user, root_password=root_password, config_file=config_file,
+            hdb_pwd_file=hdb_pwd_file, sapadm_password=sapadm_password,
+            system_user_password=system_user_password,
+            extra_parameters=_parse_dict(extra_parameters))
+        phases = _load_install_checkpoint(checkpoint_path, fingerprint)
+
+    workers = ThreadPool(2)
     try:
         #  Here starts the actual process
-        temp_file = __salt__['hana.create_conf_file'](
-            software_path=software_path,
-            conf_file=TMP_CONFIG_FILE,
-            root_user=root_user,
-            root_password=root_password)
-        if hdb_pwd_file:
-            __salt__['cp.get_file'](
-                path=hdb_pwd_file,
-                dest=TMP_HDB_PWD_FILE)
+        if phases:
+            ret['changes']['resumed'] = sorted(phases)
+        if 'config_file' not in phases or 'hdb_pwd_file' not in phases:
+            template = workers.apply_async(
+                __salt__['hana.create_conf_file'],
+                kwds={'software_path': software_path, 'conf_file': TMP_CONFIG_FILE,
+                      'root_user': root_user, 'root_password': root_password})
+            pwd_download = None
+            if hdb_pwd_file and 'hdb_pwd_file' not in phases:
+                pwd_download = workers.apply_async(
+                    __salt__['cp.get_file'],
+                    kwds={'path': hdb_pwd_file, 'dest': TMP_HDB_PWD_FILE})
+            temp_file = template.get()
+            if pwd_download:
+                pwd_download.get()
+
+        if 'hdb_pwd_file' in phases:
+            hdb_pwd_file = phases['hdb_pwd_file']
+        elif hdb_pwd_file:
             ret['changes']['hdb_pwd_file'] = hdb_pwd_file
             hdb_pwd_file = TMP_HDB_PWD_FILE
         elif system_user_password is None or sapadm_password is None:
@@ -270,25 +505,33 @@ def installed(
                 system_user_password=system_user_password,
                 **extra_keys)
             ret['changes']['hdb_pwd_file'] = 'new'
-        if config_file:
-            __salt__['cp.get_file'](
-                path=config_file,
-                dest=TMP_CONFIG_FILE)
-            ret['changes']['config_file'] = config_file
-            config_file = TMP_CONFIG_FILE
+        phases['hdb_pwd_file'] = hdb_pwd_file
+        _save_install_checkpoint(checkpoint_path, fingerprint, phases)
+
+        if 'config_file' in phases:
+            config_file = phases['config_file']
         else:
-            config_file = __salt__['hana.update_conf_file'](
-                conf_file=temp_file,
-                sid=sid.upper(),
-                number='{:0>2}'.format(inst),
-                root_user=root_user)
-            ret['changes']['config_file'] = 'new'
-        if extra_parameters:
-            extra_parameters = _parse_dict(extra_parameters)
-            extra_parameters = {key: value for (key, value) in extra_parameters.items() if key not in PASSWORD_KEYS}
-            config_file = __salt__['hana.update_conf_file'](
-                conf_file=config_file,
-                **extra_parameters)
+            if config_file:
+                __salt__['cp.get_file'](
+                    path=config_file,
+                    dest=TMP_CONFIG_FILE)
+                ret['changes']['config_file'] = config_file
+                config_file = TMP_CONFIG_FILE
+            else:
+                config_file = __salt__['hana.update_conf_file'](
+                    conf_file=temp_file,
+                    sid=sid.upper(),
+                    number='{:0>2}'.format(inst),
+                    root_user=root_user)
+                ret['changes']['config_file'] = 'new'
+            if extra_parameters:
+                extra_parameters = _parse_dict(extra_parameters)
+                extra_parameters = {key: value for (key, value) in extra_parameters.items() if key not in PASSWORD_KEYS}
+                config_file = __salt__['hana.update_conf_file'](
+                    conf_file=config_file,
+                    **extra_parameters)
+            phases['config_file'] = config_file
+            _save_install_checkpoint(checkpoint_path, fingerprint, phases)
 
         __salt__['hana.install'](
             software_path=software_path,
@@ -298,6 +541,8 @@ def installed(
             root_password=root_password)
         if remove_pwd_files:
             __salt__['file.remove'](hdb_pwd_file)
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
         ret['changes']['sid'] = sid
         ret['comment'] = 'HANA installed'
         ret['result'] = True
@@ -307,6 +552,7 @@ def installed(
         ret['comment'] = six.text_type(err)
         return ret
     finally:
+        workers.close()
         __salt__['file.remove']('{}.xml'.format(TMP_CONFIG_FILE))
 
 
@@ -372,6 +618,246 @@ def uninstalled(
         return ret
 
 
+def hosts_added(
+        name,
+        inst,
+        hdblcm_folder,
+        root_user,
+        root_password,
+        hdb_pwd_file,
+        add_hosts,
+        shared_path='/hana/shared',
+        validate=True,
+        parallel=None,
+        batch_size=None):
+    '''
+    Add hosts to a SAP HANA scale-out system. The hosts already included in the system
+    (with an instance folder in the shared folder) are skipped. The rest of them are
+    validated concurrently (ssh port, shared folder mount and <sid>adm user ids) before
+    running hdblcm, so the state fails before starting the installation if any host is not
+    ready
+
+    name
+        System id of the installed hana platform
+    inst
+        Instance number of the installed hana platform
+    hdblcm_folder
+        Path where hdblcm is installed
+    root_user
+        Root user name
+    root_password
+        Root user password
+    hdb_pwd_file
+        Path where XML password file exists
+    add_hosts
+        Hosts to add (same format as in hdblcm config or a list of entries)
+    shared_path
+        HANA shared folder path
+    validate
+        Validate the hosts before adding them. True by default
+    parallel
+        Maximum number of hosts validated at the same time. All of them by default
+    batch_size
+        Number of hosts added by every hdblcm execution. All of them at once by default
+    '''
+    sid = name
+
+    ret = {'name': sid,
+           'changes': {},
+           'result': False,
+           'comment': ''}
+
+    if not isinstance(add_hosts, (list, tuple)):
+        add_hosts = add_hosts.split(',')
+    instance_folder = os.path.join(shared_path, sid.upper(), 'HDB{:0>2}'.format(inst))
+    pending = [entry.strip() for entry in add_hosts if entry.strip() and
+               not __salt__['file.directory_exists'](
+                   os.path.join(instance_folder, entry.split(':')[0].strip()))]
+
+    if not pending:
+        ret['result'] = True
+        ret['comment'] = 'All hosts are already added to {}'.format(sid)
+        return ret
+
+    pending_hosts = [entry.split(':')[0] for entry in pending]
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = '{} would be added to {}'.format(', '.join(pending_hosts), sid)
+        ret['changes']['hosts'] = pending_hosts
+        return ret
+
+    try:
+        #  Here starts the actual process
+        if validate:
+            validation = __salt__['hana.validate_hosts'](
+                add_hosts=pending,
+                sid=sid,
+                shared_path=shared_path,
+                parallel=parallel)
+            if not validation['valid']:
+                ret['comment'] = 'Hosts validation failed: {}'.format('; '.join(
+                    '{}: {}'.format(host, ', '.join(result['errors']))
+                    for host, result in sorted(validation['hosts'].items())
+                    if not result['valid']))
+                return ret
+            if validation.get('warnings'):
+                ret['warnings'] = validation['warnings']
+
+        durations = __salt__['hana.add_hosts'](
+            add_hosts=','.join(pending),
+            hdblcm_folder=hdblcm_folder,
+            root_user=root_user,
+            root_password=root_password,
+            hdb_pwd_file=hdb_pwd_file,
+            batch_size=batch_size)
+        ret['changes']['hosts'] = durations
+        ret['comment'] = '{} added to {}'.format(', '.join(pending_hosts), sid)
+        ret['result'] = True
+        return ret
+
+    except (exceptions.CommandExecutionError, exceptions.SaltInvocationError) as err:
+        ret['comment'] = six.text_type(err)
+        return ret
+
+
+def _instances_state(name, instances, password, parallel, running):
+    '''
+    Start or stop the HANA instances that are not in the expected state concurrently
+    '''
+    action = 'started' if running else 'stopped'
+    ret = {'name': name,
+           'changes': {},
+           'result': False,
+           'comment': ''}
+
+    if not instances or not all(isinstance(instance, dict) for instance in instances):
+        ret['comment'] = 'instances must be a list of dictionaries with sid, inst and '\
+            'optionally password values'
+        return ret
+
+    pending = []
+    try:
+        for instance in instances:
+            status = __salt__['hana.status_snapshot'](
+                sid=instance.get('sid'),
+                inst=instance.get('inst'),
+                password=instance.get('password', password))
+            if not status['installed']:
+                ret['comment'] = 'HANA {}-{} is not installed properly with the provided '\
+                    'data'.format(instance.get('sid'), instance.get('inst'))
+                return ret
+            if status['running'] != running:
+                pending.append(instance)
+    except (exceptions.CommandExecutionError, exceptions.SaltInvocationError) as err:
+        ret['comment'] = six.text_type(err)
+        return ret
+
+    if not pending:
+        ret['result'] = True
+        ret['comment'] = 'HANA instances are already {}'.format(action)
+        return ret
+
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = 'HANA instances would be {}'.format(action)
+        ret['changes'] = {
+            '{}-{}'.format(instance['sid'], instance['inst']): action for instance in pending}
+        return ret
+
+    try:
+        results = __salt__['hana.start_many' if running else 'hana.stop_many'](
+            instances=pending,
+            password=password,
+            parallel=parallel)
+    except exceptions.SaltInvocationError as err:
+        ret['comment'] = six.text_type(err)
+        return ret
+
+    failed = []
+    for instance, result in sorted(results.items()):
+        if result['result']:
+            ret['changes'][instance] = action
+        else:
+            failed.append('{}: {}'.format(instance, result['comment']))
+    durations = ', '.join('{} ({:.1f}s)'.format(instance, result['duration'])
+                          for instance, result in sorted(results.items()))
+    if failed:
+        ret['comment'] = 'HANA instances not {}: {}'.format(action, ', '.join(failed))
+        return ret
+
+    ret['result'] = True
+    ret['comment'] = 'HANA instances {}: {}'.format(action, durations)
+    return ret
+
+
+def instances_started(
+        name,
+        instances,
+        password=None,
+        parallel=None):
+    '''
+    Ensure that several HANA instances (MCOS systems running in the same host for example) are
+    running. The stopped instances are started concurrently
+
+    name
+        Name of the state
+    instances
+        List of instances. Each entry is a dictionary with sid, inst and optionally password
+        values
+    password
+        HANA instances password, used if it's not set in the instance entry
+    parallel
+        Maximum number of instances started at the same time. All of them by default
+
+    .. code-block:: yaml
+
+        hana-instances:
+          hana.instances_started:
+            - password: 'Qwerty1234'
+            - instances:
+              - sid: 'prd'
+                inst: '00'
+              - sid: 'qas'
+                inst: '01'
+    '''
+    return _instances_state(name, instances, password, parallel, running=True)
+
+
+def instances_stopped(
+        name,
+        instances,
+        password=None,
+        parallel=None):
+    '''
+    Ensure that several HANA instances (MCOS systems running in the same host for example) are
+    stopped. The running instances are stopped concurrently
+
+    name
+        Name of the state
+    instances
+        List of instances. Each entry is a dictionary with sid, inst and optionally password
+        values
+    password
+        HANA instances password, used if it's not set in the instance entry
+    parallel
+        Maximum number of instances stopped at the same time. All of them by default
+
+    .. code-block:: yaml
+
+        hana-instances:
+          hana.instances_stopped:
+            - password: 'Qwerty1234'
+            - parallel: 1
+            - instances:
+              - sid: 'prd'
+                inst: '00'
+              - sid: 'qas'
+                inst: '01'
+                password: 'Qwerty5678'
+    '''
+    return _instances_state(name, instances, password, parallel, running=False)
+
+
 def sr_primary_enabled(
         name,
         sid,
@@ -414,6 +900,15 @@ def sr_primary_enabled(
             Database name to backup
         file:
             Backup file name
+        tenants (optional):
+            List of additional databases to backup concurrently (their backup file name
+            is the file name followed by the tenant name)
+        parallel (optional):
+            Maximum number of databases backed up at the same time
+        channels (optional):
+            Number of parallel channels used by the data backups with Backint. It's set in
+            the parallel_data_backup_backint_channels parameter of the SYSTEMDB global.ini
+            file before the backup, so it's kept for the later backups too
     '''
 
     ret = {'name': name,
@@ -421,18 +916,16 @@ def sr_primary_enabled(
            'result': False,
            'comment': ''}
 
-    if not __salt__['hana.is_installed'](sid, inst, password):
-        ret['comment'] = 'HANA is not installed properly with the provided data'
-        return ret
-
-    current_state = __salt__['hana.get_sr_state'](
-        sid=sid,
-        inst=inst,
-        password=password)
-    running = __salt__['hana.is_running'](
+    status = __salt__['hana.status_snapshot'](
         sid=sid,
         inst=inst,
         password=password)
+    if not status['installed']:
+        ret['comment'] = 'HANA is not installed properly with the provided data'
+        return ret
+
+    current_state = status['sr_state']
+    running = status['running']
 
     if running and current_state == 'PRIMARY':
         ret['result'] = True
@@ -468,6 +961,26 @@ def sr_primary_enabled(
             ret['changes']['userkey'] = userkey_data.get('key_name')
         if backup:
             backup_data = _parse_dict(backup)
+            backup_options = {
+                option: backup_data[option] for option in ('tenants', 'parallel')
+                if option in backup_data}
+            if backup_data.get('channels'):
+                __salt__['hana.set_ini_parameter'](
+                    ini_parameter_values=[{
+                        'section_name': 'backup',
+                        'parameter_name': 'parallel_data_backup_backint_channels',
+                        'parameter_value': backup_data['channels']}],
+                    database='SYSTEMDB',
+                    file_name='global.ini',
+                    layer='SYSTEM',
+                    reconfig=True,
+                    key_name=backup_data.get('key_name', None),
+                    user_name=backup_data.get('user_name', None),
+                    user_password=backup_data.get('user_password', None),
+                    sid=sid,
+                    inst=inst,
+                    password=password)
+                ret['changes']['backup_channels'] = backup_data['channels']
             __salt__['hana.create_backup'](
                 key_name=backup_data.get('key_name', None),
                 user_name=backup_data.get('user_name', None),
@@ -476,7 +989,8 @@ def sr_primary_enabled(
                 backup_name=backup_data.get('file'),
                 sid=sid,
                 inst=inst,
-                password=password)
+                password=password,
+                **backup_options)
             ret['changes']['backup'] = backup_data.get('file')
         __salt__['hana.sr_enable_primary'](
             name=name,
@@ -541,21 +1055,16 @@ def sr_secondary_registered(
            'result': False,
            'comment': ''}
 
-    if not __salt__['hana.is_installed'](
-            sid=sid,
-            inst=inst,
-            password=password):
-        ret['comment'] = 'HANA is not installed properly with the provided data'
-        return ret
-
-    current_state = __salt__['hana.get_sr_state'](
-        sid=sid,
-        inst=inst,
-        password=password)
-    running = __salt__['hana.is_running'](
+    status = __salt__['hana.status_snapshot'](
         sid=sid,
         inst=inst,
         password=password)
+    if not status['installed']:
+        ret['comment'] = 'HANA is not installed properly with the provided data'
+        return ret
+
+    current_state = status['sr_state']
+    running = status['running']
 
     if running and current_state == 'SECONDARY':
         ret['result'] = True
@@ -605,6 +1114,80 @@ def sr_secondary_registered(
         return ret
 
 
+def sr_wait_synced(
+        name,
+        port,
+        user,
+        password,
+        secondary=None,
+        timeout=86400,
+        interval=10,
+        max_interval=300):
+    '''
+    Wait until the system replication is synchronized (REPLICATION_STATUS is ACTIVE for all
+    the services), reporting the shipped data, the throughput and the estimated remaining
+    time. It must be executed in the primary node
+
+    name:
+        Host where the primary HANA is running
+    port:
+        HANA database port (SYSTEMDB port to check all the databases)
+    user:
+        User to connect to the database
+    password:
+        Password to connect to the database
+    secondary:
+        Secondary host name. All the secondaries by default
+    timeout:
+        Timeout in seconds to wait for the synchronization
+    interval:
+        Initial interval in seconds between the status checks
+    max_interval:
+        Maximum interval in seconds between the status checks
+
+    .. code-block:: yaml
+
+        hana01:
+          hana.sr_wait_synced:
+            - port: 30013
+            - user: 'SYSTEM'
+            - password: 'Qwerty1234'
+            - secondary: hana02
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': False,
+           'comment': ''}
+
+    if __opts__['test']:
+        ret['result'] = None
+        ret['comment'] = 'System replication synchronization would be checked on {}:{}'.format(
+            name, port)
+        return ret
+
+    try:
+        status = __salt__['hana.wait_for_sr_sync'](
+            host=name,
+            port=port,
+            user=user,
+            password=password,
+            secondary=secondary,
+            timeout=timeout,
+            interval=interval,
+            max_interval=max_interval)
+    except exceptions.CommandExecutionError as err:
+        ret['comment'] = six.text_type(err)
+        return ret
+
+    ret['result'] = True
+    ret['comment'] = \
+        'System replication synchronized on {}:{}: {} services active, {} bytes shipped in '\
+        '{:.1f} seconds ({} bytes/s)'.format(
+            name, port, status['total'], status['shipped_bytes'], status['elapsed'],
+            status['throughput'])
+    return ret
+
+
 def sr_clean(
         name,
         inst,
@@ -629,21 +1212,16 @@ def sr_clean(
            'result': False,
            'comment': ''}
 
-    if not __salt__['hana.is_installed'](
-            sid=sid,
-            inst=inst,
-            password=password):
-        ret['comment'] = 'HANA is not installed properly with the provided data'
-        return ret
-
-    current_state = __salt__['hana.get_sr_state'](
-        sid=sid,
-        inst=inst,
-        password=password)
-    running = __salt__['hana.is_running'](
+    status = __salt__['hana.status_snapshot'](
         sid=sid,
         inst=inst,
         password=password)
+    if not status['installed']:
+        ret['comment'] = 'HANA is not installed properly with the provided data'
+        return ret
+
+    current_state = status['sr_state']
+    running = status['running']
 
     if current_state == 'DISABLED':
         ret['result'] = True
@@ -682,6 +1260,36 @@ def sr_clean(
         return ret
 
 
+def _ini_value(value):
+    '''
+    Normalize an ini parameter value to compare it with the value stored by HANA
+    '''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return six.text_type(value).strip().lower()
+
+
+def _ini_parameters_diff(ini_parameter_values, current_values):
+    '''
+    Get the ini parameters which value differs from the current one
+
+    ini_parameter_values
+        List of desired parameters as used by hana.set_ini_parameter
+    current_values
+        Current values by section and parameter name, as returned by hana.get_ini_parameters
+
+    Returns:
+        dict: Changed parameters with their old and new values by section/parameter name
+    '''
+    diff = {}
+    for param in ini_parameter_values:
+        current = current_values.get(param['section_name'], {}).get(param['parameter_name'])
+        if current is None or _ini_value(current) != _ini_value(param['parameter_value']):
+            diff['{}/{}'.format(param['section_name'], param['parameter_name'])] = {
+                'old': current, 'new': param['parameter_value']}
+    return diff
+
+
 def memory_resources_updated(
         name,
         global_allocation_limit,
@@ -690,10 +1298,13 @@ def memory_resources_updated(
         user_password,
         sid,
         inst,
-        password):
+        password,
+        sql_port=None,
+        restart=False):
     '''
     Update memory resources of a running HANA system by changing column preload behavior
-    and changing the memory allocation size of HANA instance
+    and changing the memory allocation size of HANA instance. The current values are read
+    first, so only the changed values are set
     name:
         Host name of system installed hana platform
     global_allocation_limit:
@@ -710,6 +1321,11 @@ def memory_resources_updated(
         Instance number of the installed hana platform
     password
         Password of the installed hana platform user
+    sql_port
+        SYSTEMDB SQL port used to read the current values (3{inst}13 by default)
+    restart
+        Restart HANA if any value is changed. The global allocation limit is applied
+        online, so it is not needed by default
     '''
     INI_PARAM_PRELOAD_CS['parameter_value'] = preload_column_tables
     INI_PARAM_GAL['parameter_value'] = global_allocation_limit
@@ -720,14 +1336,41 @@ def memory_resources_updated(
            'result': False,
            'comment': ''}
 
-    if not __salt__['hana.is_installed'](
-            sid=sid,
-            inst=inst,
-            password=password):
+    status = __salt__['hana.status_snapshot'](
+        sid=sid,
+        inst=inst,
+        password=password)
+    if not status['installed']:
         ret['comment'] = 'HANA is not installed properly with the provided data'
         return ret
 
+    running = status['running']
+    sql_port = sql_port or '3{}13'.format(inst)
+
+    def _get_diff():
+        '''
+        Get the changed parameters. All of them are considered changed if the current values
+        cannot be read
+        '''
+        try:
+            current_values = __salt__['hana.get_ini_parameters'](
+                host=name,
+                port=sql_port,
+                user=user_name,
+                password=user_password,
+                file_name='global.ini',
+                layer='SYSTEM',
+                sections=[param['section_name'] for param in ini_parameter_values])
+        except exceptions.CommandExecutionError:
+            current_values = {}
+        return _ini_parameters_diff(ini_parameter_values, current_values)
+
     if __opts__['test']:
+        diff = _get_diff() if running else None
+        if diff == {}:
+            ret['result'] = True
+            ret['comment'] = 'Memory resources are already updated on {}-{}'.format(name, sid)
+            return ret
         ret['result'] = None
         ret['comment'] = 'Memory resources would be updated on {}-{}'.format(name, sid)
         ret['changes']['sid'] = sid
@@ -735,12 +1378,6 @@ def memory_resources_updated(
         ret['changes']['preload_column_tables'] = preload_column_tables
         return ret
 
-    running = __salt__['hana.is_running'](
-        sid=sid,
-        inst=inst,
-        password=password)
-    # TODO: check existing memory settings
-
     try:
         # ensure HANA is running for SQL to execute
         if not running:
@@ -749,8 +1386,17 @@ def memory_resources_updated(
                 inst=inst,
                 password=password)
 
+        diff = _get_diff()
+        if not diff:
+            ret['result'] = True
+            ret['comment'] = 'Memory resources are already updated on {}-{}'.format(name, sid)
+            return ret
+
+        changed_values = [
+            param for param in ini_parameter_values
+            if '{}/{}'.format(param['section_name'], param['parameter_name']) in diff]
         __salt__['hana.set_ini_parameter'](
-            ini_parameter_values=ini_parameter_values,
+            ini_parameter_values=changed_values,
             database='SYSTEMDB',
             file_name='global.ini',
             layer='SYSTEM',
@@ -761,34 +1407,171 @@ def memory_resources_updated(
             sid=sid,
             inst=inst,
             password=password)
-        ret['changes']['global_allocation_limit'] = global_allocation_limit
-        ret['changes']['preload_column_tables'] = preload_column_tables
-        # restart HANA for memory changes to take effect
-        __salt__['hana.stop'](
-            sid=sid,
-            inst=inst,
-            password=password)
-        __salt__['hana.start'](
-            sid=sid,
-            inst=inst,
-            password=password)
+        for param in changed_values:
+            ret['changes'][param['parameter_name']] = param['parameter_value']
         ret['changes']['sid'] = sid
         ret['comment'] = 'Memory resources updated on {}-{}'.format(name, sid)
         ret['result'] = True
+
+        if restart:
+            __salt__['hana.stop'](
+                sid=sid,
+                inst=inst,
+                password=password)
+            __salt__['hana.start'](
+                sid=sid,
+                inst=inst,
+                password=password)
+            ret['changes']['restarted'] = True
         return ret
 
     except exceptions.CommandExecutionError as err:
         ret['comment'] = six.text_type(err)
+        ret['result'] = False
         return ret
 
 
+def ini_parameters_present(
+        name,
+        ini_parameters,
+        user_name,
+        user_password,
+        sid,
+        inst,
+        password,
+        database='SYSTEMDB',
+        layer='SYSTEM',
+        layer_name=None,
+        reconfig=True,
+        sql_port=None):
+    '''
+    Ensure that HANA ini configuration parameters have the given values. The current values
+    of all the files are read with one query and only the changed parameters are set, with one
+    configuration change per file
+
+    name
+        Host name where HANA is running
+    ini_parameters
+        Dictionary with the parameters values by file, section and parameter name. Example:
+
+        .. code-block:: yaml
+
+            global.ini:
+              memorymanager:
+                global_allocation_limit: 25000
+            indexserver.ini:
+              sql:
+                plan_cache_size: 2048
+
+    user_name
+        User to connect to sap hana db
+    user_password
+        Password to connect to sap hana db
+    sid
+        System id of the installed hana platform
+    inst
+        Instance number of the installed hana platform
+    password
+        Password of the installed hana platform user
+    database
+        Database name where the parameters are set
+    layer
+        Target layer for the configuration change (SYSTEM, DATABASE or HOST)
+    layer_name
+        Target tenant name (DATABASE layer) or host name (HOST layer)
+    reconfig
+        Apply the changes to the running HANA instance
+    sql_port
+        SYSTEMDB SQL port used to read the current values (3{inst}13 by default)
+    '''
+    ret = {'name': name,
+           'changes': {},
+           'result': False,
+           'comment': ''}
+
+    status = __salt__['hana.status_snapshot'](
+        sid=sid,
+        inst=inst,
+        password=password)
+    if not status['installed']:
+        ret['comment'] = 'HANA is not installed properly with the provided data'
+        return ret
+    if not status['running']:
+        ret['comment'] = 'HANA must be running to update the ini parameters'
+        return ret
+
+    try:
+        current_values = __salt__['hana.get_ini_parameters'](
+            host=name,
+            port=sql_port or '3{}13'.format(inst),
+            user=user_name,
+            password=user_password,
+            file_name=sorted(ini_parameters),
+            layer=layer,
+            layer_name=layer_name)
+    except exceptions.CommandExecutionError as err:
+        ret['comment'] = six.text_type(err)
+        return ret
+
+    changed = []
+    for file_name in sorted(ini_parameters):
+        ini_parameter_values = [
+            {'section_name': section, 'parameter_name': param, 'parameter_value': value}
+            for section, params in sorted(ini_parameters[file_name].items())
+            for param, value in sorted(params.items())]
+        diff = _ini_parameters_diff(ini_parameter_values, current_values.get(file_name, {}))
+        if diff:
+            changed.append((file_name, diff, [
+                param for param in ini_parameter_values
+                if '{}/{}'.format(param['section_name'], param['parameter_name']) in diff]))
+
+    if not changed:
+        ret['result'] = True
+        ret['comment'] = 'HANA ini parameters are already set'
+        return ret
+
+    if __opts__['test']:
+        for file_name, diff, _ in changed:
+            for param_name, values in diff.items():
+                ret['changes']['{}/{}'.format(file_name, param_name)] = values
+        ret['result'] = None
+        ret['comment'] = '{} HANA ini parameters would be changed'.format(len(ret['changes']))
+        return ret
+
+    for file_name, diff, ini_parameter_values in changed:
+        try:
+            __salt__['hana.set_ini_parameter'](
+                ini_parameter_values=ini_parameter_values,
+                database=database,
+                file_name=file_name,
+                layer=layer,
+                layer_name=layer_name,
+                reconfig=reconfig,
+                user_name=user_name,
+                user_password=user_password,
+                sid=sid,
+                inst=inst,
+                password=password)
+        except exceptions.CommandExecutionError as err:
+            ret['comment'] = six.text_type(err)
+            return ret
+        for param_name, values in diff.items():
+            ret['changes']['{}/{}'.format(file_name, param_name)] = values
+
+    ret['result'] = True
+    ret['comment'] = '{} HANA ini parameters changed'.format(len(ret['changes']))
+    return ret
+
+
 def pydbapi_extracted(
         name,
         software_folders,
         output_dir,
         hana_version='20',
         force=False,
-        additional_extract_options=None):
+        additional_extract_options=None,
+        native=False,
+        members=None):
     '''
     Extract HANA pydbapi python client from the provided software folders
 
@@ -801,9 +1584,17 @@ def pydbapi_extracted(
     output_dir
         Folder where the package is extracted
     force
-        Force new extraction if the file already is extracted
+        Force new extraction if the file already is extracted. Otherwise, the file is only
+        extracted if the manifest stored in output_dir by a previous extraction doesn't match
+        the current archive
     additional_extract_options
         Additional options to pass to the tar extraction command
+    native
+        Extract the file in process instead of using the tar command. The already extracted
+        files with the same size and modification time are skipped, so forced extractions are
+        cheap
+    members
+        List of shell-style patterns of the files to extract (only used in native mode)
     '''
 
     ret = {'name': name,
@@ -812,11 +1603,18 @@ def pydbapi_extracted(
            'comment': ''}
 
     if not force and __salt__['file.directory_exists'](output_dir):
-        ret['result'] = True
-        ret['comment'] = \
-            '{} already exists. Skipping extraction (set force to True to force the '\
-            'extraction)'.format(output_dir)
-        return ret
+        try:
+            extracted = __salt__['hana.is_pydbapi_extracted'](
+                name, software_folders, output_dir, hana_version)
+        except exceptions.CommandExecutionError as err:
+            ret['comment'] = six.text_type(err)
+            return ret
+        if extracted:
+            ret['result'] = True
+            ret['comment'] = \
+                '{} is already extracted from the current archive. Skipping extraction (set '\
+                'force to True to force the extraction)'.format(output_dir)
+            return ret
 
     if __opts__['test']:
         ret['result'] = None
@@ -827,18 +1625,37 @@ def pydbapi_extracted(
     __salt__['file.mkdir'](output_dir)
 
     try:
-        client = __salt__['hana.extract_pydbapi'](
-            name,
-            software_folders,
-            output_dir,
-            hana_version,
-            additional_extract_options)
+        if native:
+            extraction = __salt__['hana.extract_pydbapi'](
+                name,
+                software_folders,
+                output_dir,
+                hana_version,
+                native=True,
+                members=members,
+                details=True)
+            client = extraction['pydbapi']
+        else:
+            client = __salt__['hana.extract_pydbapi'](
+                name,
+                software_folders,
+                output_dir,
+                hana_version,
+                additional_extract_options)
     except exceptions.CommandExecutionError as err:
         ret['comment'] = six.text_type(err)
         return ret
 
     ret['result'] = True
+    if native and not extraction['extracted']:
+        ret['comment'] = '{} already extracted in {}'.format(client, output_dir)
+        return ret
+
     ret['comment'] = '{} correctly extracted'.format(client)
     ret['changes'] = {'pydbapi': client, 'output_dir': output_dir}
+    if native:
+        ret['comment'] += ' ({} files, {} unchanged files skipped, {} bytes/s)'.format(
+            len(extraction['extracted']), len(extraction['skipped']),
+            extraction['bytes_per_second'])
 
     return ret
@@ -3,8 +3,22 @@
 PYTHON=python3
 test -f /usr/bin/python2 && PYTHON=python2
 
+# salt >= 3006 only has the pytest based grains and beacons tests
+GRAINS_TESTS=../salt/tests/unit/grains
+test -d ../salt/tests/pytests/unit/grains && GRAINS_TESTS=../salt/tests/pytests/unit/grains
+BEACONS_TESTS=../salt/tests/unit/beacons
+test -d ../salt/tests/pytests/unit/beacons && BEACONS_TESTS=../salt/tests/pytests/unit/beacons
+
 cp salt/modules/*.py ../salt/salt/modules/
 cp salt/states/*.py ../salt/salt/states/
+cp salt/grains/hanamod.py ../salt/salt/grains/
+cp salt/beacons/hanamod.py ../salt/salt/beacons/
 cp tests/unit/modules/*.py ../salt/tests/unit/modules/
 cp tests/unit/states/*.py ../salt/tests/unit/states/
-cd ../salt && $PYTHON -m pytest -vv ../salt/tests/unit/modules/test_hanamod.py ../salt/tests/unit/states/test_hanamod.py  ../salt/tests/unit/modules/test_crmshmod.py  ../salt/tests/unit/modules/test_saptunemod.py ../salt/tests/unit/modules/test_sapcarmod.py ../salt/tests/unit/states/test_crmshmod.py ../salt/tests/unit/modules/test_drbdmod.py ../salt/tests/unit/states/test_drbdmod.py ../salt/tests/unit/states/test_saptunemod.py ../salt/tests/unit/modules/test_netweavermod.py ../salt/tests/unit/states/test_netweavermod.py ../salt/tests/unit/states/test_sapcarmod.py --cov=salt.modules.hanamod --cov=salt.states.hanamod --cov=salt.modules.crmshmod --cov=salt.states.crmshmod --cov=salt.modules.drbdmod --cov=salt.modules.saptunemod --cov=salt.modules.sapcarmod --cov=salt.states.saptunemod --cov=salt.states.drbdmod --cov=salt.modules.netweavermod --cov=salt.states.netweavermod --cov=salt.states.sapcarmod --cov-config .coveragerc --cov-report term --cov-report xml --cov-report html
+mkdir -p $GRAINS_TESTS
+test -f $GRAINS_TESTS/__init__.py || cp tests/unit/grains/__init__.py $GRAINS_TESTS/
+cp tests/unit/grains/test_hanamod.py $GRAINS_TESTS/test_hanamod_grains.py
+mkdir -p $BEACONS_TESTS
+test -f $BEACONS_TESTS/__init__.py || cp tests/unit/beacons/__init__.py $BEACONS_TESTS/
+cp tests/unit/beacons/test_hanamod.py $BEACONS_TESTS/test_hanamod_beacon.py
+cd ../salt && $PYTHON -m pytest -vv ../salt/tests/unit/modules/test_hanamod.py ../salt/tests/unit/states/test_hanamod.py $GRAINS_TESTS/test_hanamod_grains.py $BEACONS_TESTS/test_hanamod_beacon.py  ../salt/tests/unit/modules/test_crmshmod.py  ../salt/tests/unit/modules/test_saptunemod.py ../salt/tests/unit/modules/test_sapcarmod.py ../salt/tests/unit/states/test_crmshmod.py ../salt/tests/unit/modules/test_drbdmod.py ../salt/tests/unit/states/test_drbdmod.py ../salt/tests/unit/states/test_saptunemod.py ../salt/tests/unit/modules/test_netweavermod.py ../salt/tests/unit/states/test_netweavermod.py ../salt/tests/unit/states/test_sapcarmod.py --cov=salt.modules.hanamod --cov=salt.states.hanamod --cov=salt.grains.hanamod --cov=salt.beacons.hanamod --cov=salt.modules.crmshmod --cov=salt.states.crmshmod --cov=salt.modules.drbdmod --cov=salt.modules.saptunemod --cov=salt.modules.sapcarmod --cov=salt.states.saptunemod --cov=salt.states.drbdmod --cov=salt.modules.netweavermod --cov=salt.states.netweavermod --cov=salt.states.sapcarmod --cov-config .coveragerc --cov-report term --cov-report xml --cov-report html
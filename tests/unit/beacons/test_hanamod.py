@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+'''
+    Unit tests for salt.beacons.hanamod
+'''
+# Import Python libs
+from __future__ import absolute_import, unicode_literals, print_function
+
+from salt import exceptions
+
+# Import Salt Testing Libs
+from tests.support.mixins import LoaderModuleMockMixin
+from tests.support.unit import TestCase
+from tests.support import mock
+from tests.support.mock import (
+    MagicMock,
+    patch
+)
+
+# Import Salt Libs
+import salt.beacons.hanamod as hanamod
+
+
+class HanaBeaconTestCase(TestCase, LoaderModuleMockMixin):
+    '''
+    Test cases for salt.beacons.hanamod
+    '''
+    def setup_loader_modules(self):
+        return {hanamod: {'__context__': {}}}
+
+    def test_validate(self):
+        '''
+        Test validate method
+        '''
+        assert hanamod.validate({'sid': 'prd'}) == (
+            False, 'Configuration for hana beacon must be a list')
+        assert hanamod.validate([{'sid': 'prd'}, {'inst': '00'}]) == (
+            True, 'Valid beacon configuration')
+        assert hanamod.validate([{'replication': {'host': 'hana01', 'port': 30013}}]) == (
+            False, 'replication configuration for hana beacon must be a dictionary with '
+            'host, port, user, password keys')
+        assert hanamod.validate([{'replication': {
+            'host': 'hana01', 'port': 30013, 'user': 'SYSTEM', 'password': 'pass'}}])[0]
+
+    def test_beacon(self):
+        '''
+        Test beacon method - only changes are sent
+        '''
+        config = [{'sid': 'prd'}, {'inst': '00'}, {'password': 'pass'}]
+        mock_snapshot = MagicMock(side_effect=[
+            {'installed': True, 'running': True, 'sr_state': 'SECONDARY'},
+            {'installed': True, 'running': True, 'sr_state': 'SECONDARY'},
+            {'installed': True, 'running': True, 'sr_state': 'PRIMARY'}])
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_snapshot}):
+            assert hanamod.beacon(config) == []
+            assert hanamod.beacon(config) == []
+            assert hanamod.beacon(config) == [{
+                'tag': 'prd/00', 'sid': 'prd', 'inst': '00',
+                'old': {'running': True, 'sr_state': 'SECONDARY'},
+                'new': {'running': True, 'sr_state': 'PRIMARY'}}]
+        mock_snapshot.assert_called_with(sid='prd', inst='00', password='pass', ttl=0)
+
+    def test_beacon_replication(self):
+        '''
+        Test beacon method - replication status changes
+        '''
+        config = [{'replication': {
+            'host': 'hana01', 'port': 30013, 'user': 'SYSTEM', 'password': 'pass'}}]
+        mock_option = MagicMock(side_effect=lambda option: {
+            'hana.sid': 'prd', 'hana.inst': '00'}[option])
+        mock_snapshot = MagicMock(
+            return_value={'installed': True, 'running': True, 'sr_state': 'PRIMARY'})
+        mock_replication = MagicMock(side_effect=[
+            {'services': {'hana01:30001': {'secondary': 'hana02', 'status': 'ACTIVE'}},
+             'synced': True},
+            {'services': {'hana01:30001': {'secondary': 'hana02', 'status': 'ERROR'}},
+             'synced': False}])
+        with patch.dict(hanamod.__salt__, {'config.option': mock_option,
+                                           'hana.status_snapshot': mock_snapshot,
+                                           'hana.sr_replication_status': mock_replication}):
+            assert hanamod.beacon(config) == []
+            assert hanamod.beacon(config) == [{
+                'tag': 'prd/00', 'sid': 'prd', 'inst': '00',
+                'old': {'running': True, 'sr_state': 'PRIMARY',
+                        'replication': {'hana01:30001': 'ACTIVE'}, 'synced': True},
+                'new': {'running': True, 'sr_state': 'PRIMARY',
+                        'replication': {'hana01:30001': 'ERROR'}, 'synced': False}}]
+        mock_replication.assert_has_calls([
+            mock.call(host='hana01', port=30013, user='SYSTEM', password='pass')] * 2)
+
+    def test_beacon_error(self):
+        '''
+        Test beacon method - the status cannot be retrieved
+        '''
+        mock_snapshot = MagicMock(side_effect=exceptions.CommandExecutionError('hana error'))
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_snapshot}):
+            assert hanamod.beacon([{'sid': 'prd'}, {'inst': '00'}]) == []
+        assert hanamod.__context__ == {}
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+'''
+    Unit tests for salt.grains.hanamod
+'''
+# Import Python libs
+from __future__ import absolute_import, unicode_literals, print_function
+
+import os
+import shutil
+import tempfile
+
+# Import Salt Testing Libs
+from tests.support.mixins import LoaderModuleMockMixin
+from tests.support.unit import TestCase
+from tests.support.mock import (
+    MagicMock,
+    patch
+)
+
+# Import Salt Libs
+import salt.grains.hanamod as hanamod
+
+
+SAPSERVICES = '''#!/bin/sh
+LD_LIBRARY_PATH=/usr/sap/PRD/HDB00/exe:$LD_LIBRARY_PATH;export LD_LIBRARY_PATH;/usr/sap/PRD/HDB00/exe/sapstartsrv pf=/usr/sap/PRD/SYS/profile/PRD_HDB00_hana01 -D -u prdadm
+systemctl --no-ask-password start SAPQAS_01 # sapstartsrv pf=/usr/sap/QAS/SYS/profile/QAS_HDB01_hana01
+# systemctl --no-ask-password start SAPDEV_02 # sapstartsrv pf=/usr/sap/DEV/SYS/profile/DEV_HDB02_hana01
+systemctl --no-ask-password start SAPHA0_10 # sapstartsrv pf=/usr/sap/HA0/SYS/profile/HA0_ASCS10_hana01
+'''
+
+GLOBAL_INI = '''[persistence]
+basepath_datavolumes = /hana/data/PRD
+
+[system_replication]
+mode = {mode}
+actual_mode = {mode}
+site_name = {site}
+'''
+
+
+class HanaGrainsTestCase(TestCase, LoaderModuleMockMixin):
+    '''
+    Test cases for salt.grains.hanamod
+    '''
+    def setup_loader_modules(self):
+        return {hanamod: {'__opts__': {}}}
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.sapservices = os.path.join(self.root, 'sapservices')
+        self.shared = os.path.join(self.root, 'shared')
+        self.global_ini = os.path.join(self.root, '{sid}.ini')
+        for patcher in [
+                patch.object(hanamod, 'SAPSERVICES_FILE', self.sapservices),
+                patch.object(hanamod, 'HANA_SHARED_FOLDER', self.shared),
+                patch.object(hanamod, 'GLOBAL_INI_FILE', self.global_ini)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _write(self, path, content):
+        with open(path, 'w') as file_ptr:
+            file_ptr.write(content)
+
+    def test_read_sapservices(self):
+        '''
+        Test _read_sapservices method
+        '''
+        assert hanamod._read_sapservices() == {}
+        self._write(self.sapservices, SAPSERVICES)
+        assert hanamod._read_sapservices() == {'PRD': '00', 'QAS': '01'}
+
+    def test_read_hana_shared(self):
+        '''
+        Test _read_hana_shared method
+        '''
+        assert hanamod._read_hana_shared() == {}
+        for folder in ['PRD/HDB00/hana01', 'PRD/exe', 'QAS/HDB01', 'lost+found', 'DEV']:
+            os.makedirs(os.path.join(self.shared, folder))
+        self._write(os.path.join(self.shared, 'TMP'), '')
+        assert hanamod._read_hana_shared() == {'PRD': '00', 'QAS': '01'}
+
+    def test_read_sr_config(self):
+        '''
+        Test _read_sr_config method
+        '''
+        ini_file = self.global_ini.format(sid='PRD')
+        assert hanamod._read_sr_config(ini_file) == {
+            'sr_state': 'DISABLED', 'sr_site': None, 'sr_mode': None}
+
+        self._write(ini_file, GLOBAL_INI.format(mode='primary', site='NUREMBERG'))
+        assert hanamod._read_sr_config(ini_file) == {
+            'sr_state': 'PRIMARY', 'sr_site': 'NUREMBERG', 'sr_mode': 'primary'}
+
+        self._write(ini_file, GLOBAL_INI.format(mode='SYNCMEM', site='PRAGUE'))
+        assert hanamod._read_sr_config(ini_file) == {
+            'sr_state': 'SECONDARY', 'sr_site': 'PRAGUE', 'sr_mode': 'syncmem'}
+
+        self._write(ini_file, GLOBAL_INI.format(mode='none', site='PRAGUE'))
+        assert hanamod._read_sr_config(ini_file)['sr_state'] == 'DISABLED'
+
+    def test_hana_grains_not_installed(self):
+        '''
+        Test hana_grains method when HANA is not installed
+        '''
+        assert hanamod.hana_grains() == {}
+
+    def test_hana_grains(self):
+        '''
+        Test hana_grains method
+        '''
+        self._write(self.sapservices, SAPSERVICES)
+        os.makedirs(os.path.join(self.shared, 'PRD', 'HDB00'))
+        self._write(
+            self.global_ini.format(sid='PRD'), GLOBAL_INI.format(mode='primary', site='NUE'))
+        assert hanamod.hana_grains() == {'hana': {
+            'sids': ['PRD', 'QAS'],
+            'sr_state': ['DISABLED', 'PRIMARY'],
+            'systems': {
+                'PRD': {'inst': '00', 'sr_state': 'PRIMARY', 'sr_site': 'NUE',
+                        'sr_mode': 'primary'},
+                'QAS': {'inst': '01', 'sr_state': 'DISABLED', 'sr_site': None,
+                        'sr_mode': None}}}}
+
+    @patch('time.time', MagicMock(side_effect=[100, 200, 500]))
+    def test_hana_grains_cached(self):
+        '''
+        Test hana_grains method - the system replication data is cached
+        '''
+        os.makedirs(os.path.join(self.shared, 'PRD', 'HDB00'))
+        ini_file = self.global_ini.format(sid='PRD')
+        self._write(ini_file, GLOBAL_INI.format(mode='primary', site='NUE'))
+        mtime = os.path.getmtime(ini_file)
+
+        with patch.dict(hanamod.__opts__, {'cachedir': self.root}):
+            assert hanamod.hana_grains()['hana']['sr_state'] == ['PRIMARY']
+            assert os.path.exists(os.path.join(self.root, 'hana_grains.json'))
+
+            # Same mtime and within the ttl, the cached data is used
+            self._write(ini_file, GLOBAL_INI.format(mode='sync', site='NUE'))
+            os.utime(ini_file, (mtime, mtime))
+            assert hanamod.hana_grains()['hana']['sr_state'] == ['PRIMARY']
+
+            # The ttl is expired
+            assert hanamod.hana_grains()['hana']['sr_state'] == ['SECONDARY']
+
+    def test_hana_grains_changed(self):
+        '''
+        Test hana_grains method - the system replication data is read again when global.ini
+        changes
+        '''
+        os.makedirs(os.path.join(self.shared, 'PRD', 'HDB00'))
+        ini_file = self.global_ini.format(sid='PRD')
+        self._write(ini_file, GLOBAL_INI.format(mode='primary', site='NUE'))
+        mtime = os.path.getmtime(ini_file)
+
+        with patch.dict(hanamod.__opts__, {'cachedir': self.root}):
+            assert hanamod.hana_grains()['hana']['sr_state'] == ['PRIMARY']
+            self._write(ini_file, GLOBAL_INI.format(mode='sync', site='NUE'))
+            os.utime(ini_file, (mtime + 10, mtime + 10))
+            assert hanamod.hana_grains()['hana']['sr_state'] == ['SECONDARY']
+
+        self._write(os.path.join(self.root, 'hana_grains.json'), 'invalid')
+        assert hanamod._load_cache(os.path.join(self.root, 'hana_grains.json')) == {}
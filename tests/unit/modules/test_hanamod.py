@@ -8,6 +8,11 @@
 from __future__ import absolute_import, print_function, unicode_literals
 import pytest
 import sys
+import io
+import os
+import shlex
+import shutil
+import tempfile
 
 from salt import exceptions
 
@@ -24,6 +29,46 @@ from tests.support.mock import (
 # Import Salt Libs
 import salt.modules.hanamod as hanamod
 
+try:
+    import contextvars
+except ImportError:  # pragma: no cover
+    contextvars = None
+
+
+class ContextDunder(object):
+    '''
+    Loader dunder which, as the Salt >= 3003 loader ones, is only available in the context
+    where it is created (not in new threads)
+    '''
+    def __init__(self, value):
+        self._var = contextvars.ContextVar('dunder', default=None)
+        self._var.set(value)
+
+    def _value(self):
+        value = self._var.get()
+        if value is None:
+            raise AttributeError('loader dunder used out of the loader context')
+        return value
+
+    def __getitem__(self, key):
+        return self._value()[key]
+
+    def __setitem__(self, key, value):
+        self._value()[key] = value
+
+    def __contains__(self, key):
+        return key in self._value()
+
+    def __getattr__(self, name):
+        return getattr(self._value(), name)
+
+
+def _config_option(options):
+    '''
+    Mock of the config.option function returning the given options
+    '''
+    return MagicMock(side_effect=lambda option, default='': options.get(option, default))
+
 
 class HanaModuleTest(TestCase, LoaderModuleMockMixin):
     '''
@@ -31,7 +76,7 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
     '''
 
     def setup_loader_modules(self):
-        return {hanamod: {}}
+        return {hanamod: {'__salt__': {'config.option': _config_option({})}}}
 
     @patch('salt.modules.hanamod.hana.HanaInstance')
     def test_init_return(self, mock_hana):
@@ -79,6 +124,168 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
         mock_hana.assert_called_once_with('prd', '00', 'pass')
         assert 'error' in str(err.value)
 
+    @patch('salt.modules.hanamod.hana.HanaInstance')
+    def test_init_cached(self, mock_hana):
+        '''
+        Test _init method - cached instances
+        '''
+        mock_hana.side_effect = [MagicMock(), MagicMock()]
+        hana_inst1 = hanamod._init('prd', '00', 'pass')
+        hana_inst2 = hanamod._init('prd', '00', 'pass')
+        hana_inst3 = hanamod._init('prd', '00', 'other')
+        assert hana_inst1 == hana_inst2
+        assert hana_inst1 != hana_inst3
+        mock_hana.assert_has_calls([
+            mock.call('prd', '00', 'pass'),
+            mock.call('prd', '00', 'other')
+        ])
+        assert mock_hana.call_count == 2
+
+    @patch('salt.modules.hanamod.hana.HanaInstance')
+    def test_init_config_changed(self, mock_hana):
+        '''
+        Test _init method - configuration changes (a password rotation) are used
+        '''
+        mock_hana.side_effect = [MagicMock(), MagicMock()]
+        mock_config = MagicMock(side_effect=[
+            'conf_sid', 'conf_inst', 'conf_password',
+            'conf_sid', 'conf_inst', 'new_password'
+        ])
+
+        with patch.dict(hanamod.__salt__, {'config.option': mock_config}):
+            hana_inst1 = hanamod._init()
+            hana_inst2 = hanamod._init()
+        assert hana_inst1 != hana_inst2
+        assert mock_config.call_count == 6
+        mock_hana.assert_has_calls([
+            mock.call('conf_sid', 'conf_inst', 'conf_password'),
+            mock.call('conf_sid', 'conf_inst', 'new_password')
+        ])
+
+    @patch('salt.modules.hanamod.hana.HanaInstance')
+    def test_invalidate(self, mock_hana):
+        '''
+        Test _invalidate method
+        '''
+        mock_hana.side_effect = [MagicMock(), MagicMock(), MagicMock()]
+        hana_inst1 = hanamod._init('prd', '00', 'pass')
+        hana_inst2 = hanamod._init('qas', '01', 'pass')
+        hanamod._invalidate(hana_inst1)
+        assert hanamod._init('qas', '01', 'pass') == hana_inst2
+        assert hanamod._init('prd', '00', 'pass') != hana_inst1
+        assert mock_hana.call_count == 3
+
+    @patch('salt.modules.hanamod.hana.HanaInstance')
+    def test_start_invalidate(self, mock_hana):
+        '''
+        Test start method invalidates the cached instance
+        '''
+        mock_hana_inst = MagicMock()
+        mock_hana.return_value = mock_hana_inst
+        hanamod.start('prd', '00', 'pass')
+        hanamod.is_running('prd', '00', 'pass')
+        assert mock_hana.call_count == 2
+        mock_hana_inst.start.assert_called_once_with()
+
+    @mock.patch('time.time')
+    def test_timed(self, mock_time):
+        mock_time.side_effect = [10, 25, 30, 31]
+        mock_func = MagicMock(__name__='start', side_effect=[None, ValueError('failed')])
+        timed_func = hanamod._timed('HanaInstance.start')(mock_func)
+
+        timed_func(sid='prd', inst='00')
+        with pytest.raises(ValueError):
+            timed_func(sid='qas', inst='01', password='pass')
+
+        assert hanamod.__context__['hana.timings'] == [
+            {'operation': 'start', 'command': 'HanaInstance.start', 'sid': 'prd', 'inst': '00',
+             'start': 10, 'duration': 15, 'status': 'success'},
+            {'operation': 'start', 'command': 'HanaInstance.start', 'sid': 'qas', 'inst': '01',
+             'start': 30, 'duration': 1, 'status': 'error', 'error': 'failed'}]
+
+    @patch('salt.modules.hanamod._record_timing')
+    @patch('salt.modules.hanamod._init')
+    def test_timed_positional(self, mock_init, mock_record):
+        hanamod.stop('prd', '00', 'pass')
+        record = mock_record.call_args[0][0]
+        assert record['operation'] == 'stop'
+        assert record['command'] == 'HanaInstance.stop'
+        assert (record['sid'], record['inst'], record['status']) == ('prd', '00', 'success')
+
+    def test_record_timing_file(self):
+        cachedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cachedir)
+        mock_send = MagicMock()
+        with patch.dict(hanamod.__opts__, {'cachedir': os.path.join(cachedir, 'minion')}):
+            with patch.dict(hanamod.__salt__, {
+                    'config.option': _config_option({'hana.timing_events': True}),
+                    'event.send': mock_send}):
+                with patch('salt.modules.hanamod.HANA_TIMINGS_MAX_ENTRIES', 2):
+                    for index in range(3):
+                        hanamod._record_timing({'operation': 'stop', 'index': index})
+
+                    hanamod.__context__.clear()
+                    assert hanamod._load_timings() == [
+                        {'operation': 'stop', 'index': 1}, {'operation': 'stop', 'index': 2}]
+        mock_send.assert_called_with(
+            'salt/hana/stop/timing', {'operation': 'stop', 'index': 2})
+        assert mock_send.call_count == 3
+
+    def test_record_timing_compact(self):
+        cachedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cachedir)
+        timings_path = os.path.join(cachedir, 'hana_timings.jsonl')
+        with patch.dict(hanamod.__opts__, {'cachedir': cachedir}):
+            with patch('salt.modules.hanamod.HANA_TIMINGS_MAX_ENTRIES', 2), \
+                    patch('salt.modules.hanamod.HANA_TIMINGS_MAX_SIZE', 120):
+                for index in range(3):
+                    hanamod._record_timing({'operation': 'stop', 'index': index})
+                    # Records are appended until the file is too big
+                    with open(timings_path) as timings_ptr:
+                        assert len(timings_ptr.readlines()) == index + 1
+                hanamod._record_timing({'operation': 'stop', 'index': 3})
+
+            with open(timings_path) as timings_ptr:
+                assert timings_ptr.readlines() == [
+                    '{"operation": "stop", "index": 2}\n', '{"operation": "stop", "index": 3}\n']
+            assert not os.path.exists('{}.tmp'.format(timings_path))
+            assert hanamod.__context__['hana.timings'] == [
+                {'operation': 'stop', 'index': 2}, {'operation': 'stop', 'index': 3}]
+
+    @skipIf(sys.version_info.major == 2, 'inspect.signature is not available')
+    def test_timed_signature(self):
+        import inspect
+        assert list(inspect.signature(hanamod.stop).parameters) == ['sid', 'inst', 'password']
+
+    @mock.patch('logging.Logger.warning')
+    def test_record_timing_errors(self, mock_warning):
+        mock_send = MagicMock(side_effect=Exception('no master'))
+        with patch.dict(hanamod.__opts__, {'cachedir': '/cachedir'}):
+            with patch.dict(hanamod.__salt__, {
+                    'config.option': _config_option({'hana.timing_events': True}),
+                    'event.send': mock_send}):
+                with patch('salt.utils.files.fopen', MagicMock(side_effect=IOError('denied'))):
+                    with patch('os.path.isdir', MagicMock(return_value=True)):
+                        hanamod._record_timing({'operation': 'stop'})
+        assert mock_warning.call_count == 2
+        assert hanamod.__context__['hana.timings'] == [{'operation': 'stop'}]
+
+    def test_timings(self):
+        hanamod.__context__['hana.timings'] = [
+            {'operation': 'start', 'sid': 'prd', 'duration': 100, 'status': 'success'},
+            {'operation': 'stop', 'sid': 'prd', 'duration': 10, 'status': 'success'},
+            {'operation': 'start', 'sid': 'qas', 'duration': 50, 'status': 'error'},
+            {'operation': 'start', 'sid': 'prd', 'duration': 200, 'status': 'success'}]
+
+        assert hanamod.timings(operation='start', sid='prd') == [
+            {'operation': 'start', 'sid': 'prd', 'duration': 100, 'status': 'success'},
+            {'operation': 'start', 'sid': 'prd', 'duration': 200, 'status': 'success'}]
+        assert hanamod.timings(last=1) == [
+            {'operation': 'start', 'sid': 'prd', 'duration': 200, 'status': 'success'}]
+        assert hanamod.timings(summary=True) == {
+            'start': {'count': 3, 'errors': 1, 'average': 350 / 3.0, 'max': 200},
+            'stop': {'count': 1, 'errors': 0, 'average': 10, 'max': 10}}
+
     def test_is_installed_return_true(self):
         '''
         Test is_installed method
@@ -228,6 +435,118 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
             'add_hosts', 'hdblcm_folder', 'root', 'root', 'hdb_pwd_file')
         assert 'hana error' in str(err.value)
 
+    @patch('time.time', MagicMock(side_effect=[0, 0, 5, 5, 15, 15]))
+    @patch('salt.modules.hanamod.hana.HanaInstance')
+    def test_add_hosts_batch(self, mock_hana):
+        '''
+        Test add_hosts method - batches
+        '''
+        with patch('salt.modules.hanamod._record_timing'):
+            assert hanamod.add_hosts(
+                'hana03:role=standby, hana04,hana05:role=worker', 'hdblcm_folder', 'root',
+                'root', 'hdb_pwd_file', batch_size=2) == {
+                    'hana03': 5, 'hana04': 5, 'hana05': 10}
+        mock_hana.add_hosts.assert_has_calls([
+            mock.call('hana03:role=standby,hana04', 'hdblcm_folder', 'root', 'root',
+                      'hdb_pwd_file'),
+            mock.call('hana05:role=worker', 'hdblcm_folder', 'root', 'root',
+                      'hdb_pwd_file')])
+
+    @patch('salt.modules.hanamod._is_port_open')
+    def test_validate_hosts(self, mock_port):
+        '''
+        Test validate_hosts method
+        '''
+        mock_port.side_effect = lambda host, port, timeout: host != 'hana06'
+        outputs = {
+            'hana03': {'retcode': 0, 'stdout': 'nfs:/shared\n1001\n79', 'stderr': ''},
+            'hana04': {'retcode': 0, 'stdout': 'nfs:/other\n1002\n79', 'stderr': ''},
+            'hana05': {'retcode': 255, 'stdout': '', 'stderr': 'Permission denied'},
+            'hana07': {'retcode': 0, 'stdout': 'nfs:/shared\n-\n-', 'stderr': ''}}
+
+        def run_all(cmd, python_shell):
+            if python_shell:
+                return {'retcode': 0, 'stdout': 'nfs:/shared\n1001\n79', 'stderr': ''}
+            return outputs[cmd[6]]
+
+        mock_run = MagicMock(side_effect=run_all)
+        with patch.dict(hanamod.__salt__, {'cmd.run_all': mock_run}):
+            result = hanamod.validate_hosts(
+                'hana03:role=standby,hana04,hana05,hana06,hana07', 'PRD', parallel=2)
+        assert not result['valid']
+        errors = {host: value['errors'] for host, value in result['hosts'].items()}
+        assert errors == {
+            'hana03': [],
+            'hana04': [
+                '/hana/shared is mounted from nfs:/other instead of nfs:/shared',
+                'prdadm user has uid/gid 1002/79 instead of 1001/79'],
+            'hana05': ['facts cannot be retrieved: Permission denied'],
+            'hana06': ['ssh port 22 is not reachable'],
+            'hana07': []}
+        assert result['hosts']['hana03']['valid']
+        assert result['warnings'] == []
+        mock_run.assert_any_call(
+            ['ssh', '-o', 'BatchMode=yes', '-o', 'ConnectTimeout=10', '--', 'hana03', 'sh', '-c',
+             "'df -P /hana/shared | awk '\"'\"'NR==2 {print $1}'\"'\"'; id -u prdadm 2>/dev/null || "
+             "echo -; id -g prdadm 2>/dev/null || echo -'"], python_shell=False)
+
+    @skipIf(contextvars is None, 'contextvars is not available')
+    @patch('salt.modules.hanamod._is_port_open', MagicMock(return_value=True))
+    def test_validate_hosts_threads(self):
+        '''
+        Test validate_hosts method with loader dunders not available in the worker threads
+        and values to be quoted
+        '''
+        mock_run = MagicMock(return_value={
+            'retcode': 0, 'stdout': 'nfs:/shared\n1001\n79', 'stderr': ''})
+        with patch.object(hanamod, '__salt__', ContextDunder({'cmd.run_all': mock_run})):
+            result = hanamod.validate_hosts(
+                'hana03,hana04', 'PRD', shared_path='/hana/my shared;reboot')
+
+        assert result['valid']
+        assert mock_run.call_count == 3
+        mock_run.assert_any_call(
+            "df -P '/hana/my shared;reboot' | awk 'NR==2 {print $1}'; "
+            "id -u prdadm 2>/dev/null || echo -; id -g prdadm 2>/dev/null || echo -",
+            python_shell=True)
+        remote_script = mock_run.call_args_list[-1][0][0][-1]
+        assert shlex.split(remote_script) == [
+            "df -P '/hana/my shared;reboot' | awk 'NR==2 {print $1}'; "
+            "id -u prdadm 2>/dev/null || echo -; id -g prdadm 2>/dev/null || echo -"]
+
+    @patch('salt.modules.hanamod._is_port_open', MagicMock(return_value=True))
+    def test_validate_hosts_no_reference_user(self):
+        '''
+        Test validate_hosts method - the <sid>adm user doesn't exist in the current host
+        '''
+        outputs = {
+            'hana03': {'retcode': 0, 'stdout': 'nfs:/shared\n1001\n79', 'stderr': ''},
+            'hana04': {'retcode': 0, 'stdout': 'nfs:/shared\n-\n-', 'stderr': ''}}
+
+        def run_all(cmd, python_shell):
+            if python_shell:
+                return {'retcode': 0, 'stdout': 'nfs:/shared\n-\n-', 'stderr': ''}
+            return outputs[cmd[6]]
+
+        with patch.dict(hanamod.__salt__, {'cmd.run_all': MagicMock(side_effect=run_all)}):
+            result = hanamod.validate_hosts('hana03,hana04', 'PRD')
+        assert result['valid']
+        assert result['warnings'] == [
+            'prdadm user does not exist in the current host, its uid/gid are not checked']
+
+    def test_validate_hosts_error(self):
+        '''
+        Test validate_hosts method - errors
+        '''
+        with pytest.raises(exceptions.SaltInvocationError):
+            hanamod.validate_hosts('', 'PRD')
+
+        mock_run = MagicMock(return_value={'retcode': 1, 'stdout': '', 'stderr': 'error'})
+        with patch.dict(hanamod.__salt__, {'cmd.run_all': mock_run}):
+            with pytest.raises(exceptions.CommandExecutionError) as err:
+                hanamod.validate_hosts('hana03', 'PRD')
+        assert 'Current host facts cannot be retrieved: error' in str(err.value)
+
     def test_uninstall_return(self):
         '''
         Test uninstall method - return
@@ -293,6 +612,146 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
             mock_hana.assert_called_once_with('prd', '00', 'pass')
             mock_hana_inst.is_running.assert_called_once_with()
 
+    @mock.patch('time.time')
+    def test_status_snapshot(self, mock_time):
+        '''
+        Test status_snapshot method
+        '''
+        mock_time.side_effect = [0, 5, 11]
+        mock_hana_inst = MagicMock()
+        mock_hana_inst.is_installed.return_value = True
+        mock_hana_inst.is_running.return_value = True
+        mock_hana_inst.get_sr_state.return_value = 'PRIMARY'
+        mock_hana = MagicMock(return_value=mock_hana_inst)
+        expected = {'installed': True, 'running': True, 'sr_state': 'PRIMARY'}
+        with patch.object(hanamod, '_init', mock_hana):
+            assert hanamod.status_snapshot('prd', '00', 'pass') == expected
+            assert hanamod.status_snapshot('prd', '00', 'pass') == expected
+            assert hanamod.status_snapshot('prd', '00', 'pass') == expected
+        mock_hana.assert_called_with('prd', '00', 'pass')
+        assert mock_hana_inst.is_installed.call_count == 2
+        assert mock_hana_inst.is_running.call_count == 2
+        assert mock_hana_inst.get_sr_state.call_count == 2
+
+    def test_status_snapshot_not_installed(self):
+        '''
+        Test status_snapshot method - not installed
+        '''
+        mock_hana_inst = MagicMock()
+        mock_hana_inst.is_installed.return_value = False
+        mock_hana = MagicMock(return_value=mock_hana_inst)
+        with patch.object(hanamod, '_init', mock_hana):
+            assert hanamod.status_snapshot('prd', '00', 'pass', ttl=0) == {
+                'installed': False, 'running': False, 'sr_state': None}
+        mock_hana_inst.is_running.assert_not_called()
+        mock_hana_inst.get_sr_state.assert_not_called()
+
+    def test_status_snapshot_raise(self):
+        '''
+        Test status_snapshot method - raise
+        '''
+        mock_hana_inst = MagicMock()
+        mock_hana_inst.get_sr_state.side_effect = hanamod.hana.HanaError('hana error')
+        mock_hana = MagicMock(return_value=mock_hana_inst)
+        with patch.object(hanamod, '_init', mock_hana):
+            with pytest.raises(exceptions.CommandExecutionError) as err:
+                hanamod.status_snapshot('prd', '00', 'pass')
+        assert 'hana error' in str(err.value)
+
+    @mock.patch('time.time', MagicMock(return_value=100))
+    @mock.patch('salt.modules.hanamod._get_tenants')
+    @mock.patch('salt.modules.hanamod.status_snapshot')
+    def test_inventory(self, mock_snapshot, mock_tenants):
+        '''
+        Test inventory method
+        '''
+        mock_snapshot.return_value = {'installed': True, 'running': True, 'sr_state': 'PRIMARY'}
+        mock_tenants.return_value = ['PRD']
+        mock_hana_inst = MagicMock(sid='prd', inst='00')
+        mock_hana_inst.get_version.return_value = '2.00.040.00.1553674765'
+        mock_hana_inst.get_sr_state_details.return_value = {
+            'mode': 'primary', 'site name': 'NUREMBERG', 'site id': '1'}
+        mock_hana = MagicMock(return_value=mock_hana_inst)
+        expected = {
+            'sid': 'prd', 'inst': '00', 'installed': True, 'running': True,
+            'version': '2.00.040.00.1553674765', 'sr_state': 'PRIMARY', 'sr_site': 'NUREMBERG',
+            'sr_mode': 'primary', 'sr_operation_mode': None, 'tenants': ['PRD'],
+            'timestamp': 100}
+        with patch.object(hanamod, '_init', mock_hana):
+            assert hanamod.inventory('prd', '00', 'pass') == expected
+        mock_snapshot.assert_called_once_with('prd', '00', 'pass')
+        mock_tenants.assert_called_once_with('prd')
+
+        mock_snapshot.return_value = {'installed': False, 'running': False, 'sr_state': None}
+        with patch.object(hanamod, '_init', mock_hana):
+            assert hanamod.inventory('prd', '00', 'pass')['version'] is None
+        mock_hana_inst.get_version.assert_called_once_with()
+
+    @mock.patch('time.time', MagicMock(return_value=100))
+    @mock.patch('salt.modules.hanamod.status_snapshot')
+    def test_inventory_cached(self, mock_snapshot):
+        '''
+        Test inventory method - cached in grains
+        '''
+        mock_snapshot.return_value = {'installed': False, 'running': False, 'sr_state': None}
+        mock_hana = MagicMock(return_value=MagicMock(sid='prd', inst='00'))
+        mock_setval = MagicMock()
+        cached = {'sid': 'prd', 'inst': '00', 'timestamp': 50}
+        grains = {'hana_inventory': {'prd-00': cached, 'qas-01': {}}}
+        with patch.object(hanamod, '_init', mock_hana), \
+                patch.dict(hanamod.__grains__, grains), \
+                patch.dict(hanamod.__salt__, {'grains.setval': mock_setval}):
+            assert hanamod.inventory('prd', '00', 'pass', cache_ttl=60) == cached
+            mock_snapshot.assert_not_called()
+
+            data = hanamod.inventory('prd', '00', 'pass', cache_ttl=30)
+            assert data['timestamp'] == 100
+            mock_setval.assert_called_once_with(
+                'hana_inventory', {'prd-00': data, 'qas-01': {}})
+
+    @mock.patch('os.listdir')
+    def test_get_tenants(self, mock_listdir):
+        '''
+        Test _get_tenants method
+        '''
+        mock_listdir.return_value = ['nameserver.ini', 'DB_QAS', 'DB_PRD', 'lexicon']
+        assert hanamod._get_tenants('prd') == ['PRD', 'QAS']
+        mock_listdir.assert_called_once_with('/usr/sap/PRD/SYS/global/hdb/custom/config')
+
+        mock_listdir.side_effect = OSError('not found')
+        assert hanamod._get_tenants('prd') == []
+
+    def test_status_snapshot_invalidated(self):
+        '''
+        Test status_snapshot method - the cache is cleared when the state changes
+        '''
+        mock_hana_inst = MagicMock()
+        mock_hana_inst.is_running.side_effect = [False, True]
+        mock_hana = MagicMock(return_value=mock_hana_inst)
+        with patch.object(hanamod, '_init', mock_hana):
+            assert not hanamod.status_snapshot('prd', '00', 'pass')['running']
+            hanamod.start('prd', '00', 'pass')
+            assert hanamod.status_snapshot('prd', '00', 'pass')['running']
+
+    @patch('salt.modules.hanamod.hana.HanaInstance')
+    def test_status_snapshot_installed(self, mock_hana_class):
+        '''
+        Test status_snapshot method - the cache is cleared by the installation and the
+        uninstallation
+        '''
+        mock_hana_inst = MagicMock()
+        mock_hana_inst.is_installed.side_effect = [False, True, False]
+        mock_hana_inst.get_sr_state.return_value = 'DISABLED'
+        mock_hana = MagicMock(return_value=mock_hana_inst)
+        with patch.object(hanamod, '_init', mock_hana):
+            assert not hanamod.status_snapshot('prd', '00', 'pass')['installed']
+            hanamod.install('software_path', 'hana.conf', 'root', 'root')
+            assert hanamod.status_snapshot('prd', '00', 'pass')['installed']
+            hanamod.uninstall('root', 'root', sid='prd', inst='00', password='pass')
+            assert not hanamod.status_snapshot('prd', '00', 'pass')['installed']
+        mock_hana_class.install.assert_called_once_with(
+            'software_path', 'hana.conf', 'root', 'root', None)
+
     def test_get_version_return(self):
         '''
         Test get_version method - return
@@ -375,6 +834,64 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
             mock_hana_inst.stop.assert_called_once_with()
             assert 'hana error' in str(err.value)
 
+    @mock.patch('time.time')
+    def test_start_many(self, mock_time):
+        mock_time.return_value = 10
+        mock_start = MagicMock(side_effect=[None, exceptions.CommandExecutionError('start error')])
+        with patch('salt.modules.hanamod.ThreadPool') as mock_pool, \
+                patch.dict(hanamod.__salt__, {'hana.start': mock_start}):
+            mock_pool.return_value.map.side_effect = lambda func, items: map(func, items)
+            results = hanamod.start_many(
+                [{'sid': 'prd', 'inst': '00'}, {'sid': 'qas', 'inst': '01', 'password': 'qas'}],
+                password='pass', parallel=1)
+
+        assert results == {
+            'prd-00': {'result': True, 'duration': 0},
+            'qas-01': {'result': False, 'comment': 'start error', 'duration': 0}}
+        mock_pool.assert_called_once_with(1)
+        mock_pool.return_value.close.assert_called_once_with()
+        mock_start.assert_has_calls([
+            mock.call(sid='prd', inst='00', password='pass'),
+            mock.call(sid='qas', inst='01', password='qas')])
+
+    def test_stop_many(self):
+        mock_stop = MagicMock()
+        with patch.dict(hanamod.__salt__, {'hana.stop': mock_stop}):
+            results = hanamod.stop_many(
+                [{'sid': 'prd', 'inst': '00'}, {'sid': 'qas', 'inst': '01'}], password='pass')
+
+        assert sorted(results) == ['prd-00', 'qas-01']
+        assert all(result['result'] for result in results.values())
+        assert mock_stop.call_count == 2
+        mock_stop.assert_any_call(sid='qas', inst='01', password='pass')
+
+    @skipIf(contextvars is None, 'contextvars is not available')
+    def test_stop_many_threads(self):
+        '''
+        Test stop_many with loader dunders not available in the worker threads
+        '''
+        mock_stop = MagicMock(side_effect=[None, exceptions.CommandExecutionError('error')])
+        with patch.object(hanamod, '__salt__', ContextDunder({'hana.stop': mock_stop})), \
+                patch.object(hanamod, '__opts__', ContextDunder({})), \
+                patch.object(hanamod, '__context__', ContextDunder({})):
+            results = hanamod.stop_many(
+                [{'sid': 'prd', 'inst': '00'}, {'sid': 'qas', 'inst': '01'}], password='pass',
+                parallel=1)
+
+        assert results['prd-00']['result']
+        assert results['qas-01']['result'] is False
+        assert results['qas-01']['comment'] == 'error'
+
+    def test_start_many_error(self):
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod.start_many([])
+        assert 'instances must be provided' in str(err.value)
+
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod.start_many([{'sid': 'prd'}])
+        assert 'Every instance must be a dictionary with sid, inst and optionally password '\
+            'values' in str(err.value)
+
     def test_get_sr_state_return(self):
         '''
         Test get_sr_state method - return
@@ -623,6 +1140,37 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
             mock_hana_inst.create_backup.assert_called_once_with(
                 'db', 'backup', 'key', 'key_user', 'key_password')
 
+    def test_create_backup_tenants(self):
+        '''
+        Test create_backup method - tenants
+        '''
+        mock_hana_inst = MagicMock()
+        mock_hana = MagicMock(return_value=mock_hana_inst)
+        with patch.object(hanamod, '_init', mock_hana):
+            hanamod.create_backup(
+                'SYSTEMDB', 'backup', 'key', sid='prd', inst='00', password='pass',
+                tenants=['PRD', 'SYSTEMDB', 'QAS'], parallel=2)
+            mock_hana_inst.set_ini_parameter.assert_not_called()
+            mock_hana_inst.create_backup.assert_has_calls([
+                mock.call('SYSTEMDB', 'backup', 'key', None, None),
+                mock.call('PRD', 'backup_PRD', 'key', None, None),
+                mock.call('QAS', 'backup_QAS', 'key', None, None)], any_order=True)
+            assert mock_hana_inst.create_backup.call_count == 3
+
+    def test_create_backup_tenants_raise(self):
+        '''
+        Test create_backup method - tenants raise
+        '''
+        mock_hana_inst = MagicMock()
+        mock_hana_inst.create_backup.side_effect = [
+            None, hanamod.hana.HanaError('hana error')]
+        mock_hana = MagicMock(return_value=mock_hana_inst)
+        with patch.object(hanamod, '_init', mock_hana):
+            with pytest.raises(exceptions.CommandExecutionError) as err:
+                hanamod.create_backup(
+                    'SYSTEMDB', 'backup', 'key', tenants=['PRD'], parallel=1)
+            assert 'Backup failed in some databases: PRD: hana error' in str(err.value)
+
     def test_create_backup_raise(self):
         '''
         Test create_backup method - raise
@@ -777,68 +1325,333 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
 
     @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
     @mock.patch('time.time')
-    def test_wait_for_connection(self, mock_time, mock_hdb_connector):
+    def test_hdb_pool_borrow_new(self, mock_time, mock_hdb_connector):
         mock_hdb_instance = mock.Mock()
         mock_hdb_connector.return_value = mock_hdb_instance
         mock_time.return_value = 0
-        hanamod.wait_for_connection('192.168.10.15', 30015, 'SYSTEM', 'pass')
+        pool = hanamod.HdbConnectionPool()
 
-        mock_time.assert_called_once_with()
+        connector = pool.borrow('192.168.10.15', 30015, 'SYSTEM', 'pass')
+
+        assert connector == mock_hdb_instance
         mock_hdb_instance.connect.assert_called_once_with(
             '192.168.10.15', 30015, user='SYSTEM', password='pass')
-        mock_hdb_instance.disconnect.assert_called_once_with()
+        assert len(pool) == 0
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    @mock.patch('time.time')
+    def test_hdb_pool_borrow_reuse(self, mock_time, mock_hdb_connector):
+        mock_idle = mock.Mock()
+        mock_idle.isconnected.return_value = True
+        mock_time.side_effect = [0, 10]
+        pool = hanamod.HdbConnectionPool()
+        pool.release(mock_idle, '192.168.10.15', 30015, 'SYSTEM', 'pass')
+        assert len(pool) == 1
+
+        connector = pool.borrow('192.168.10.15', 30015, 'SYSTEM', 'pass')
+
+        assert connector == mock_idle
+        mock_idle.isconnected.assert_called_once_with()
+        mock_hdb_connector.assert_not_called()
+        assert len(pool) == 0
 
     @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
-    @mock.patch('time.sleep')
     @mock.patch('time.time')
-    def test_wait_for_connection_loop(self, mock_time, mock_sleep, mock_hdb_connector):
+    def test_hdb_pool_borrow_other_password(self, mock_time, mock_hdb_connector):
         mock_hdb_instance = mock.Mock()
         mock_hdb_connector.return_value = mock_hdb_instance
-        mock_hdb_instance.connect.side_effect = [
-            hanamod.base_connector.ConnectionError, hanamod.base_connector.ConnectionError, None]
-        mock_time.side_effect = [0, 1, 2, 3]
-        hanamod.wait_for_connection('192.168.10.15', 30015, 'SYSTEM', 'pass', timeout=2)
+        mock_idle = mock.Mock()
+        mock_idle.isconnected.return_value = True
+        mock_time.side_effect = [0, 10]
+        pool = hanamod.HdbConnectionPool()
+        pool.release(mock_idle, '192.168.10.15', 30015, 'SYSTEM', 'pass')
 
-        assert mock_time.call_count == 3
-        assert mock_sleep.call_count == 2
-        mock_sleep.assert_has_calls([
-            mock.call(5),
-            mock.call(5)
-        ])
-        mock_hdb_instance.connect.assert_has_calls([
-            mock.call('192.168.10.15', 30015, user='SYSTEM', password='pass'),
-            mock.call('192.168.10.15', 30015, user='SYSTEM', password='pass'),
-            mock.call('192.168.10.15', 30015, user='SYSTEM', password='pass')
-        ])
-        mock_hdb_instance.disconnect.assert_called_once_with()
+        connector = pool.borrow('192.168.10.15', 30015, 'SYSTEM', 'wrong')
+
+        assert connector == mock_hdb_instance
+        mock_idle.isconnected.assert_not_called()
+        mock_hdb_instance.connect.assert_called_once_with(
+            '192.168.10.15', 30015, user='SYSTEM', password='wrong')
+        assert len(pool) == 1
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    @mock.patch('time.time')
+    def test_hdb_pool_borrow_broken(self, mock_time, mock_hdb_connector):
+        mock_hdb_instance = mock.Mock()
+        mock_hdb_connector.return_value = mock_hdb_instance
+        mock_broken = mock.Mock()
+        mock_broken.isconnected.side_effect = Exception('closed')
+        mock_time.side_effect = [0, 10]
+        pool = hanamod.HdbConnectionPool()
+        pool.release(mock_broken, '192.168.10.15', 30015, 'SYSTEM', 'pass')
+
+        connector = pool.borrow('192.168.10.15', 30015, 'SYSTEM', 'pass')
+
+        assert connector == mock_hdb_instance
+        mock_broken.disconnect.assert_called_once_with()
+        mock_hdb_instance.connect.assert_called_once_with(
+            '192.168.10.15', 30015, user='SYSTEM', password='pass')
 
     @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
-    @mock.patch('time.sleep')
     @mock.patch('time.time')
-    def test_wait_for_connection_error(self, mock_time, mock_sleep, mock_hdb_connector):
+    def test_hdb_pool_borrow_expired(self, mock_time, mock_hdb_connector):
         mock_hdb_instance = mock.Mock()
         mock_hdb_connector.return_value = mock_hdb_instance
-        mock_hdb_instance.connect.side_effect = [
+        mock_expired = mock.Mock()
+        mock_other = mock.Mock()
+        mock_time.side_effect = [0, 250, 301]
+        pool = hanamod.HdbConnectionPool(idle_timeout=300)
+        pool.release(mock_expired, '192.168.10.15', 30015, 'SYSTEM', 'pass')
+        pool.release(mock_other, '192.168.10.16', 30015, 'SYSTEM', 'pass')
+
+        connector = pool.borrow('192.168.10.15', 30015, 'SYSTEM', 'pass')
+
+        assert connector == mock_hdb_instance
+        mock_expired.disconnect.assert_called_once_with()
+        mock_expired.isconnected.assert_not_called()
+        mock_other.disconnect.assert_not_called()
+        assert len(pool) == 1
+
+    @mock.patch('time.time')
+    def test_hdb_pool_release_full(self, mock_time):
+        mock_time.return_value = 0
+        mock_conn1 = mock.Mock()
+        mock_conn2 = mock.Mock()
+        pool = hanamod.HdbConnectionPool(max_size=1)
+
+        pool.release(mock_conn1, '192.168.10.15', 30015, 'SYSTEM', 'pass')
+        pool.release(mock_conn2, '192.168.10.15', 30015, 'SYSTEM', 'pass')
+
+        assert len(pool) == 1
+        mock_conn1.disconnect.assert_not_called()
+        mock_conn2.disconnect.assert_called_once_with()
+
+    @mock.patch('time.time')
+    def test_hdb_pool_close_all(self, mock_time):
+        mock_time.return_value = 0
+        mock_conn1 = mock.Mock()
+        mock_conn2 = mock.Mock()
+        mock_conn2.disconnect.side_effect = Exception('closed')
+        pool = hanamod.HdbConnectionPool()
+        pool.release(mock_conn1, '192.168.10.15', 30015, 'SYSTEM', 'pass')
+        pool.release(mock_conn2, '192.168.10.16', 30015, 'SYSTEM', 'pass')
+
+        assert pool.close_all() == 2
+        mock_conn1.disconnect.assert_called_once_with()
+        mock_conn2.disconnect.assert_called_once_with()
+        assert len(pool) == 0
+
+    def test_get_hdb_pool(self):
+        with patch.dict(hanamod.__salt__, {'config.option': _config_option({'hana.pool_max_size': 2})}):
+            pool = hanamod._get_hdb_pool()
+        assert pool.max_size == 2
+        assert pool.idle_timeout == 300
+        assert hanamod.__context__['hana.hdb_pool'] == pool
+        assert hanamod._get_hdb_pool() == pool
+
+    def test_close_connections(self):
+        assert hanamod.close_connections() == 0
+        mock_pool = mock.Mock()
+        mock_pool.close_all.return_value = 3
+        with patch.dict(hanamod.__context__, {'hana.hdb_pool': mock_pool}):
+            assert hanamod.close_connections() == 3
+        mock_pool.close_all.assert_called_once_with()
+
+    @mock.patch('socket.create_connection')
+    def test_is_port_open(self, mock_create_connection):
+        mock_socket = mock.Mock()
+        mock_create_connection.return_value = mock_socket
+        assert hanamod._is_port_open('192.168.10.15', '30015')
+        mock_create_connection.assert_called_once_with(('192.168.10.15', 30015), timeout=1)
+        mock_socket.close.assert_called_once_with()
+
+    @mock.patch('socket.create_connection')
+    def test_is_port_open_closed(self, mock_create_connection):
+        mock_create_connection.side_effect = hanamod.socket.error('refused')
+        assert not hanamod._is_port_open('192.168.10.15', 30015, timeout=2)
+        mock_create_connection.assert_called_once_with(('192.168.10.15', 30015), timeout=2)
+
+    @mock.patch('salt.modules.hanamod._is_port_open')
+    @mock.patch('salt.modules.hanamod._get_hdb_pool')
+    @mock.patch('time.time')
+    def test_wait_for_connection(self, mock_time, mock_get_pool, mock_port_open):
+        mock_pool = mock.Mock()
+        mock_get_pool.return_value = mock_pool
+        mock_hdb_instance = mock.Mock()
+        mock_pool.borrow.return_value = mock_hdb_instance
+        mock_port_open.return_value = True
+        mock_time.return_value = 0
+        assert hanamod.wait_for_connection('192.168.10.15', 30015, 'SYSTEM', 'pass') is None
+
+        assert mock_time.call_count == 2
+        mock_port_open.assert_called_once_with('192.168.10.15', 30015)
+        mock_pool.borrow.assert_called_once_with(
+            '192.168.10.15', 30015, 'SYSTEM', 'pass')
+        mock_pool.release.assert_called_once_with(
+            mock_hdb_instance, '192.168.10.15', 30015, 'SYSTEM', 'pass')
+
+    @mock.patch('random.uniform')
+    @mock.patch('salt.modules.hanamod._is_port_open')
+    @mock.patch('salt.modules.hanamod._get_hdb_pool')
+    @mock.patch('time.sleep')
+    @mock.patch('time.time')
+    def test_wait_for_connection_loop(
+            self, mock_time, mock_sleep, mock_get_pool, mock_port_open, mock_uniform):
+        mock_pool = mock.Mock()
+        mock_get_pool.return_value = mock_pool
+        mock_hdb_instance = mock.Mock()
+        mock_pool.borrow.side_effect = [
             hanamod.base_connector.ConnectionError, hanamod.base_connector.ConnectionError,
-            hanamod.base_connector.ConnectionError]
-        mock_time.side_effect = [0, 1, 2, 3]
+            mock_hdb_instance]
+        mock_port_open.side_effect = [False, True, True, True]
+        mock_uniform.return_value = 1
+        mock_time.side_effect = [0, 0.1, 0.7, 1.8, 4]
+        result = hanamod.wait_for_connection(
+            '192.168.10.15', 30015, 'SYSTEM', 'pass', timeout=60, interval=3, details=True)
+
+        assert result == {'elapsed': 4, 'attempts': 4}
+        mock_sleep.assert_has_calls([
+            mock.call(0.5),
+            mock.call(1),
+            mock.call(2)
+        ])
+        assert mock_sleep.call_count == 3
+        mock_uniform.assert_has_calls([mock.call(0.9, 1.1)] * 3)
+        assert mock_pool.borrow.call_count == 3
+        mock_pool.release.assert_called_once_with(
+            mock_hdb_instance, '192.168.10.15', 30015, 'SYSTEM', 'pass')
+
+    @mock.patch('random.uniform')
+    @mock.patch('salt.modules.hanamod._is_port_open')
+    @mock.patch('salt.modules.hanamod._get_hdb_pool')
+    @mock.patch('time.sleep')
+    @mock.patch('time.time')
+    def test_wait_for_connection_error(
+            self, mock_time, mock_sleep, mock_get_pool, mock_port_open, mock_uniform):
+        mock_pool = mock.Mock()
+        mock_get_pool.return_value = mock_pool
+        mock_pool.borrow.side_effect = hanamod.base_connector.ConnectionError
+        mock_uniform.return_value = 1
+        mock_time.side_effect = [0, 1, 1.5, 2]
         with pytest.raises(exceptions.CommandExecutionError) as err:
-            hanamod.wait_for_connection('192.168.10.15', 30015, 'SYSTEM', 'pass', timeout=2)
+            hanamod.wait_for_connection(
+                '192.168.10.15', 30015, 'SYSTEM', 'pass', timeout=2, interval=5,
+                initial_interval=1, probe_port=False)
 
+        mock_port_open.assert_not_called()
         assert mock_time.call_count == 4
-        assert mock_sleep.call_count == 3
         mock_sleep.assert_has_calls([
-            mock.call(5),
-            mock.call(5),
-            mock.call(5)
+            mock.call(1),
+            mock.call(0.5)
         ])
-        mock_hdb_instance.connect.assert_has_calls([
-            mock.call('192.168.10.15', 30015, user='SYSTEM', password='pass'),
-            mock.call('192.168.10.15', 30015, user='SYSTEM', password='pass'),
-            mock.call('192.168.10.15', 30015, user='SYSTEM', password='pass')
+        assert mock_sleep.call_count == 2
+        mock_pool.borrow.assert_has_calls([
+            mock.call('192.168.10.15', 30015, 'SYSTEM', 'pass'),
+            mock.call('192.168.10.15', 30015, 'SYSTEM', 'pass'),
+            mock.call('192.168.10.15', 30015, 'SYSTEM', 'pass')
         ])
+        mock_pool.release.assert_not_called()
         assert 'HANA database not available after 2 seconds in 192.168.10.15:30015' in str(err.value)
 
+    def test_parse_target(self):
+        assert hanamod._parse_target('hana01:30013') == ('hana01', 30013, None, None)
+        assert hanamod._parse_target(
+            {'host': 'hana01', 'port': 30041, 'user': 'SYSTEM', 'password': 'pass'}) == \
+            ('hana01', 30041, 'SYSTEM', 'pass')
+        assert hanamod._parse_target({'host': 'hana01', 'port': '30041'}) == \
+            ('hana01', 30041, None, None)
+
+    def test_parse_target_invalid(self):
+        for target in ['30013', 30013, 'hana01:port', ':30013', {'host': 'hana01'}]:
+            with pytest.raises(exceptions.SaltInvocationError) as err:
+                hanamod._parse_target(target)
+            assert 'Invalid database target {}'.format(target) in str(err.value)
+
+    def test_wait_for_connections(self):
+        mock_wait = MagicMock(side_effect=[
+            {'elapsed': 1, 'attempts': 1}, {'elapsed': 2, 'attempts': 3}])
+        with patch.object(hanamod, '_wait_for_connection', mock_wait):
+            result = hanamod.wait_for_connections(
+                ['hana01:30013', {'host': 'hana01', 'port': 30041, 'password': 'tenant'}],
+                'SYSTEM', 'pass', timeout=30, parallel=1)
+
+        assert result == {
+            'hana01:30013': {'elapsed': 1, 'attempts': 1, 'available': True},
+            'hana01:30041': {'elapsed': 2, 'attempts': 3, 'available': True}
+        }
+        pool = hanamod.__context__['hana.hdb_pool']
+        mock_wait.assert_has_calls([
+            mock.call(pool, 'hana01', 30013, 'SYSTEM', 'pass', 30, 5,
+                      stop_event=mock.ANY),
+            mock.call(pool, 'hana01', 30041, 'SYSTEM', 'tenant', 30, 5,
+                      stop_event=mock.ANY)
+        ])
+        assert mock_wait.call_args[1]['stop_event'].is_set()
+
+    @skipIf(contextvars is None, 'contextvars is not available')
+    @mock.patch('salt.modules.hanamod._is_port_open', MagicMock(return_value=True))
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_wait_for_connections_threads(self, mock_hdb_connector):
+        '''
+        Test wait_for_connections with loader dunders not available in the worker threads
+        '''
+        context = {}
+        with patch.object(hanamod, '__context__', ContextDunder(context)), \
+                patch.object(hanamod, '__salt__', ContextDunder({
+                    'config.option': _config_option({'hana.pool_max_size': 8})})):
+            result = hanamod.wait_for_connections(
+                ['hana01:30013', 'hana01:30041'], 'SYSTEM', 'pass')
+
+        assert result['hana01:30013']['available']
+        assert result['hana01:30041']['available']
+        assert mock_hdb_connector.call_count == 2
+        assert len(context['hana.hdb_pool']) == 2
+
+    def test_wait_for_connection_stop(self):
+        mock_pool = mock.Mock()
+        mock_pool.borrow.side_effect = hanamod.base_connector.ConnectionError
+        stop_event = hanamod.threading.Event()
+        stop_event.set()
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod._wait_for_connection(
+                mock_pool, 'hana01', 30013, 'SYSTEM', 'pass', 60, 5, probe_port=False,
+                stop_event=stop_event)
+        assert 'Waiting for HANA database in hana01:30013 cancelled' in str(err.value)
+        mock_pool.borrow.assert_called_once_with('hana01', 30013, 'SYSTEM', 'pass')
+
+    def test_wait_for_connections_quorum(self):
+        mock_wait = MagicMock(side_effect=[
+            exceptions.CommandExecutionError('not available'),
+            {'elapsed': 2, 'attempts': 3},
+            {'elapsed': 3, 'attempts': 4}])
+        with patch.object(hanamod, '_wait_for_connection', mock_wait):
+            result = hanamod.wait_for_connections(
+                ['hana01:30013', 'hana01:30041', 'hana01:30044'],
+                'SYSTEM', 'pass', quorum=1, parallel=1)
+
+        assert result == {
+            'hana01:30013': {'available': False, 'comment': 'not available'},
+            'hana01:30041': {'elapsed': 2, 'attempts': 3, 'available': True}
+        }
+        assert mock_wait.call_count in (2, 3)
+
+    def test_wait_for_connections_error(self):
+        mock_wait = MagicMock(side_effect=[
+            {'elapsed': 2, 'attempts': 3},
+            exceptions.CommandExecutionError('not available')])
+        with patch.object(hanamod, '_wait_for_connection', mock_wait):
+            with pytest.raises(exceptions.CommandExecutionError) as err:
+                hanamod.wait_for_connections(
+                    ['hana01:30013', 'hana01:30041'], 'SYSTEM', 'pass', timeout=10, parallel=1)
+
+        assert 'Only 1 of 2 required HANA databases available after 10 seconds. '\
+            'Not available: hana01:30041' in str(err.value)
+
+    def test_wait_for_connections_empty(self):
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod.wait_for_connections([], 'SYSTEM', 'pass')
+        assert 'targets must be provided' in str(err.value)
+
     @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
     def test_query(self, mock_hdb_connector):
         mock_hdb_instance = mock.Mock()
@@ -850,8 +1663,54 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
         mock_hdb_instance.connect.assert_called_once_with(
             '192.168.10.15', 30015, user='SYSTEM', password='pass')
         mock_hdb_instance.query.assert_called_once_with('query')
+        mock_hdb_instance.disconnect.assert_not_called()
+        assert len(hanamod.__context__['hana.hdb_pool']) == 1
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_query_reuse_connection(self, mock_hdb_connector):
+        mock_hdb_instance = mock.Mock()
+        mock_hdb_instance.isconnected.return_value = True
+        mock_hdb_connector.return_value = mock_hdb_instance
+
+        hanamod.query(
+            '192.168.10.15', 30015, 'SYSTEM', 'pass', 'query1')
+        hanamod.query(
+            '192.168.10.15', 30015, 'SYSTEM', 'pass', 'query2')
+
+        mock_hdb_connector.assert_called_once_with()
+        mock_hdb_instance.connect.assert_called_once_with(
+            '192.168.10.15', 30015, user='SYSTEM', password='pass')
+        mock_hdb_instance.query.assert_has_calls([
+            mock.call('query1'),
+            mock.call('query2')
+        ])
+        mock_hdb_instance.disconnect.assert_not_called()
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_query_pool_disabled(self, mock_hdb_connector):
+        mock_hdb_instance = mock.Mock()
+        mock_hdb_connector.return_value = mock_hdb_instance
+
+        with patch.dict(hanamod.__salt__, {'config.option': _config_option({'hana.pool_max_size': 0})}):
+            hanamod.query(
+                '192.168.10.15', 30015, 'SYSTEM', 'pass', 'query')
+
+        mock_hdb_instance.query.assert_called_once_with('query')
         mock_hdb_instance.disconnect.assert_called_once_with()
 
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_query_connection_lost(self, mock_hdb_connector):
+        mock_hdb_instance = mock.Mock()
+        mock_hdb_connector.return_value = mock_hdb_instance
+
+        mock_hdb_instance.query.side_effect = hanamod.base_connector.ConnectionError('lost')
+        with pytest.raises(hanamod.base_connector.ConnectionError):
+            hanamod.query(
+                '192.168.10.15', 30015, 'SYSTEM', 'pass', 'query')
+
+        mock_hdb_instance.disconnect.assert_called_once_with()
+        assert len(hanamod.__context__['hana.hdb_pool']) == 0
+
     @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
     def test_query_error(self, mock_hdb_connector):
         mock_hdb_instance = mock.Mock()
@@ -867,7 +1726,7 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
         mock_hdb_instance.query.assert_called_once_with('query')
         assert('HANA database query not successful on {}:{} with query "{}"'.format(
                 '192.168.10.15', '30015', 'query')) in str(err.value)
-        mock_hdb_instance.disconnect.assert_called_once_with()
+        assert len(hanamod.__context__['hana.hdb_pool']) == 1
 
     @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
     def test_query_result_empty(self, mock_hdb_connector):
@@ -881,7 +1740,247 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
         mock_hdb_instance.connect.assert_called_once_with(
             '192.168.10.15', 30015, user='SYSTEM', password='pass')
         mock_hdb_instance.query.assert_called_once_with('query')
-        mock_hdb_instance.disconnect.assert_called_once_with()
+        assert len(hanamod.__context__['hana.hdb_pool']) == 1
+
+    def test_split_sql_script(self):
+        script = "CREATE SCHEMA S1;\n INSERT INTO T VALUES ('a;b', \"c;d\");\n\n;SELECT 1 FROM DUMMY"
+        assert hanamod._split_sql_script(script) == [
+            'CREATE SCHEMA S1',
+            'INSERT INTO T VALUES (\'a;b\', "c;d")',
+            'SELECT 1 FROM DUMMY'
+        ]
+
+    def test_split_sql_script_comments(self):
+        script = (
+            "-- Create the schema; it's used by the tests\n"
+            "CREATE SCHEMA S1; -- don't remove it\n"
+            "/* insert; the 'rows' */ INSERT INTO T VALUES ('--;', '/*');\n"
+            "SELECT 1 FROM DUMMY -- last; statement")
+        assert hanamod._split_sql_script(script) == [
+            'CREATE SCHEMA S1',
+            'INSERT INTO T VALUES (\'--;\', \'/*\')',
+            'SELECT 1 FROM DUMMY'
+        ]
+        assert hanamod._split_sql_script('-- only a comment; here\n/* and; here */') == []
+
+    def test_get_cursor_no_connection(self):
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod._get_cursor(mock.Mock(spec=['query']))
+        assert 'The database connection is not available in the installed shaptools ' \
+            'version' in str(err.value)
+
+    def test_format_rows(self):
+        import datetime
+        import decimal
+        rows = [(1, 'a', decimal.Decimal('1.50'), datetime.date(2020, 1, 2),
+                 bytearray(b'\x01\xff'), None)]
+        assert hanamod._format_rows(rows) == [
+            [1, 'a', '1.50', '2020-01-02', '01ff', None]]
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_query_batch(self, mock_hdb_connector):
+        mock_hdb_instance = mock.Mock()
+        mock_hdb_connector.return_value = mock_hdb_instance
+        mock_connection = mock_hdb_instance._connection
+        mock_cursor = mock_connection.cursor.return_value
+        type(mock_cursor).description = mock.PropertyMock(side_effect=[None, None, [('ID',)]])
+        type(mock_cursor).rowcount = mock.PropertyMock(side_effect=[1, 2, 1])
+        mock_cursor.fetchall.return_value = [(1,)]
+
+        result = hanamod.query_batch(
+            '192.168.10.15', 30015, 'SYSTEM', 'pass',
+            statements=[
+                'CREATE TABLE T (ID INT)',
+                {'statement': 'INSERT INTO T VALUES (?)', 'parameters': [[1], [2]]}],
+            script='SELECT ID FROM T WHERE ID = ?;')
+
+        mock_hdb_instance.connect.assert_called_once_with(
+            '192.168.10.15', 30015, user='SYSTEM', password='pass')
+        mock_connection.setautocommit.assert_has_calls([
+            mock.call(False), mock.call(True)])
+        mock_cursor.execute.assert_has_calls([
+            mock.call('CREATE TABLE T (ID INT)'),
+            mock.call('SELECT ID FROM T WHERE ID = ?')
+        ])
+        mock_cursor.executemany.assert_called_once_with(
+            'INSERT INTO T VALUES (?)', [[1], [2]])
+        mock_connection.commit.assert_called_once_with()
+        mock_connection.rollback.assert_not_called()
+        mock_cursor.close.assert_called_once_with()
+
+        assert [res['statement'] for res in result['results']] == [
+            'CREATE TABLE T (ID INT)', 'INSERT INTO T VALUES (?)', 'SELECT ID FROM T WHERE ID = ?']
+        assert [res['rowcount'] for res in result['results']] == [1, 2, 1]
+        assert 'records' not in result['results'][0]
+        assert result['results'][2]['records'] == [[1]]
+        assert all('duration' in res for res in result['results'])
+        assert 'duration' in result
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_query_batch_parameters(self, mock_hdb_connector):
+        mock_hdb_instance = mock.Mock()
+        mock_hdb_connector.return_value = mock_hdb_instance
+        mock_connection = mock_hdb_instance._connection
+        mock_cursor = mock_connection.cursor.return_value
+        mock_cursor.description = None
+
+        hanamod.query_batch(
+            '192.168.10.15', 30015, 'SYSTEM', 'pass',
+            statements=[{'statement': 'INSERT INTO T VALUES (?, ?)', 'parameters': [1, 'a']}],
+            transaction=False)
+
+        mock_cursor.execute.assert_called_once_with('INSERT INTO T VALUES (?, ?)', [1, 'a'])
+        mock_connection.setautocommit.assert_not_called()
+        mock_connection.commit.assert_not_called()
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_query_batch_error(self, mock_hdb_connector):
+        mock_hdb_instance = mock.Mock()
+        mock_hdb_connector.return_value = mock_hdb_instance
+        mock_connection = mock_hdb_instance._connection
+        mock_cursor = mock_connection.cursor.return_value
+        mock_cursor.description = None
+        mock_cursor.execute.side_effect = [None, Exception('sql error')]
+
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.query_batch(
+                '192.168.10.15', 30015, 'SYSTEM', 'pass',
+                statements=['CREATE SCHEMA S1', 'CREATE SCHEMA S1', 'CREATE SCHEMA S2'])
+
+        assert 'HANA database batch failed on statement 1 "CREATE SCHEMA S1": sql error' in str(err.value)
+        assert mock_cursor.execute.call_count == 2
+        mock_connection.rollback.assert_called_once_with()
+        mock_connection.commit.assert_not_called()
+        mock_connection.setautocommit.assert_has_calls([
+            mock.call(False), mock.call(True)])
+        mock_cursor.close.assert_called_once_with()
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_query_batch_connection_error(self, mock_hdb_connector):
+        mock_hdb_connector.return_value.connect.side_effect = \
+            hanamod.base_connector.ConnectionError('connection refused')
+
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.query_batch(
+                '192.168.10.15', 30015, 'SYSTEM', 'pass', statements=['CREATE SCHEMA S1'])
+        assert 'HANA database not available in 192.168.10.15:30015: connection refused' in \
+            str(err.value)
+
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.query_chunked('192.168.10.15', 30015, 'SYSTEM', 'pass', 'query')
+        assert 'HANA database not available in 192.168.10.15:30015: connection refused' in \
+            str(err.value)
+
+    def test_query_batch_empty(self):
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod.query_batch('192.168.10.15', 30015, 'SYSTEM', 'pass', script=' ; ')
+        assert 'statements or script must be provided' in str(err.value)
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_query_chunked_page(self, mock_hdb_connector):
+        mock_hdb_instance = mock.Mock()
+        mock_hdb_connector.return_value = mock_hdb_instance
+        mock_cursor = mock_hdb_instance._connection.cursor.return_value
+        mock_cursor.description = [('ID',), ('NAME',)]
+        mock_cursor.fetchmany.side_effect = [
+            [(1, 'a'), (2, 'b')], [(3, 'c'), (4, 'd')], [(5, 'e')]]
+        mock_cursor.fetchone.return_value = (6, 'f')
+
+        result = hanamod.query_chunked(
+            '192.168.10.15', 30015, 'SYSTEM', 'pass', 'SELECT * FROM T ORDER BY ID',
+            chunk_size=2, max_rows=3, offset=2)
+
+        mock_cursor.execute.assert_called_once_with('SELECT * FROM T ORDER BY ID')
+        mock_cursor.fetchmany.assert_has_calls([mock.call(2), mock.call(2), mock.call(1)])
+        mock_cursor.close.assert_called_once_with()
+        assert result['columns'] == ['ID', 'NAME']
+        assert result['records'] == [[3, 'c'], [4, 'd'], [5, 'e']]
+        assert result['rows'] == 3
+        assert result['bytes'] == len('[[3, "c"], [4, "d"], [5, "e"]]')
+        assert result['next_offset'] == 5
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_query_chunked_last_page(self, mock_hdb_connector):
+        mock_hdb_instance = mock.Mock()
+        mock_hdb_connector.return_value = mock_hdb_instance
+        mock_cursor = mock_hdb_instance._connection.cursor.return_value
+        mock_cursor.description = [('ID',)]
+        mock_cursor.fetchmany.side_effect = [[(1,)], []]
+
+        result = hanamod.query_chunked(
+            '192.168.10.15', 30015, 'SYSTEM', 'pass', 'query', chunk_size=10)
+
+        mock_cursor.execute.assert_called_once_with('query')
+        mock_cursor.fetchmany.assert_has_calls([mock.call(10), mock.call(9)])
+        mock_cursor.fetchone.assert_not_called()
+        assert result['records'] == [[1]]
+        assert result['rows'] == 1
+        assert result['next_offset'] is None
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_query_chunked_file(self, mock_hdb_connector):
+        mock_hdb_instance = mock.Mock()
+        mock_hdb_connector.return_value = mock_hdb_instance
+        mock_cursor = mock_hdb_instance._connection.cursor.return_value
+        mock_cursor.description = [('ID',), ('NAME',)]
+        mock_cursor.fetchmany.side_effect = [[(1, 'a'), (2, 'b')], [(3, 'c')], []]
+
+        mock_file = MagicMock()
+        with patch('salt.utils.files.fopen', mock_file):
+            result = hanamod.query_chunked(
+                '192.168.10.15', 30015, 'SYSTEM', 'pass', 'query',
+                chunk_size=2, output_file='/tmp/rows.json')
+
+        mock_cursor.execute.assert_called_once_with('query')
+        mock_file.assert_called_once_with('/tmp/rows.json', 'w')
+        mock_file.return_value.__enter__.return_value.write.assert_has_calls([
+            mock.call('[1, "a"]\n'),
+            mock.call('[2, "b"]\n'),
+            mock.call('[3, "c"]\n')
+        ])
+        assert result == {
+            'columns': ['ID', 'NAME'], 'file': '/tmp/rows.json', 'rows': 3, 'bytes': 27,
+            'next_offset': None, 'duration': result['duration']}
+
+    def test_query_chunked_offset_without_max_rows(self):
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod.query_chunked(
+                '192.168.10.15', 30015, 'SYSTEM', 'pass', 'query', offset=10,
+                output_file='/tmp/rows.json')
+        assert 'max_rows must be set to use offset' in str(err.value)
+
+    def test_query_chunked_offset_without_order(self):
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod.query_chunked(
+                '192.168.10.15', 30015, 'SYSTEM', 'pass', 'SELECT * FROM T -- ORDER BY',
+                max_rows=10, offset=10)
+        assert 'The query must have an ORDER BY clause to use offset' in str(err.value)
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_query_chunked_error(self, mock_hdb_connector):
+        mock_hdb_instance = mock.Mock()
+        mock_hdb_connector.return_value = mock_hdb_instance
+        mock_cursor = mock_hdb_instance._connection.cursor.return_value
+        mock_cursor.execute.side_effect = Exception('sql error')
+
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.query_chunked('192.168.10.15', 30015, 'SYSTEM', 'pass', 'query')
+
+        assert 'HANA database query not successful on 192.168.10.15:30015 '\
+            'with query "query": sql error' in str(err.value)
+        mock_cursor.close.assert_called_once_with()
+
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    def test_query_chunked_no_result_set(self, mock_hdb_connector):
+        mock_hdb_instance = mock.Mock()
+        mock_hdb_connector.return_value = mock_hdb_instance
+        mock_cursor = mock_hdb_instance._connection.cursor.return_value
+        mock_cursor.description = None
+
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.query_chunked('192.168.10.15', 30015, 'SYSTEM', 'pass', 'query')
+
+        assert 'HANA database query "query" does not return a result set' in str(err.value)
 
     @mock.patch('salt.modules.hanamod.hdb_connector')
     @mock.patch('salt.modules.hanamod.reload_module')
@@ -925,6 +2024,8 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
         dbapi_ptr.close.assert_called_once_with()
         hdbcli_ptr.close.assert_called_once_with()
 
+    @patch.dict('salt.modules.hanamod.__salt__', {
+        'config.option': _config_option({'hana.media_scan_threads': 1})})
     @mock.patch('logging.Logger.debug')
     @mock.patch('salt.utils.files.fopen')
     def test_find_sap_folder_error(self, mock_fopen, mock_debug):
@@ -942,6 +2043,8 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
             mock.call('%s file not found in %s. Skipping folder', 'LABELIDX.ASC', '5678')
         ])
 
+    @patch.dict('salt.modules.hanamod.__salt__', {
+        'config.option': _config_option({'hana.media_scan_threads': 1})})
     def test_find_sap_folder_contain_hana(self):
         mock_pattern = mock.Mock(return_value=True)
         with patch('salt.utils.files.fopen', mock_open(read_data='data\n')) as mock_file:
@@ -950,6 +2053,8 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
         mock_pattern.match.assert_called_once_with('data')
         assert folder in '1234'
 
+    @patch.dict('salt.modules.hanamod.__salt__', {
+        'config.option': _config_option({'hana.media_scan_threads': 1})})
     @mock.patch('logging.Logger.debug')
     def test_find_sap_folder_contain_units(self, mock_debug):
         mock_pattern = mock.Mock(pattern='my_pattern')
@@ -967,15 +2072,24 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
         ])
         assert folder in '1234/DATA_UNITS'
 
+    def _dir_entries(self, entries):
+        entries_mock = []
+        for name, is_dir in entries:
+            entry = mock.Mock()
+            entry.name = name
+            entry.is_dir.return_value = is_dir
+            entries_mock.append(entry)
+        return entries_mock
+
+    @patch.dict('salt.modules.hanamod.__salt__', {
+        'config.option': _config_option({'hana.media_scan_threads': 1})})
     @mock.patch('logging.Logger.debug')
-    @mock.patch('os.path.isdir')
-    @mock.patch('os.listdir')
-    def test_find_sap_folder_contain_subfolder(
-            self, mock_listdir, mock_isdir, mock_debug):
+    @mock.patch('os.scandir')
+    def test_find_sap_folder_contain_subfolder(self, mock_scandir, mock_debug):
         mock_pattern = mock.Mock(pattern='my_pattern')
         mock_pattern.match.side_effect = [True]
-        mock_listdir.return_value = ['folder1', 'folder2', 'file1']
-        mock_isdir.side_effect = [True, True, False]
+        mock_scandir.return_value = self._dir_entries(
+            [('folder1', True), ('folder2', True), ('file1', False)])
 
         with patch('salt.utils.files.fopen', mock_open(
                 read_data=[IOError, IOError, 'subfolder\n'])) as mock_file:
@@ -985,27 +2099,20 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
 
                 mock_find_sap_folder.assert_has_calls([
                     mock.call(['1234', '5678'], mock_pattern, 2),
-                    mock.call(['1234/folder1', '1234/folder2'], mock_pattern, 1)
+                    mock.call(['1234/folder1', '1234/folder2'], mock_pattern, 1, None)
                 ])
 
-        mock_listdir.assert_called_once_with('1234')
-
-        mock_isdir.assert_has_calls([
-            mock.call('1234/folder1'),
-            mock.call('1234/folder2'),
-            mock.call('1234/file1')
-        ])
-
+        mock_scandir.assert_called_once_with('1234')
         assert folder == '1234/folder1'
 
+    @patch.dict('salt.modules.hanamod.__salt__', {
+        'config.option': _config_option({'hana.media_scan_threads': 1})})
     @mock.patch('logging.Logger.debug')
-    @mock.patch('os.path.isdir')
-    @mock.patch('os.listdir')
-    def test_find_sap_folder_contain_subfolder_error(
-            self, mock_listdir, mock_isdir, mock_debug):
+    @mock.patch('os.scandir')
+    def test_find_sap_folder_contain_subfolder_error(self, mock_scandir, mock_debug):
         mock_pattern = mock.Mock(pattern='my_pattern')
-        mock_listdir.return_value = ['folder1', 'file1', 'file2']
-        mock_isdir.side_effect = [True, False, False]
+        mock_scandir.return_value = self._dir_entries(
+            [('folder1', True), ('file1', False), ('file2', False)])
 
         with patch('salt.utils.files.fopen', mock_open(
                 read_data=[IOError, IOError, IOError, IOError])) as mock_file:
@@ -1016,17 +2123,13 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
 
                 mock_find_sap_folder.assert_has_calls([
                     mock.call(['1234'], mock_pattern, 1),
-                    mock.call(['1234/folder1'], mock_pattern, 0)
+                    mock.call(['1234/folder1'], mock_pattern, 0, None)
                 ])
 
-        mock_listdir.assert_called_once_with('1234')
-
-        mock_isdir.assert_has_calls([
-            mock.call('1234/folder1'),
-            mock.call('1234/file1'),
-            mock.call('1234/file2')
-        ])
+        mock_scandir.assert_called_once_with('1234')
 
+    @patch.dict('salt.modules.hanamod.__salt__', {
+        'config.option': _config_option({'hana.media_scan_threads': 1})})
     @mock.patch('logging.Logger.debug')
     def test_find_sap_folder_contain_units_error(self, mock_debug):
         mock_pattern = mock.Mock(pattern='my_pattern')
@@ -1045,15 +2148,732 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
         ])
         assert 'SAP folder with my_pattern pattern not found' in str(err.value)
 
+    @patch('salt.modules.hanamod._get_hdb_pool')
+    def test_get_ini_parameters(self, mock_get_pool):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [
+            ('global.ini', 'memorymanager', 'global_allocation_limit', '25000'),
+            ('global.ini', 'system_replication', 'preload_column_tables', 'false'),
+            ('global.ini', 'memorymanager', 'statement_memory_limit', '10')]
+        mock_connector = MagicMock()
+        mock_connector._connection.cursor.return_value = mock_cursor
+        mock_get_pool.return_value.borrow.return_value = mock_connector
+
+        assert hanamod.get_ini_parameters(
+            '192.168.10.15', 30013, 'SYSTEM', 'pass', 'global.ini', layer='HOST',
+            layer_name='hana01', sections=['memorymanager', 'system_replication']) == {
+                'memorymanager': {
+                    'global_allocation_limit': '25000', 'statement_memory_limit': '10'},
+                'system_replication': {'preload_column_tables': 'false'}}
+
+        mock_cursor.execute.assert_called_once_with(
+            'SELECT FILE_NAME, SECTION, KEY, VALUE FROM SYS.M_INIFILE_CONTENTS '
+            'WHERE FILE_NAME IN (?) AND LAYER_NAME = ? AND HOST = ? AND SECTION IN (?, ?)',
+            ['global.ini', 'HOST', 'hana01', 'memorymanager', 'system_replication'])
+        mock_cursor.close.assert_called_once_with()
+        mock_get_pool.return_value.release.assert_called_once_with(
+            mock_connector, '192.168.10.15', 30013, 'SYSTEM', 'pass')
+
+    @patch('salt.modules.hanamod._get_hdb_pool')
+    def test_get_ini_parameters_files(self, mock_get_pool):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [
+            ('global.ini', 'memorymanager', 'global_allocation_limit', '25000'),
+            ('indexserver.ini', 'sql', 'plan_cache_size', '1024')]
+        mock_connector = MagicMock()
+        mock_connector._connection.cursor.return_value = mock_cursor
+        mock_get_pool.return_value.borrow.return_value = mock_connector
+
+        assert hanamod.get_ini_parameters(
+            '192.168.10.15', 30013, 'SYSTEM', 'pass', ['global.ini', 'indexserver.ini', 'x.ini'],
+            layer='DATABASE', layer_name='PRD') == {
+                'global.ini': {'memorymanager': {'global_allocation_limit': '25000'}},
+                'indexserver.ini': {'sql': {'plan_cache_size': '1024'}}}
+
+        mock_cursor.execute.assert_called_once_with(
+            'SELECT FILE_NAME, SECTION, KEY, VALUE FROM SYS.M_INIFILE_CONTENTS '
+            'WHERE FILE_NAME IN (?, ?, ?) AND LAYER_NAME = ? AND TENANT_NAME = ?',
+            ['global.ini', 'indexserver.ini', 'x.ini', 'DATABASE', 'PRD'])
+
+    @patch('salt.modules.hanamod._get_hdb_pool')
+    def test_get_ini_parameters_layers(self, mock_get_pool):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = []
+        mock_connector = MagicMock()
+        mock_connector._connection.cursor.return_value = mock_cursor
+        mock_get_pool.return_value.borrow.return_value = mock_connector
+        select = 'SELECT FILE_NAME, SECTION, KEY, VALUE FROM SYS.M_INIFILE_CONTENTS '\
+            'WHERE FILE_NAME IN (?) AND LAYER_NAME = ?'
+
+        for layer, layer_name, statement, parameters in [
+                ('DEFAULT', None, select, ['global.ini', 'DEFAULT']),
+                ('SYSTEM', None, select, ['global.ini', 'SYSTEM']),
+                ('DATABASE', 'PRD', select + ' AND TENANT_NAME = ?',
+                 ['global.ini', 'DATABASE', 'PRD']),
+                ('DATABASE', None, select, ['global.ini', 'DATABASE']),
+                ('HOST', 'hana01', select + ' AND HOST = ?', ['global.ini', 'HOST', 'hana01']),
+                ('HOST', None, select, ['global.ini', 'HOST'])]:
+            mock_cursor.execute.reset_mock()
+            assert hanamod.get_ini_parameters(
+                '192.168.10.15', 30013, 'SYSTEM', 'pass', 'global.ini', layer=layer,
+                layer_name=layer_name) == {}
+            mock_cursor.execute.assert_called_once_with(statement, parameters)
+
+    @patch('salt.modules.hanamod._get_hdb_pool')
+    def test_get_ini_parameters_error(self, mock_get_pool):
+        mock_cursor = MagicMock()
+        mock_cursor.execute.side_effect = Exception('invalid view')
+        mock_connector = MagicMock()
+        mock_connector._connection.cursor.return_value = mock_cursor
+        mock_get_pool.return_value.borrow.return_value = mock_connector
+
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.get_ini_parameters(
+                '192.168.10.15', 30013, 'SYSTEM', 'pass', 'global.ini')
+        assert 'HANA ini parameters of global.ini cannot be read on 192.168.10.15:30013: '\
+            'invalid view' in str(err.value)
+        mock_cursor.execute.assert_called_once_with(
+            'SELECT FILE_NAME, SECTION, KEY, VALUE FROM SYS.M_INIFILE_CONTENTS '
+            'WHERE FILE_NAME IN (?) AND LAYER_NAME = ?', ['global.ini', 'SYSTEM'])
+
+        mock_get_pool.return_value.borrow.side_effect = \
+            hanamod.base_connector.ConnectionError('timeout')
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.get_ini_parameters(
+                '192.168.10.15', 30013, 'SYSTEM', 'pass', 'global.ini')
+        assert 'HANA database not available in 192.168.10.15:30013: timeout' in str(err.value)
+
+    def test_get_physical_memory(self):
+        with patch('salt.utils.files.fopen', mock_open(
+                read_data='MemTotal:       263842748 kB\nMemFree:        1000 kB\n')):
+            assert hanamod._get_physical_memory() == 257658
+
+        with patch('salt.utils.files.fopen', mock_open(read_data='MemFree:   1000 kB\n')):
+            with pytest.raises(exceptions.CommandExecutionError) as err:
+                hanamod._get_physical_memory()
+            assert 'Physical memory not found in /proc/meminfo' in str(err.value)
+
+        with patch('salt.utils.files.fopen', MagicMock(side_effect=IOError('denied'))):
+            with pytest.raises(exceptions.CommandExecutionError) as err:
+                hanamod._get_physical_memory()
+            assert 'Physical memory cannot be read from /proc/meminfo: denied' in str(err.value)
+
+    @patch('salt.modules.hanamod._get_hdb_pool')
+    def test_get_memory_utilization(self, mock_get_pool):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchone.return_value = (200 * 1024 * 1024 * 1024, 50 * 1024 * 1024 * 1024)
+        mock_connector = MagicMock()
+        mock_connector._connection.cursor.return_value = mock_cursor
+        mock_get_pool.return_value.borrow.return_value = mock_connector
+
+        assert hanamod._get_memory_utilization('hana01', 30013, 'SYSTEM', 'pass') == (
+            204800, 51200)
+
+        mock_cursor.fetchone.return_value = (None, None)
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod._get_memory_utilization('hana01', 30013, 'SYSTEM', 'pass')
+        assert 'HANA memory utilization cannot be read on hana01:30013: '\
+            'no utilization data available' in str(err.value)
+
+        mock_cursor.execute.side_effect = Exception('error')
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod._get_memory_utilization('hana01', 30013, 'SYSTEM', 'pass')
+        assert 'HANA memory utilization cannot be read on hana01:30013: error' in str(err.value)
+
+    @patch('salt.modules.hanamod._get_physical_memory')
+    def test_calculate_allocation_limits(self, mock_get_memory):
+        mock_get_memory.return_value = 262144
+        assert hanamod.calculate_allocation_limits({'PRD': None}) == {
+            'memory': 262144,
+            'assignable': 249692,
+            'instances': {'PRD': {'global_allocation_limit': 249692}},
+            'warnings': []
+        }
+
+        assert hanamod.calculate_allocation_limits(
+            {'PRD': {'weight': 3}, 'QAS': {'weight': 1}}, percentage=90, reserve=22144) == {
+                'memory': 262144,
+                'assignable': 216000,
+                'instances': {
+                    'PRD': {'global_allocation_limit': 162000},
+                    'QAS': {'global_allocation_limit': 54000}},
+                'warnings': []
+            }
+
+    @patch('salt.modules.hanamod._get_memory_utilization')
+    def test_calculate_allocation_limits_utilization(self, mock_utilization):
+        mock_utilization.side_effect = [(100000, 40000), (100000, 60000)]
+        result = hanamod.calculate_allocation_limits(
+            {'PRD': {'host': 'hana01', 'port': 30013, 'user': 'SYSTEM', 'password': 'pass'},
+             'QAS': {'host': 'hana01', 'port': 30113, 'user': 'SYSTEM', 'password': 'pass'}},
+            percentage=100, memory=100000)
+
+        assert result['instances'] == {
+            'PRD': {'global_allocation_limit': 50000, 'current_limit': 100000, 'used': 40000},
+            'QAS': {'global_allocation_limit': 50000, 'current_limit': 100000, 'used': 60000}}
+        assert result['warnings'] == [
+            'QAS uses 60000 MB, more than the calculated limit of 50000 MB']
+        mock_utilization.assert_has_calls([
+            mock.call('hana01', 30013, 'SYSTEM', 'pass'),
+            mock.call('hana01', 30113, 'SYSTEM', 'pass')])
+
+    def test_calculate_allocation_limits_error(self):
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod.calculate_allocation_limits({})
+        assert 'At least one instance must be provided' in str(err.value)
+
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod.calculate_allocation_limits({'PRD': None}, percentage=110)
+        assert 'percentage must be between 0 and 100' in str(err.value)
+
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod.calculate_allocation_limits({'PRD': {'weight': 0}}, memory=1024)
+        assert 'The instances weight must be positive' in str(err.value)
+
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.calculate_allocation_limits({'PRD': None}, reserve=2048, memory=1024)
+        assert 'The reserved memory (2048 MB) is higher than the physical memory (1024 MB)' in \
+            str(err.value)
+
+    def test_parse_table(self):
+        assert hanamod._parse_table('SAPABAP1.VBAP') == ('SAPABAP1', 'VBAP')
+        assert hanamod._parse_table('SAPABAP1./BI0/TABLE') == ('SAPABAP1', '/BI0/TABLE')
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod._parse_table('VBAP')
+        assert 'Table VBAP must be provided as SCHEMA.TABLE' in str(err.value)
+
+    @patch('salt.modules.hanamod._get_hdb_pool')
+    def test_get_preload_status(self, mock_get_pool):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [
+            ('TRUE', 6, 3000), ('PARTIALLY', 1, 100), ('FALSE', 1, None)]
+        mock_connector = MagicMock()
+        mock_connector._connection.cursor.return_value = mock_cursor
+        mock_get_pool.return_value.borrow.return_value = mock_connector
+
+        assert hanamod._get_preload_status(
+            'hana01', 30015, 'SYSTEM', 'pass', [('S1', 'T1'), ('S2', 'T2')]) == {
+                'loaded': 6, 'partially': 1, 'unloaded': 1, 'total': 8,
+                'percentage': 75.0, 'loaded_bytes': 3100}
+        mock_cursor.execute.assert_called_once_with(
+            'SELECT LOADED, COUNT(*), SUM(MEMORY_SIZE_IN_TOTAL) FROM SYS.M_CS_TABLES C '
+            'WHERE (SCHEMA_NAME = ? AND TABLE_NAME = ?) OR (SCHEMA_NAME = ? AND TABLE_NAME = ?) '
+            'GROUP BY LOADED', ['S1', 'T1', 'S2', 'T2'])
+
+        mock_cursor.execute.side_effect = Exception('error')
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod._get_preload_status('hana01', 30015, 'SYSTEM', 'pass')
+        assert 'Column tables load status cannot be read on hana01:30015: error' in str(
+            err.value)
+
+    @patch('salt.modules.hanamod._get_hdb_pool')
+    def test_get_preload_status_default(self, mock_get_pool):
+        '''
+        Test _get_preload_status without tables - only the tables flagged for preload
+        '''
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [('TRUE', 2, 200), ('FALSE', 2, None)]
+        mock_connector = MagicMock()
+        mock_connector._connection.cursor.return_value = mock_cursor
+        mock_get_pool.return_value.borrow.return_value = mock_connector
+
+        assert hanamod._get_preload_status('hana01', 30015, 'SYSTEM', 'pass', []) == {
+            'loaded': 2, 'partially': 0, 'unloaded': 2, 'total': 4,
+            'percentage': 50.0, 'loaded_bytes': 200}
+        mock_cursor.execute.assert_called_once_with(
+            'SELECT LOADED, COUNT(*), SUM(MEMORY_SIZE_IN_TOTAL) FROM SYS.M_CS_TABLES C '
+            'WHERE EXISTS (SELECT 1 FROM SYS.TABLES T WHERE T.SCHEMA_NAME = C.SCHEMA_NAME '
+            'AND T.TABLE_NAME = C.TABLE_NAME AND T.PRELOAD = \'TRUE\') GROUP BY LOADED', [])
+
+        # No table flagged for preload
+        mock_cursor.fetchall.return_value = []
+        assert hanamod._get_preload_status('hana01', 30015, 'SYSTEM', 'pass')['percentage'] == 100
+
+    @patch('salt.modules.hanamod._get_hdb_pool')
+    def test_load_table(self, mock_get_pool):
+        mock_cursor = MagicMock()
+        mock_connector = MagicMock()
+        mock_connector._connection.cursor.return_value = mock_cursor
+        mock_get_pool.return_value.borrow.return_value = mock_connector
+
+        assert hanamod._load_table('hana01', 30015, 'SYSTEM', 'pass', ('S1', 'T"1')) is None
+        mock_cursor.execute.assert_called_once_with('LOAD "S1"."T""1" ALL')
+
+        mock_cursor.execute.side_effect = Exception('not found')
+        assert hanamod._load_table(
+            'hana01', 30015, 'SYSTEM', 'pass', ('S1', 'T1')) == 'not found'
+
+    @mock.patch('salt.modules.hanamod._get_preload_status')
+    @mock.patch('time.sleep')
+    @mock.patch('time.time')
+    def test_wait_for_preload(self, mock_time, mock_sleep, mock_status):
+        mock_status.side_effect = [
+            {'loaded': 1, 'total': 10, 'percentage': 10.0, 'loaded_bytes': 100},
+            {'loaded': 1, 'total': 10, 'percentage': 10.0, 'loaded_bytes': 100},
+            {'loaded': 1, 'total': 10, 'percentage': 10.0, 'loaded_bytes': 100},
+            {'loaded': 5, 'total': 10, 'percentage': 50.0, 'loaded_bytes': 500},
+            {'loaded': 9, 'total': 10, 'percentage': 90.0, 'loaded_bytes': 900},
+        ]
+        mock_time.side_effect = [0, 1, 6, 16, 26, 41]
+
+        status = hanamod.wait_for_preload(
+            'hana01', 30015, 'SYSTEM', 'pass', threshold=90, interval=5, max_interval=10)
+
+        assert status == {
+            'loaded': 9, 'total': 10, 'percentage': 90.0, 'loaded_bytes': 900,
+            'throughput': 20, 'elapsed': 41}
+        mock_sleep.assert_has_calls([
+            mock.call(5), mock.call(10), mock.call(10), mock.call(5)])
+        mock_status.assert_called_with('hana01', 30015, 'SYSTEM', 'pass', [])
+
+    @mock.patch('salt.modules.hanamod._get_preload_status')
+    @mock.patch('time.sleep')
+    @mock.patch('time.time')
+    def test_wait_for_preload_timeout(self, mock_time, mock_sleep, mock_status):
+        mock_status.return_value = {
+            'loaded': 1, 'total': 10, 'percentage': 10.0, 'loaded_bytes': 100}
+        mock_time.side_effect = [0, 1, 6, 11]
+
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.wait_for_preload(
+                'hana01', 30015, 'SYSTEM', 'pass', timeout=10, interval=5)
+        assert 'Column tables preload not completed after 10 seconds: 10.0% loaded' in str(
+            err.value)
+        mock_sleep.assert_has_calls([mock.call(5), mock.call(4)])
+
+    @mock.patch('salt.modules.hanamod.ThreadPool')
+    @mock.patch('salt.modules.hanamod._get_preload_status')
+    @mock.patch('time.sleep')
+    @mock.patch('time.time')
+    def test_wait_for_preload_load(self, mock_time, mock_sleep, mock_status, mock_pool):
+        mock_status.side_effect = [
+            {'loaded': 0, 'total': 2, 'percentage': 0.0, 'loaded_bytes': 0},
+            {'loaded': 2, 'total': 2, 'percentage': 100.0, 'loaded_bytes': 100}]
+        mock_time.side_effect = [0, 1, 11]
+        mock_loads = mock_pool.return_value.map_async.return_value
+        mock_loads.ready.return_value = False
+
+        status = hanamod.wait_for_preload(
+            'hana01', 30015, 'SYSTEM', 'pass', tables=['S1.T1', 'S1.T2'], load=True)
+
+        assert status['percentage'] == 100.0
+        mock_pool.assert_called_once_with(2)
+        assert mock_pool.return_value.map_async.call_args[0][1] == [('S1', 'T1'), ('S1', 'T2')]
+        mock_status.assert_called_with(
+            'hana01', 30015, 'SYSTEM', 'pass', [('S1', 'T1'), ('S1', 'T2')])
+        mock_pool.return_value.close.assert_called_once_with()
+
+        mock_status.side_effect = None
+        mock_status.return_value = {
+            'loaded': 0, 'total': 2, 'percentage': 0.0, 'loaded_bytes': 0}
+        mock_time.side_effect = [0, 1]
+        mock_loads.ready.return_value = True
+        mock_loads.get.return_value = [None, 'not found']
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.wait_for_preload(
+                'hana01', 30015, 'SYSTEM', 'pass', tables=['S1.T1', 'S1.T2'], load=True)
+        assert 'Column tables cannot be loaded: S1.T2: not found' in str(err.value)
+
+    @skipIf(contextvars is None, 'contextvars is not available')
+    @mock.patch('salt.modules.hanamod.hdb_connector.HdbConnector')
+    @mock.patch('salt.modules.hanamod._get_preload_status')
+    def test_wait_for_preload_load_threads(self, mock_status, mock_hdb_connector):
+        '''
+        Test wait_for_preload loading the tables with loader dunders not available in the
+        worker threads
+        '''
+        mock_cursor = mock_hdb_connector.return_value._connection.cursor.return_value
+        mock_status.side_effect = lambda *args: {
+            'loaded': mock_cursor.execute.call_count, 'total': 2, 'loaded_bytes': 0,
+            'percentage': 100.0 if mock_cursor.execute.call_count == 2 else 0.0}
+        context = {}
+        with patch.object(hanamod, '__context__', ContextDunder(context)), \
+                patch.object(hanamod, '__opts__', ContextDunder({})), \
+                patch.object(hanamod, '__salt__', ContextDunder({
+                    'config.option': _config_option({})})):
+            status = hanamod.wait_for_preload(
+                'hana01', 30015, 'SYSTEM', 'pass', tables=['S1.T1', 'S1.T2'], load=True,
+                timeout=10, interval=0.01, max_interval=0.01)
+
+        assert status['percentage'] == 100.0
+        mock_cursor.execute.assert_has_calls([
+            mock.call('LOAD "S1"."T1" ALL'), mock.call('LOAD "S1"."T2" ALL')], any_order=True)
+        assert 'hana.hdb_pool' in context
+
+    def test_wait_for_preload_error(self):
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod.wait_for_preload('hana01', 30015, 'SYSTEM', 'pass', load=True)
+        assert 'tables must be provided to load them' in str(err.value)
+
+    def test_next_interval(self):
+        assert hanamod._next_interval(20, 5, 60, True) == 5
+        assert hanamod._next_interval(20, 5, 60, False) == 40
+        assert hanamod._next_interval(40, 5, 60, False) == 60
+
+    @patch('salt.modules.hanamod._get_hdb_pool')
+    def test_sr_replication_status(self, mock_get_pool):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [
+            ('hana01', 30001, 'hana02', 'ACTIVE', 1000),
+            ('hana01', 30003, 'hana02', 'SYNCING', 500)]
+        mock_cursor.fetchone.return_value = (3000,)
+        mock_connector = MagicMock()
+        mock_connector._connection.cursor.return_value = mock_cursor
+        mock_get_pool.return_value.borrow.return_value = mock_connector
+
+        assert hanamod.sr_replication_status(
+            'hana01', 30013, 'SYSTEM', 'pass', secondary='hana02') == {
+                'services': {
+                    'hana01:30001': {'secondary': 'hana02', 'status': 'ACTIVE'},
+                    'hana01:30003': {'secondary': 'hana02', 'status': 'SYNCING'}},
+                'active': 1, 'total': 2, 'synced': False, 'shipped_bytes': 1500,
+                'data_bytes': 3000}
+        mock_cursor.execute.assert_has_calls([
+            mock.call(
+                'SELECT HOST, PORT, SECONDARY_HOST, REPLICATION_STATUS, '
+                'SHIPPED_LAST_FULL_REPLICA_SIZE FROM SYS.M_SERVICE_REPLICATION '
+                'WHERE SECONDARY_HOST = ?', ['hana02']),
+            mock.call(
+                'SELECT SUM(USED_SIZE) FROM SYS.M_VOLUME_FILES WHERE FILE_TYPE = \'DATA\'')])
+
+        mock_cursor.fetchall.return_value = []
+        assert not hanamod.sr_replication_status('hana01', 30013, 'SYSTEM', 'pass')['synced']
+
+        mock_cursor.execute.side_effect = Exception('error')
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.sr_replication_status('hana01', 30013, 'SYSTEM', 'pass')
+        assert 'System replication status cannot be read on hana01:30013: error' in str(
+            err.value)
+
+    @mock.patch('salt.modules.hanamod._get_hdb_pool')
+    def test_backup_progress(self, mock_get_pool):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [
+            ('SYSTEMDB', 3, 'running', 100, 512 * 1024 * 1024),
+            ('PRD', 5, 'successful', 50, 1024 * 1024 * 1024),
+            ('SYSTEMDB', 2, 'failed', 10, 1024),
+            ('SYSTEMDB', 1, 'successful', 300, 2048 * 1024 * 1024),
+            ('SYSTEMDB', 0, 'successful', 300, 1024)]
+        mock_connector = MagicMock()
+        mock_connector._connection.cursor.return_value = mock_cursor
+        mock_get_pool.return_value.borrow.return_value = mock_connector
+
+        assert hanamod.backup_progress(
+            'hana01', 30013, 'SYSTEM', 'pass', databases=['SYSTEMDB', 'PRD']) == {
+                'SYSTEMDB': {
+                    'backup_id': 3, 'state': 'running', 'bytes': 512 * 1024 * 1024,
+                    'elapsed': 100, 'throughput': 5.12,
+                    'expected_bytes': 2048 * 1024 * 1024, 'percentage': 25.0, 'eta': 300},
+                'PRD': {
+                    'backup_id': 5, 'state': 'successful', 'bytes': 1024 * 1024 * 1024,
+                    'elapsed': 50, 'throughput': 20.48,
+                    'expected_bytes': None, 'percentage': None, 'eta': None}}
+        mock_cursor.execute.assert_called_once_with(
+            'SELECT C.DATABASE_NAME, C.BACKUP_ID, C.STATE_NAME, '
+            'SECONDS_BETWEEN(C.SYS_START_TIME, IFNULL(C.SYS_END_TIME, CURRENT_TIMESTAMP)), '
+            'SUM(F.BACKUP_SIZE) FROM SYS_DATABASES.M_BACKUP_CATALOG C '
+            'JOIN SYS_DATABASES.M_BACKUP_CATALOG_FILES F '
+            'ON C.DATABASE_NAME = F.DATABASE_NAME AND C.BACKUP_ID = F.BACKUP_ID '
+            'WHERE C.ENTRY_TYPE_NAME = \'complete data backup\' '
+            'AND C.DATABASE_NAME IN (?, ?) GROUP BY C.DATABASE_NAME, C.BACKUP_ID, '
+            'C.STATE_NAME, C.SYS_START_TIME, C.SYS_END_TIME ORDER BY C.SYS_START_TIME DESC',
+            ['SYSTEMDB', 'PRD'])
+
+        mock_cursor.execute.side_effect = Exception('error')
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.backup_progress('hana01', 30013, 'SYSTEM', 'pass')
+        assert 'Backup catalog cannot be read on hana01:30013: error' in str(err.value)
+
+    @mock.patch('salt.modules.hanamod.sr_replication_status')
+    @mock.patch('time.sleep')
+    @mock.patch('time.time')
+    def test_wait_for_sr_sync(self, mock_time, mock_sleep, mock_status):
+        mock_status.side_effect = [
+            {'synced': False, 'active': 0, 'total': 1, 'shipped_bytes': 0,
+             'data_bytes': 1000, 'services': {}},
+            {'synced': False, 'active': 0, 'total': 1, 'shipped_bytes': 0,
+             'data_bytes': 1000, 'services': {}},
+            {'synced': False, 'active': 0, 'total': 1, 'shipped_bytes': 400,
+             'data_bytes': 1000, 'services': {}},
+            {'synced': True, 'active': 1, 'total': 1, 'shipped_bytes': 1000,
+             'data_bytes': 1000, 'services': {}}]
+        mock_time.side_effect = [0, 0, 10, 40, 50]
+
+        status = hanamod.wait_for_sr_sync(
+            'hana01', 30013, 'SYSTEM', 'pass', interval=10, max_interval=30)
+
+        assert status['throughput'] == 20
+        assert status['eta'] is None
+        assert status['elapsed'] == 50
+        mock_sleep.assert_has_calls([mock.call(10), mock.call(20), mock.call(10)])
+        mock_status.assert_called_with('hana01', 30013, 'SYSTEM', 'pass', None)
+
+    @mock.patch('salt.modules.hanamod.sr_replication_status')
+    @mock.patch('time.sleep')
+    @mock.patch('time.time')
+    def test_wait_for_sr_sync_timeout(self, mock_time, mock_sleep, mock_status):
+        mock_status.side_effect = [
+            {'synced': False, 'active': 0, 'total': 1, 'shipped_bytes': 0,
+             'data_bytes': 1000, 'services': {'hana01:30003': {'status': 'SYNCING'}}},
+            {'synced': False, 'active': 0, 'total': 1, 'shipped_bytes': 200,
+             'data_bytes': 1000, 'services': {'hana01:30003': {'status': 'SYNCING'}}}]
+        mock_time.side_effect = [0, 0, 20]
+
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod.wait_for_sr_sync('hana01', 30013, 'SYSTEM', 'pass', timeout=20)
+        assert 'System replication not synchronized after 20 seconds: 0 of 1 services active '\
+            '(hana01:30003 SYNCING), 200 bytes shipped, 10 bytes/s, ETA 80 seconds' in str(
+                err.value)
+
+    def _create_media(self, folders):
+        '''
+        Create a media folder tree. folders is a dictionary with the relative folder path
+        and the LABEL.ASC content (or None)
+        '''
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        for folder, label in folders.items():
+            path = os.path.join(media, folder)
+            os.makedirs(path)
+            if label is not None:
+                with open(os.path.join(path, 'LABEL.ASC'), 'w') as label_file:
+                    label_file.write(label)
+        return media
+
+    def test_find_sap_folder_concurrent(self):
+        media = self._create_media({
+            'folder{}'.format(index): 'HDB_OTHER' for index in range(20)})
+        folders = [os.path.join(media, 'folder{}'.format(index)) for index in range(20)]
+        for index in [15, 17]:
+            with open(os.path.join(folders[index], 'LABEL.ASC'), 'w') as label_file:
+                label_file.write('HDB_CLIENT')
+
+        with patch.dict(hanamod.__salt__, {'config.option': _config_option({'hana.media_scan_threads': 4})}):
+            folder = hanamod._find_sap_folder(folders, hanamod.re.compile('^HDB_CLIENT'))
+        assert folder == folders[15]
+
+    def test_find_sap_folder_concurrent_subfolder(self):
+        media = self._create_media({
+            'server': 'HDB_SERVER',
+            'export': None,
+            'export/client': 'HDB_CLIENT',
+        })
+        folders = [os.path.join(media, 'server'), os.path.join(media, 'export')]
+        with patch.dict(hanamod.__salt__, {'config.option': _config_option({'hana.media_scan_threads': 4})}):
+            folder = hanamod._find_sap_folder(
+                folders, hanamod.re.compile('^HDB_CLIENT'), recursion_level=1)
+            assert folder == os.path.join(media, 'export', 'client')
+
+            with pytest.raises(hanamod.SapFolderNotFoundError) as err:
+                hanamod._find_sap_folder(folders, hanamod.re.compile('^HDB_CLIENT'))
+        assert 'SAP folder with ^HDB_CLIENT pattern not found' in str(err.value)
+
+    @skipIf(contextvars is None, 'contextvars is not available')
+    def test_find_sap_folder_threads(self):
+        '''
+        Test _find_sap_folder with the default threads and loader dunders not available in
+        the worker threads. The media index is updated by the main thread
+        '''
+        media = self._create_media({
+            'server': 'HDB_SERVER',
+            'export': None,
+            'export/other': 'HDB_OTHER',
+            'export/client': 'HDB_CLIENT',
+        })
+        folders = [os.path.join(media, 'server'), os.path.join(media, 'export')]
+        context = {'hana.media_index': {'folders': {}, 'dirty': False}}
+        mock_pool = MagicMock(side_effect=hanamod.ThreadPool)
+        with patch.object(hanamod, '__context__', ContextDunder(context)), \
+                patch.object(hanamod, '__opts__', ContextDunder({})), \
+                patch.object(hanamod, '__salt__', ContextDunder({
+                    'config.option': _config_option({})})), \
+                patch.object(hanamod, 'ThreadPool', mock_pool):
+            folder = hanamod._find_sap_folder(
+                folders, hanamod.re.compile('^HDB_CLIENT'), recursion_level=1)
+
+        assert folder == os.path.join(media, 'export', 'client')
+        mock_pool.assert_called_once_with(8)
+        index = context['hana.media_index']
+        assert index['dirty']
+        assert index['folders'][os.path.join(media, 'server')]['label'] == 'HDB_SERVER'
+        assert index['folders'][os.path.join(media, 'export')]['label'] is None
+        assert index['folders'][os.path.join(media, 'export', 'client')]['label'] == \
+            'HDB_CLIENT'
+
+    def test_get_folder_data_no_index(self):
+        mock_read_label = MagicMock(return_value='label')
+        with patch.dict(hanamod._FOLDER_READERS, {'label': mock_read_label}):
+            assert hanamod._get_folder_data('/media', 'label') == 'label'
+            assert hanamod._get_folder_data('/media', 'label') == 'label'
+        assert mock_read_label.call_count == 2
+
+    def test_get_folder_data_index(self):
+        media = self._create_media({'client': 'HDB_CLIENT'})
+        folder = os.path.join(media, 'client')
+        hanamod.__context__['hana.media_index'] = {'folders': {}, 'dirty': False}
+
+        assert hanamod._get_folder_data(folder, 'label') == 'HDB_CLIENT'
+        assert hanamod.__context__['hana.media_index']['dirty']
+        mock_read_label = MagicMock(return_value='cached')
+        with patch.dict(hanamod._FOLDER_READERS, {'label': mock_read_label}):
+            assert hanamod._get_folder_data(folder, 'label') == 'HDB_CLIENT'
+            mock_read_label.assert_not_called()
+            assert hanamod._get_folder_data(folder, 'labelidx') is None
+            assert hanamod._get_folder_data(folder, 'subfolders') == []
+
+            os.utime(folder, (0, 0))
+            assert hanamod._get_folder_data(folder, 'label') == 'cached'
+            mock_read_label.assert_called_once_with(folder)
+        assert hanamod.__context__['hana.media_index']['folders'][folder] == {
+            'mtime': 0, 'label': 'cached'}
+
+    def test_get_folder_data_index_not_found(self):
+        hanamod.__context__['hana.media_index'] = {'folders': {}, 'dirty': False}
+        assert hanamod._get_folder_data('/not_found_folder', 'label') is None
+        assert hanamod._get_folder_data('/not_found_folder', 'subfolders') == []
+        assert hanamod.__context__['hana.media_index'] == {'folders': {}, 'dirty': False}
+
+    def test_media_index_load_save(self):
+        cachedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cachedir)
+        with patch.dict(hanamod.__opts__, {'cachedir': os.path.join(cachedir, 'minion')}):
+            index = hanamod._load_media_index()
+            assert index == {'folders': {}, 'dirty': False}
+            assert hanamod._load_media_index() is index
+
+            hanamod._save_media_index()
+            assert not os.path.exists(os.path.join(cachedir, 'minion', 'hana_media_index.json'))
+
+            # The entries of the removed folders are dropped
+            index['folders'][cachedir] = {'mtime': 1, 'label': 'HDB_CLIENT'}
+            index['folders']['/not_found_media'] = {'mtime': 1, 'label': 'HDB_SERVER'}
+            index['dirty'] = True
+            hanamod._save_media_index()
+            assert not index['dirty']
+            assert os.listdir(os.path.join(cachedir, 'minion')) == ['hana_media_index.json']
+
+            del hanamod.__context__['hana.media_index']
+            assert hanamod._load_media_index() == {
+                'folders': {cachedir: {'mtime': 1, 'label': 'HDB_CLIENT'}}, 'dirty': False}
+            assert hanamod._load_media_index(reset=True) == {'folders': {}, 'dirty': True}
+
+    @mock.patch('logging.Logger.warning')
+    def test_media_index_save_error(self, mock_warning):
+        hanamod.__context__['hana.media_index'] = {'folders': {}, 'dirty': True}
+        with patch('salt.utils.files.fopen', MagicMock(side_effect=IOError('denied'))):
+            with patch('os.path.isdir', MagicMock(return_value=True)):
+                hanamod._save_media_index()
+        assert hanamod.__context__['hana.media_index']['dirty']
+        assert mock_warning.call_count == 1
+
+    def test_index_media(self):
+        media = self._create_media({
+            'server': 'HDB_SERVER',
+            'export/client': 'HDB_CLIENT',
+            'export/other': None,
+        })
+        with open(os.path.join(media, 'export', 'LABELIDX.ASC'), 'w') as labelidx_file:
+            labelidx_file.write('other\nclient\n')
+        cachedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cachedir)
+
+        with patch.dict(hanamod.__opts__, {'cachedir': cachedir}):
+            labels = hanamod.index_media([media], recursion_level=2)
+            assert labels == {
+                os.path.join(media, 'server'): 'HDB_SERVER',
+                os.path.join(media, 'export/client'): 'HDB_CLIENT',
+            }
+            assert os.path.exists(os.path.join(cachedir, 'hana_media_index.json'))
+
+            with patch('salt.utils.files.fopen') as mock_fopen:
+                folder = hanamod._find_sap_folder(
+                    [media], hanamod.re.compile('^HDB_CLIENT'), recursion_level=2)
+            assert folder == os.path.join(media, 'export/client')
+            mock_fopen.assert_not_called()
+
+    @mock.patch('salt.modules.hanamod.hana.HanaInstance.get_platform')
+    def test_find_media(self, mock_get_platform):
+        mock_get_platform.return_value = 'LINUX_X86_64'
+        media = self._create_media({
+            'server': 'HDB_SERVER:20:LINUX_X86_64:',
+            'server_old': 'HDB_SERVER:10:LINUX_X86_64:',
+            'export/client': 'HDB_CLIENT:20:LINUX_X86_64:',
+            'export/client2': 'HDB_CLIENT:20:LINUX_X86_64:',
+            'swpm': 'SWPM20',
+        })
+        cachedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cachedir)
+
+        with patch.dict(hanamod.__opts__, {'cachedir': cachedir}):
+            found = hanamod.find_media(
+                [media], patterns={'SWPM': '^SWPM', 'SAPCAR': '^SAPCAR'}, recursion_level=2)
+            assert found == {
+                'HDB_SERVER': os.path.join(media, 'server'),
+                'HDB_CLIENT': os.path.join(media, 'export', 'client'),
+                'SWPM': os.path.join(media, 'swpm'),
+                'SAPCAR': None
+            }
+
+            found = hanamod.find_media(
+                [media], components=['HDB_CLIENT'], recursion_level=2, all_matches=True)
+            assert found == {
+                'HDB_CLIENT': [
+                    os.path.join(media, 'export', 'client'),
+                    os.path.join(media, 'export', 'client2')]
+            }
+
+    @mock.patch('salt.modules.hanamod._walk_sap_folders')
+    @mock.patch('salt.modules.hanamod.hana.HanaInstance.get_platform')
+    def test_find_media_early_exit(self, mock_get_platform, mock_walk):
+        mock_get_platform.return_value = 'LINUX_X86_64'
+        walked = []
+        def walk(folders, recursion_level):
+            for folder, label in [('1', 'HDB_CLIENT:20:LINUX_X86_64:'), ('2', 'SWPM'),
+                                  ('3', 'HDB_SERVER:20:LINUX_X86_64:'), ('4', 'other')]:
+                walked.append(folder)
+                yield folder, label
+        mock_walk.side_effect = walk
+        with patch.dict(hanamod.__opts__, {'cachedir': '/not_found'}):
+            found = hanamod.find_media(['/sapmedia'], patterns={'SWPM': '^SWPM'})
+
+        assert found == {'HDB_SERVER': '3', 'HDB_CLIENT': '1', 'SWPM': '2'}
+        assert walked == ['1', '2', '3']
+        mock_walk.assert_called_once_with(['/sapmedia'], 1)
+
+    @mock.patch('salt.modules.hanamod.hana.HanaInstance.get_platform')
+    def test_find_media_error(self, mock_get_platform):
+        with pytest.raises(TypeError) as err:
+            hanamod.find_media('/media')
+        assert 'software_folders must be a list, not str type' in str(err.value)
+
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod.find_media(['/media'], components=['KERNEL'])
+        assert 'Unknown component KERNEL. Available options: HDB_CLIENT, HDB_SERVER' in str(
+            err.value)
+
+        with pytest.raises(exceptions.SaltInvocationError) as err:
+            hanamod.find_media(['/media'], components=[])
+        assert 'No component to look for' in str(err.value)
+
+    def test_index_media_type_error(self):
+        with pytest.raises(TypeError) as err:
+            hanamod.index_media('/media')
+        assert 'software_folders must be a list, not str type' in str(err.value)
+
+    @mock.patch('salt.modules.hanamod._write_pydbapi_manifest')
+    @mock.patch('salt.modules.hanamod._save_media_index')
+    @mock.patch('salt.modules.hanamod._load_media_index')
     @mock.patch('re.compile')
     @mock.patch('salt.modules.hanamod._find_sap_folder')
     @mock.patch('salt.modules.hanamod.hana.HanaInstance.get_platform')
-    def test_extract_pydbapi(self, mock_get_platform, mock_find_sap_folders, mock_compile):
+    def test_extract_pydbapi(
+            self, mock_get_platform, mock_find_sap_folders, mock_compile, mock_load, mock_save,
+            mock_manifest):
         mock_get_platform.return_value = 'LINUX_X86_64'
         mock_find_sap_folders.return_value = 'my_folder'
         compile_mocked = mock.Mock()
         mock_compile.return_value = compile_mocked
-        mock_tar = MagicMock()
+        mock_tar = MagicMock(return_value=['hdbcli/', 'hdbcli/dbapi.py', ''])
         with patch.dict(hanamod.__salt__, {'archive.tar': mock_tar}):
             pydbapi_file = hanamod.extract_pydbapi(
                 'PYDBAPI.tar.gz', ['1234', '5678'], '/tmp/output', additional_extract_options='-l')
@@ -1064,11 +2884,18 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
         mock_tar.assert_called_once_with(
             options='-l -xvf', tarfile='my_folder/client/PYDBAPI.tar.gz', cwd='/tmp/output')
         assert pydbapi_file == 'my_folder/client/PYDBAPI.tar.gz'
+        mock_load.assert_called_once_with()
+        mock_save.assert_called_once_with()
+        mock_manifest.assert_called_once_with(
+            'my_folder/client/PYDBAPI.tar.gz', '/tmp/output', ['hdbcli/', 'hdbcli/dbapi.py'])
 
+    @mock.patch('salt.modules.hanamod._save_media_index')
+    @mock.patch('salt.modules.hanamod._load_media_index')
     @mock.patch('re.compile')
     @mock.patch('salt.modules.hanamod._find_sap_folder')
     @mock.patch('salt.modules.hanamod.hana.HanaInstance.get_platform')
-    def test_extract_pydbapi_error(self, mock_get_platform, mock_find_sap_folders, mock_compile):
+    def test_extract_pydbapi_error(
+            self, mock_get_platform, mock_find_sap_folders, mock_compile, mock_load, mock_save):
         mock_get_platform.return_value = 'LINUX_X86_64'
         compile_mocked = mock.Mock()
         mock_compile.return_value = compile_mocked
@@ -1081,6 +2908,131 @@ class HanaModuleTest(TestCase, LoaderModuleMockMixin):
         mock_find_sap_folders.assert_called_once_with(
             ['1234', '5678'], compile_mocked, recursion_level=1)
         assert 'HANA client not found' in str(err.value)
+        mock_save.assert_called_once_with()
+
+    @mock.patch('salt.modules.hanamod._write_pydbapi_manifest')
+    @mock.patch('salt.modules.hanamod._extract_tar')
+    @mock.patch('salt.modules.hanamod._save_media_index')
+    @mock.patch('salt.modules.hanamod._load_media_index')
+    @mock.patch('salt.modules.hanamod._find_sap_folder')
+    @mock.patch('salt.modules.hanamod.hana.HanaInstance.get_platform')
+    def test_extract_pydbapi_native(
+            self, mock_get_platform, mock_find_sap_folders, mock_load, mock_save,
+            mock_extract_tar, mock_manifest):
+        mock_get_platform.return_value = 'LINUX_X86_64'
+        mock_find_sap_folders.return_value = 'my_folder'
+        mock_extract_tar.return_value = {
+            'extracted': ['hdbcli'], 'skipped': ['setup.py'], 'bytes': 10, 'duration': 1,
+            'bytes_per_second': 10}
+        mock_tar = MagicMock()
+        with patch.dict(hanamod.__salt__, {'archive.tar': mock_tar}):
+            extraction = hanamod.extract_pydbapi(
+                'PYDBAPI.tar.gz', ['1234'], '/tmp/output', native=True, members=['hdbcli*'],
+                details=True)
+
+        mock_tar.assert_not_called()
+        mock_extract_tar.assert_called_once_with(
+            'my_folder/client/PYDBAPI.tar.gz', '/tmp/output', ['hdbcli*'])
+        assert extraction == {
+            'pydbapi': 'my_folder/client/PYDBAPI.tar.gz', 'extracted': ['hdbcli'],
+            'skipped': ['setup.py'], 'bytes': 10, 'duration': 1, 'bytes_per_second': 10}
+        mock_manifest.assert_called_once_with(
+            'my_folder/client/PYDBAPI.tar.gz', '/tmp/output', ['hdbcli', 'setup.py'])
+
+    def _create_tar(self, files):
+        '''
+        Create a tar.gz file with the given files (dictionary with name and content)
+        '''
+        source = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        tar_file = os.path.join(source, 'PYDBAPI.tar.gz')
+        with hanamod.tarfile.open(tar_file, 'w:gz') as tar:
+            for name, content in files.items():
+                info = hanamod.tarfile.TarInfo(name)
+                info.size = len(content)
+                info.mtime = 1500000000
+                tar.addfile(info, io.BytesIO(content))
+        return tar_file
+
+    def test_extract_tar(self):
+        tar_file = self._create_tar({
+            'hdbcli/__init__.py': b'init',
+            'hdbcli/dbapi.py': b'dbapi',
+            'setup.py': b'setup',
+            'docs/README': b'readme'})
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+
+        extraction = hanamod._extract_tar(tar_file, output_dir, ['hdbcli/*', 'setup.py'])
+        assert sorted(extraction['extracted']) == [
+            'hdbcli/__init__.py', 'hdbcli/dbapi.py', 'setup.py']
+        assert extraction['skipped'] == []
+        assert extraction['bytes'] == 14
+        assert not os.path.exists(os.path.join(output_dir, 'docs'))
+        with open(os.path.join(output_dir, 'hdbcli', 'dbapi.py'), 'rb') as dbapi:
+            assert dbapi.read() == b'dbapi'
+
+        with open(os.path.join(output_dir, 'setup.py'), 'wb') as setup:
+            setup.write(b'changed')
+        extraction = hanamod._extract_tar(tar_file, output_dir, ['hdbcli/*', 'setup.py'])
+        assert extraction['extracted'] == ['setup.py']
+        assert sorted(extraction['skipped']) == ['hdbcli/__init__.py', 'hdbcli/dbapi.py']
+        assert extraction['bytes'] == 5
+
+    def test_extract_tar_outside(self):
+        tar_file = self._create_tar({'../outside': b'data'})
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod._extract_tar(tar_file, output_dir)
+        assert '../outside member is outside of the output folder' in str(err.value)
+
+    def test_extract_tar_error(self):
+        with pytest.raises(exceptions.CommandExecutionError) as err:
+            hanamod._extract_tar('/not_found/PYDBAPI.tar.gz', '/tmp/output')
+        assert 'Error extracting /not_found/PYDBAPI.tar.gz' in str(err.value)
+
+    @mock.patch('salt.modules.hanamod._find_pydbapi')
+    def test_is_pydbapi_extracted(self, mock_find_pydbapi):
+        tar_file = self._create_tar({'hdbcli/dbapi.py': b'dbapi', 'setup.py': b'setup'})
+        mock_find_pydbapi.return_value = tar_file
+        output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output_dir)
+
+        assert not hanamod.is_pydbapi_extracted('PYDBAPI.tar.gz', ['1234'], output_dir)
+        mock_find_pydbapi.assert_called_once_with('PYDBAPI.tar.gz', ['1234'], '20')
+
+        extraction = hanamod._extract_tar(tar_file, output_dir)
+        hanamod._write_pydbapi_manifest(tar_file, output_dir, extraction['extracted'])
+        assert hanamod.is_pydbapi_extracted('PYDBAPI.tar.gz', ['1234'], output_dir)
+
+        # same content with a new modification time
+        os.utime(tar_file, (0, 0))
+        with mock.patch('salt.modules.hanamod._file_sha256',
+                        side_effect=hanamod._file_sha256) as mock_sha256:
+            assert hanamod.is_pydbapi_extracted('PYDBAPI.tar.gz', ['1234'], output_dir)
+            mock_sha256.assert_called_once_with(tar_file)
+            # the new modification time is stored, so the checksum is not computed again
+            assert hanamod.is_pydbapi_extracted('PYDBAPI.tar.gz', ['1234'], output_dir)
+            mock_sha256.assert_called_once_with(tar_file)
+        with open(os.path.join(output_dir, '.pydbapi_manifest.json')) as manifest_ptr:
+            assert hanamod.json.load(manifest_ptr)['mtime'] == 0
+
+        os.remove(os.path.join(output_dir, 'setup.py'))
+        assert not hanamod.is_pydbapi_extracted('PYDBAPI.tar.gz', ['1234'], output_dir)
+
+        hanamod._write_pydbapi_manifest(tar_file, output_dir, [])
+        with open(tar_file, 'ab') as tar_ptr:
+            tar_ptr.write(b'new')
+        assert not hanamod.is_pydbapi_extracted('PYDBAPI.tar.gz', ['1234'], output_dir)
+
+        mock_find_pydbapi.return_value = '/other/PYDBAPI.tar.gz'
+        assert not hanamod.is_pydbapi_extracted('PYDBAPI.tar.gz', ['1234'], output_dir)
+
+    @mock.patch('logging.Logger.warning')
+    def test_write_pydbapi_manifest_error(self, mock_warning):
+        hanamod._write_pydbapi_manifest('/not_found/PYDBAPI.tar.gz', '/tmp/output', [])
+        assert mock_warning.call_count == 1
 
     def test_extract_pydbapi_software_folders_type_error(self):
         software_folders = '1234'
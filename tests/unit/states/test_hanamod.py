@@ -6,6 +6,10 @@
 # Import Python libs
 from __future__ import absolute_import, unicode_literals, print_function
 
+import os
+import shutil
+import tempfile
+
 from salt import exceptions
 
 # Import Salt Testing Libs
@@ -44,6 +48,10 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
             assert hanamod.available(
                 '192.168.10.15', 30015, 'SYSTEM', 'pass', 60, 5) == ret
 
+            assert hanamod.available(
+                'hana01', 30013, 'SYSTEM', 'pass', targets=[30013, 'hana02:30041'])['comment'] \
+                == 'hana connection would be checked in hana01:30013, hana02:30041'
+
     def test_available_true(self):
         '''
         Test to check available when it returns True
@@ -92,6 +100,75 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
             interval=5
         )
 
+    def test_available_targets(self):
+        '''
+        Test to check available with several targets
+        '''
+
+        ret = {'name': 'hana01:30013',
+               'changes': {},
+               'result': True,
+               'comment': 'HANA databases available: hana01:30013 (1.2s), hana02:30041 (3.0s)'}
+
+        mock_wait = mock.MagicMock(return_value={
+            'hana01:30013': {'available': True, 'elapsed': 1.23, 'attempts': 1},
+            'hana02:30041': {'available': True, 'elapsed': 3, 'attempts': 2},
+            'hana02:30044': {'available': False, 'comment': 'error'}})
+
+        with patch.dict(hanamod.__salt__, {'hana.wait_for_connections': mock_wait}):
+            assert hanamod.available(
+                'hana01', 30013, 'SYSTEM', 'pass', 60, 5,
+                targets=[30013, 'hana02:30041', 'hana02:30044'], quorum=2) == ret
+        mock_wait.assert_called_once_with(
+            targets=['hana01:30013', 'hana02:30041', 'hana02:30044'],
+            user='SYSTEM',
+            password='pass',
+            timeout=60,
+            interval=5,
+            quorum=2
+        )
+
+    def test_available_targets_false(self):
+        '''
+        Test to check available with several targets when it returns False
+        '''
+
+        ret = {'name': 'hana01:30013',
+               'changes': {},
+               'result': False,
+               'comment': 'error'}
+
+        mock_wait = mock.MagicMock(side_effect=exceptions.CommandExecutionError('error'))
+
+        with patch.dict(hanamod.__salt__, {'hana.wait_for_connections': mock_wait}):
+            assert hanamod.available(
+                'hana01', 30013, 'SYSTEM', 'pass', targets=[30013, '30041']) == ret
+        mock_wait.assert_called_once_with(
+            targets=['hana01:30013', 'hana01:30041'],
+            user='SYSTEM',
+            password='pass',
+            timeout=60,
+            interval=5,
+            quorum=None
+        )
+
+    def test_available_targets_invalid(self):
+        '''
+        Test to check available with an invalid target
+        '''
+
+        ret = {'name': 'hana01:30013',
+               'changes': {},
+               'result': False,
+               'comment': 'Invalid database target hana02'}
+
+        mock_wait = mock.MagicMock(
+            side_effect=exceptions.SaltInvocationError('Invalid database target hana02'))
+
+        with patch.dict(hanamod.__salt__, {'hana.wait_for_connections': mock_wait}):
+            assert hanamod.available(
+                'hana01', 30013, 'SYSTEM', 'pass', targets=[30013, 'hana02']) == ret
+
     # 'installed' function tests
 
     def test_installed_installed(self):
@@ -288,8 +365,10 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
         mock_install = MagicMock(
             side_effect=exceptions.CommandExecutionError('hana command error'))
         mock_remove = MagicMock()
+        mock_hash = MagicMock()
         with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed,
                                            'cp.get_file': mock_cp,
+                                           'cp.hash_file': mock_hash,
                                            'hana.create_conf_file': mock_create,
                                            'hana.update_conf_file': mock_update,
                                            'hana.install': mock_install,
@@ -298,6 +377,9 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                 'prd', '00', 'pass', '/software',
                 'root', 'pass', hdb_pwd_file='passwords.xml') == ret
 
+            # The checkpoint fingerprint is only needed to resume the installation
+            mock_hash.assert_not_called()
+
             mock_create.assert_called_once_with(
                 software_path='/software',
                 conf_file=hanamod.TMP_CONFIG_FILE,
@@ -320,6 +402,175 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                 mock.call('{}.xml'.format(hanamod.TMP_CONFIG_FILE))
             ])
 
+    def test_installed_resume(self):
+        '''
+        Test to check installed resuming a failed installation
+        '''
+        cachedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cachedir)
+        pwd_file = os.path.join(cachedir, 'passwords.xml')
+        conf_file = os.path.join(cachedir, 'hana.conf')
+        for file_path in [pwd_file, conf_file]:
+            with open(file_path, 'w') as file_ptr:
+                file_ptr.write('data')
+
+        mock_installed = MagicMock(return_value=False)
+        mock_mv = MagicMock()
+        mock_create = MagicMock(return_value='hana_created.conf')
+        mock_update_xml = MagicMock(return_value=pwd_file)
+        mock_update = MagicMock(return_value=conf_file)
+        mock_install = MagicMock(
+            side_effect=[exceptions.CommandExecutionError('hana command error'), None])
+        mock_remove = MagicMock()
+        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed,
+                                           'file.move': mock_mv,
+                                           'hana.create_conf_file': mock_create,
+                                           'hana.update_hdb_pwd_file': mock_update_xml,
+                                           'hana.update_conf_file': mock_update,
+                                           'hana.install': mock_install,
+                                           'file.remove': mock_remove}):
+            with patch.dict(hanamod.__opts__, {'cachedir': cachedir}):
+                assert hanamod.installed(
+                    'prd', '00', 'pass', '/software', 'root', 'pass',
+                    sapadm_password='pass', system_user_password='pass',
+                    resume=True)['comment'] == 'hana command error'
+                assert os.path.exists(os.path.join(cachedir, 'hana_install_prd.json'))
+
+                assert hanamod.installed(
+                    'prd', '00', 'pass', '/software', 'root', 'pass',
+                    sapadm_password='pass', system_user_password='pass',
+                    resume=True) == {
+                        'name': 'prd',
+                        'changes': {'sid': 'prd', 'resumed': ['config_file', 'hdb_pwd_file']},
+                        'result': True,
+                        'comment': 'HANA installed'}
+
+            mock_create.assert_called_once_with(
+                software_path='/software',
+                conf_file=hanamod.TMP_CONFIG_FILE,
+                root_user='root',
+                root_password='pass')
+            mock_update_xml.assert_called_once()
+            mock_update.assert_called_once()
+            mock_install.assert_has_calls([
+                mock.call(
+                    software_path='/software', conf_file=conf_file, hdb_pwd_file=pwd_file,
+                    root_user='root', root_password='pass')] * 2)
+            mock_remove.assert_has_calls([mock.call(pwd_file)])
+            assert not os.path.exists(os.path.join(cachedir, 'hana_install_prd.json'))
+
+    def test_installed_resume_changed(self):
+        '''
+        Test to check installed does not resume an installation with other parameters
+        '''
+        cachedir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cachedir)
+        with patch.dict(hanamod.__opts__, {'cachedir': cachedir}):
+            path = hanamod._install_checkpoint_path('prd')
+            fingerprint = hanamod._install_fingerprint(sid='prd', inst='00')
+            hanamod._save_install_checkpoint(path, fingerprint, {'config_file': path})
+
+            assert hanamod._load_install_checkpoint(path, fingerprint) == {'config_file': path}
+            assert hanamod._load_install_checkpoint(
+                path, hanamod._install_fingerprint(sid='prd', inst='01')) == {}
+            assert fingerprint != hanamod._install_fingerprint(
+                sid='prd', inst='00', root_password='other')
+            assert hanamod._install_fingerprint(
+                sid='prd', extra_parameters={'master_password': 'pass'}) != \
+                hanamod._install_fingerprint(
+                    sid='prd', extra_parameters={'master_password': 'other'})
+
+            mock_hash = MagicMock(side_effect=[
+                {'hash_type': 'sha256', 'hsum': '1234'}, {'hash_type': 'sha256', 'hsum': '5678'}])
+            with patch.dict(hanamod.__salt__, {'cp.hash_file': mock_hash}):
+                assert hanamod._install_fingerprint(sid='prd', hdb_pwd_file='salt://pwd.xml') != \
+                    hanamod._install_fingerprint(sid='prd', hdb_pwd_file='salt://pwd.xml')
+            mock_hash.assert_called_with('salt://pwd.xml')
+
+            with open(path, 'w') as file_ptr:
+                file_ptr.write('invalid')
+            assert hanamod._load_install_checkpoint(path, fingerprint) == {}
+
+    # 'hosts_added' function tests
+
+    def test_hosts_added_already(self):
+        '''
+        Test to check hosts_added when all the hosts are already added
+        '''
+        mock_exists = MagicMock(return_value=True)
+        with patch.dict(hanamod.__salt__, {'file.directory_exists': mock_exists}):
+            assert hanamod.hosts_added(
+                'prd', '00', '/hana/shared/PRD/hdblcm', 'root', 'pass', 'pwd.xml',
+                'hana02:role=standby,hana03') == {
+                    'name': 'prd', 'changes': {}, 'result': True,
+                    'comment': 'All hosts are already added to prd'}
+        mock_exists.assert_has_calls([
+            mock.call('/hana/shared/PRD/HDB00/hana02'),
+            mock.call('/hana/shared/PRD/HDB00/hana03')])
+
+    def test_hosts_added_test(self):
+        '''
+        Test to check hosts_added in test mode
+        '''
+        mock_exists = MagicMock(side_effect=[True, False])
+        with patch.dict(hanamod.__salt__, {'file.directory_exists': mock_exists}):
+            with patch.dict(hanamod.__opts__, {'test': True}):
+                assert hanamod.hosts_added(
+                    'prd', '00', '/hana/shared/PRD/hdblcm', 'root', 'pass', 'pwd.xml',
+                    ['hana02:role=standby', 'hana03:role=worker']) == {
+                        'name': 'prd', 'changes': {'hosts': ['hana03']}, 'result': None,
+                        'comment': 'hana03 would be added to prd'}
+
+    def test_hosts_added_invalid(self):
+        '''
+        Test to check hosts_added when some host is not valid
+        '''
+        mock_exists = MagicMock(return_value=False)
+        mock_validate = MagicMock(return_value={'valid': False, 'hosts': {
+            'hana02': {'valid': True, 'errors': []},
+            'hana03': {'valid': False, 'errors': ['ssh port 22 is not reachable']}}})
+        mock_add = MagicMock()
+        with patch.dict(hanamod.__salt__, {'file.directory_exists': mock_exists,
+                                           'hana.validate_hosts': mock_validate,
+                                           'hana.add_hosts': mock_add}):
+            assert hanamod.hosts_added(
+                'prd', '00', '/hana/shared/PRD/hdblcm', 'root', 'pass', 'pwd.xml',
+                'hana02,hana03', parallel=4) == {
+                    'name': 'prd', 'changes': {}, 'result': False,
+                    'comment': 'Hosts validation failed: hana03: ssh port 22 is not reachable'}
+        mock_validate.assert_called_once_with(
+            add_hosts=['hana02', 'hana03'], sid='prd', shared_path='/hana/shared', parallel=4)
+        mock_add.assert_not_called()
+
+    def test_hosts_added(self):
+        '''
+        Test to check hosts_added
+        '''
+        mock_exists = MagicMock(side_effect=[True, False, False])
+        mock_validate = MagicMock(return_value={
+            'valid': True, 'hosts': {}, 'warnings': ['prdadm user does not exist']})
+        mock_add = MagicMock(return_value={'hana03': 100, 'hana04': 100})
+        with patch.dict(hanamod.__salt__, {'file.directory_exists': mock_exists,
+                                           'hana.validate_hosts': mock_validate,
+                                           'hana.add_hosts': mock_add}):
+            assert hanamod.hosts_added(
+                'prd', 0, '/hana/shared/PRD/hdblcm', 'root', 'pass', 'pwd.xml',
+                'hana02,hana03:role=worker,hana04', batch_size=2) == {
+                    'name': 'prd', 'changes': {'hosts': {'hana03': 100, 'hana04': 100}},
+                    'result': True, 'comment': 'hana03, hana04 added to prd',
+                    'warnings': ['prdadm user does not exist']}
+        mock_add.assert_called_once_with(
+            add_hosts='hana03:role=worker,hana04', hdblcm_folder='/hana/shared/PRD/hdblcm',
+            root_user='root', root_password='pass', hdb_pwd_file='pwd.xml', batch_size=2)
+
+        mock_exists = MagicMock(return_value=False)
+        mock_add = MagicMock(side_effect=exceptions.CommandExecutionError('hana error'))
+        with patch.dict(hanamod.__salt__, {'file.directory_exists': mock_exists,
+                                           'hana.add_hosts': mock_add}):
+            assert hanamod.hosts_added(
+                'prd', '00', '/hana/shared/PRD/hdblcm', 'root', 'pass', 'pwd.xml',
+                'hana03', validate=False)['comment'] == 'hana error'
+
     # 'uninstalled' function tests
 
     def test_uninstalled_uinstalled(self):
@@ -411,8 +662,8 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': False,
                'comment': 'HANA is not installed properly with the provided data'}
 
-        mock_installed = MagicMock(return_value=False)
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed}):
+        mock_status = MagicMock(return_value={'installed': False, 'running': False, 'sr_state': None})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
             assert hanamod.sr_primary_enabled(
                 name, 'pdr', '00', 'pass') == ret
 
@@ -428,15 +679,10 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': True,
                'comment': 'HANA node already set as primary and running'}
 
-        mock_installed = MagicMock(return_value=True)
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed}):
-            mock_running = MagicMock(return_value=True)
-            mock_state = MagicMock(return_value='PRIMARY')
-
-            with patch.dict(hanamod.__salt__, {'hana.is_running': mock_running,
-                                               'hana.get_sr_state': mock_state}):
-                assert hanamod.sr_primary_enabled(
-                    name, 'pdr', '00', 'pass') == ret
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'PRIMARY'})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
+            assert hanamod.sr_primary_enabled(
+                name, 'pdr', '00', 'pass') == ret
 
     def test_sr_primary_enabled_test(self):
         '''
@@ -453,12 +699,8 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': None,
                'comment': '{} would be enabled as a primary node'.format(name)}
 
-        mock_installed = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=True)
-        mock_state = MagicMock()
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed,
-                                           'hana.is_running': mock_running,
-                                           'hana.get_sr_state': mock_state}):
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': None})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
             with patch.dict(hanamod.__opts__, {'test': True}):
                 assert hanamod.sr_primary_enabled(
                     name, 'pdr', '00', 'pass') == ret
@@ -477,12 +719,10 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': True,
                'comment': 'HANA node set as {}'.format('PRIMARY')}
 
-        mock_installed = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=True)
-        mock_state = MagicMock(side_effect=['DISABLED', 'PRIMARY'])
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'DISABLED'})
+        mock_state = MagicMock(return_value='PRIMARY')
         mock_enable = MagicMock()
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed,
-                                           'hana.is_running': mock_running,
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status,
                                            'hana.get_sr_state': mock_state,
                                            'hana.sr_enable_primary': mock_enable}):
             assert hanamod.sr_primary_enabled(
@@ -525,15 +765,13 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
             {'file': 'file'}
         ]
 
-        mock_installed = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=False)
-        mock_state = MagicMock(side_effect=['DISABLED', 'PRIMARY'])
+        mock_status = MagicMock(return_value={'installed': True, 'running': False, 'sr_state': 'DISABLED'})
+        mock_state = MagicMock(return_value='PRIMARY')
         mock_start = MagicMock()
         mock_enable = MagicMock()
         mock_userkey = MagicMock()
         mock_backup = MagicMock()
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed,
-                                           'hana.is_running': mock_running,
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status,
                                            'hana.get_sr_state': mock_state,
                                            'hana.start': mock_start,
                                            'hana.sr_enable_primary': mock_enable,
@@ -569,6 +807,59 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                 inst='00',
                 password='pass')
 
+    def test_sr_primary_enabled_backup_tenants(self):
+        '''
+        Test to check sr_primary_enabled backing up the tenants concurrently
+        '''
+        name = 'SITE1'
+
+        backup = [
+            {'key_name': 'key'},
+            {'database': 'SYSTEMDB'},
+            {'file': 'file'},
+            {'tenants': ['PRD']},
+            {'channels': 4}
+        ]
+
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'DISABLED'})
+        mock_state = MagicMock(return_value='PRIMARY')
+        mock_enable = MagicMock()
+        mock_backup = MagicMock()
+        mock_set_ini = MagicMock()
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status,
+                                           'hana.get_sr_state': mock_state,
+                                           'hana.sr_enable_primary': mock_enable,
+                                           'hana.set_ini_parameter': mock_set_ini,
+                                           'hana.create_backup': mock_backup}):
+            assert hanamod.sr_primary_enabled(
+                name, 'pdr', '00', 'pass', backup=backup)['changes'] == {
+                    'primary': name, 'backup': 'file', 'backup_channels': 4}
+            mock_set_ini.assert_called_once_with(
+                ini_parameter_values=[{
+                    'section_name': 'backup',
+                    'parameter_name': 'parallel_data_backup_backint_channels',
+                    'parameter_value': 4}],
+                database='SYSTEMDB',
+                file_name='global.ini',
+                layer='SYSTEM',
+                reconfig=True,
+                key_name='key',
+                user_name=None,
+                user_password=None,
+                sid='pdr',
+                inst='00',
+                password='pass')
+            mock_backup.assert_called_once_with(
+                key_name='key',
+                user_name=None,
+                user_password=None,
+                database='SYSTEMDB',
+                backup_name='file',
+                sid='pdr',
+                inst='00',
+                password='pass',
+                tenants=['PRD'])
+
     def test_sr_primary_enabled_error(self):
         '''
         Test to check sr_primary_enabled when hana is already set as primary
@@ -581,14 +872,12 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': False,
                'comment': 'hana command error'}
 
-        mock_installed = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=False)
-        mock_state = MagicMock(side_effect=['DISABLED', 'PRIMARY'])
+        mock_status = MagicMock(return_value={'installed': True, 'running': False, 'sr_state': 'DISABLED'})
+        mock_state = MagicMock(return_value='PRIMARY')
         mock_start = MagicMock()
         mock_enable = MagicMock(
             side_effect=exceptions.CommandExecutionError('hana command error'))
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed,
-                                           'hana.is_running': mock_running,
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status,
                                            'hana.get_sr_state': mock_state,
                                            'hana.start': mock_start,
                                            'hana.sr_enable_primary': mock_enable}):
@@ -617,8 +906,8 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': False,
                'comment': 'HANA is not installed properly with the provided data'}
 
-        mock_installed = MagicMock(return_value=False)
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed}):
+        mock_status = MagicMock(return_value={'installed': False, 'running': False, 'sr_state': None})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
             assert hanamod.sr_secondary_registered(
                 name, 'pdr', '00', 'pass', 'hana01', '00', 'sync',
                 'logreplay') == ret
@@ -635,16 +924,11 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': True,
                'comment': 'HANA node already set as secondary and running'}
 
-        mock_installed = MagicMock(return_value=True)
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed}):
-            mock_running = MagicMock(return_value=True)
-            mock_state = MagicMock(return_value='SECONDARY')
-
-            with patch.dict(hanamod.__salt__, {'hana.is_running': mock_running,
-                                               'hana.get_sr_state': mock_state}):
-                assert hanamod.sr_secondary_registered(
-                    name, 'pdr', '00', 'pass', 'hana01', '00', 'sync',
-                    'logreplay') == ret
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'SECONDARY'})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
+            assert hanamod.sr_secondary_registered(
+                name, 'pdr', '00', 'pass', 'hana01', '00', 'sync',
+                'logreplay') == ret
 
     def test_sr_secondary_registered_test(self):
         '''
@@ -660,12 +944,8 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': None,
                'comment': '{} would be registered as a secondary node'.format(name)}
 
-        mock_installed = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=True)
-        mock_state = MagicMock(return_value='DISABLED')
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed,
-                                           'hana.is_running': mock_running,
-                                           'hana.get_sr_state': mock_state}):
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'DISABLED'})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
             with patch.dict(hanamod.__opts__, {'test': True}):
                 assert hanamod.sr_secondary_registered(
                     name, 'pdr', '00', 'pass', 'hana01', '00', 'sync',
@@ -685,14 +965,12 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': True,
                'comment': 'HANA node set as {}'.format('SECONDARY')}
 
-        mock_installed = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=True)
-        mock_state = MagicMock(side_effect=['DISABLED', 'SECONDARY'])
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'DISABLED'})
+        mock_state = MagicMock(return_value='SECONDARY')
         mock_stop = MagicMock()
         mock_start = MagicMock()
         mock_register = MagicMock()
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed,
-                                           'hana.is_running': mock_running,
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status,
                                            'hana.get_sr_state': mock_state,
                                            'hana.stop': mock_stop,
                                            'hana.start': mock_start,
@@ -734,14 +1012,10 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': False,
                'comment': 'hana command error'}
 
-        mock_installed = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=False)
-        mock_state = MagicMock(return_value='SECONDARY')
+        mock_status = MagicMock(return_value={'installed': True, 'running': False, 'sr_state': 'SECONDARY'})
         mock_register = MagicMock(
             side_effect=exceptions.CommandExecutionError('hana command error'))
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed,
-                                           'hana.is_running': mock_running,
-                                           'hana.get_sr_state': mock_state,
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status,
                                            'hana.sr_register_secondary': mock_register}):
             assert hanamod.sr_secondary_registered(
                 name, 'hana01', '00', 'sync',
@@ -772,8 +1046,8 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': False,
                'comment': 'HANA is not installed properly with the provided data'}
 
-        mock_installed = MagicMock(return_value=False)
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed}):
+        mock_status = MagicMock(return_value={'installed': False, 'running': False, 'sr_state': None})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
             assert hanamod.sr_clean(
                 'pdr', '00', 'pass', True) == ret
 
@@ -789,15 +1063,10 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': True,
                'comment': 'HANA node already clean'}
 
-        mock_installed = MagicMock(return_value=True)
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed}):
-            mock_running = MagicMock(return_value=True)
-            mock_state = MagicMock(return_value='DISABLED')
-
-            with patch.dict(hanamod.__salt__, {'hana.is_running': mock_running,
-                                               'hana.get_sr_state': mock_state}):
-                assert hanamod.sr_clean(
-                    'pdr', '00', 'pass', True) == ret
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'DISABLED'})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
+            assert hanamod.sr_clean(
+                'pdr', '00', 'pass', True) == ret
 
     def test_sr_clean_test(self):
         '''
@@ -813,12 +1082,8 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': None,
                'comment': '{} would be clean'.format(name)}
 
-        mock_installed = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=True)
-        mock_state = MagicMock(return_value='PRIMARY')
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed,
-                                           'hana.is_running': mock_running,
-                                           'hana.get_sr_state': mock_state}):
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'PRIMARY'})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
             with patch.dict(hanamod.__opts__, {'test': True}):
                 assert hanamod.sr_clean(
                     'pdr', '00', 'pass', True) == ret
@@ -837,13 +1102,11 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': True,
                'comment': 'HANA node set as {}'.format('DISABLED')}
 
-        mock_installed = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=True)
-        mock_state = MagicMock(side_effect=['PRIMARY', 'DISABLED'])
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'PRIMARY'})
+        mock_state = MagicMock(return_value='DISABLED')
         mock_stop = MagicMock()
         mock_clean = MagicMock()
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed,
-                                           'hana.is_running': mock_running,
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status,
                                            'hana.get_sr_state': mock_state,
                                            'hana.stop': mock_stop,
                                            'hana.sr_cleanup': mock_clean}):
@@ -871,15 +1134,11 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': False,
                'comment': 'hana command error'}
 
-        mock_insatlled = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=False)
         state = MagicMock()
-        mock_state = MagicMock(return_value=state)
+        mock_status = MagicMock(return_value={'installed': True, 'running': False, 'sr_state': state})
         mock_clean = MagicMock(
             side_effect=exceptions.CommandExecutionError('hana command error'))
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_insatlled,
-                                           'hana.is_running': mock_running,
-                                           'hana.get_sr_state': mock_state,
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status,
                                            'hana.sr_cleanup': mock_clean}):
             assert hanamod.sr_clean(
                 'pdr', '00', 'pass', True) == ret
@@ -902,8 +1161,8 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': False,
                'comment': 'HANA is not installed properly with the provided data'}
 
-        mock_installed = MagicMock(return_value=False)
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed}):
+        mock_status = MagicMock(return_value={'installed': False, 'running': False, 'sr_state': None})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
             assert hanamod.memory_resources_updated(
                 name=name, sid='prd', inst='00', password='pass',
                 global_allocation_limit='25000', preload_column_tables=False,
@@ -925,16 +1184,144 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'comment': 'Memory resources would be updated on {}-{}'.format(
                    name, 'prd')}
 
-        mock_installed = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=True)
-        with patch.dict(hanamod.__salt__, {'hana.is_installed': mock_installed,
-                                           'hana.is_running': mock_running}):
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'PRIMARY'})
+        mock_get_ini = MagicMock(return_value={'memorymanager': {'global_allocation_limit': '0'}})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status,
+                                           'hana.get_ini_parameters': mock_get_ini}):
+            with patch.dict(hanamod.__opts__, {'test': True}):
+                assert hanamod.memory_resources_updated(
+                    name=name, sid='prd', inst='00', password='pass',
+                    global_allocation_limit='25000', preload_column_tables=False,
+                    user_name='key_user', user_password='key_password') == ret
+
+    def test_memory_resources_updated_test_unchanged(self):
+        '''
+        Test to check memory_resources_updated in test mode when the values are already set
+        '''
+        name = 'prd'
+
+        ret = {'name': name,
+               'changes': {},
+               'result': True,
+               'comment': 'Memory resources are already updated on prd-prd'}
+
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'PRIMARY'})
+        mock_get_ini = MagicMock(return_value={
+            'memorymanager': {'global_allocation_limit': '25000'},
+            'system_replication': {'preload_column_tables': 'false'}})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status,
+                                           'hana.get_ini_parameters': mock_get_ini}):
             with patch.dict(hanamod.__opts__, {'test': True}):
                 assert hanamod.memory_resources_updated(
                     name=name, sid='prd', inst='00', password='pass',
                     global_allocation_limit='25000', preload_column_tables=False,
                     user_name='key_user', user_password='key_password') == ret
 
+        mock_get_ini.assert_called_once_with(
+            host='prd', port='30013', user='key_user', password='key_password',
+            file_name='global.ini', layer='SYSTEM',
+            sections=['system_replication', 'memorymanager'])
+
+    def test_memory_resources_updated_unchanged(self):
+        '''
+        Test to check memory_resources_updated when the values are already set
+        '''
+        name = 'prd'
+
+        ret = {'name': name,
+               'changes': {},
+               'result': True,
+               'comment': 'Memory resources are already updated on prd-prd'}
+
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'PRIMARY'})
+        mock_get_ini = MagicMock(return_value={
+            'memorymanager': {'global_allocation_limit': '25000'},
+            'system_replication': {'preload_column_tables': 'FALSE'}})
+        mock_set_ini_parameter = MagicMock()
+        mock_stop = MagicMock()
+        with patch.dict(hanamod.__salt__,
+                        {'hana.status_snapshot': mock_status,
+                         'hana.get_ini_parameters': mock_get_ini,
+                         'hana.set_ini_parameter': mock_set_ini_parameter,
+                         'hana.stop': mock_stop}):
+            assert hanamod.memory_resources_updated(
+                    name=name, sid='prd', inst='00', password='pass',
+                    global_allocation_limit=25000, preload_column_tables=False,
+                    user_name='key_user', user_password='key_password',
+                    sql_port='30113') == ret
+
+        mock_get_ini.assert_called_once_with(
+            host='prd', port='30113', user='key_user', password='key_password',
+            file_name='global.ini', layer='SYSTEM',
+            sections=['system_replication', 'memorymanager'])
+        mock_set_ini_parameter.assert_not_called()
+        mock_stop.assert_not_called()
+
+    def test_memory_resources_updated_no_restart(self):
+        '''
+        Test to check memory_resources_updated when only preload_column_tables changes
+        '''
+        name = 'prd'
+
+        ret = {'name': name,
+               'changes': {
+                   'sid': 'prd',
+                   'preload_column_tables': True
+               },
+               'result': True,
+               'comment': 'Memory resources updated on prd-prd'}
+
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'PRIMARY'})
+        mock_get_ini = MagicMock(return_value={
+            'memorymanager': {'global_allocation_limit': '25000'},
+            'system_replication': {'preload_column_tables': 'false'}})
+        mock_set_ini_parameter = MagicMock()
+        mock_stop = MagicMock()
+        mock_start = MagicMock()
+        with patch.dict(hanamod.__salt__,
+                        {'hana.status_snapshot': mock_status,
+                         'hana.get_ini_parameters': mock_get_ini,
+                         'hana.set_ini_parameter': mock_set_ini_parameter,
+                         'hana.stop': mock_stop,
+                         'hana.start': mock_start}):
+            assert hanamod.memory_resources_updated(
+                    name=name, sid='prd', inst='00', password='pass',
+                    global_allocation_limit='25000', preload_column_tables=True,
+                    user_name='key_user', user_password='key_password') == ret
+
+        mock_set_ini_parameter.assert_called_once_with(
+            ini_parameter_values=[{'section_name': 'system_replication',
+                                   'parameter_name': 'preload_column_tables',
+                                   'parameter_value': True}],
+            database='SYSTEMDB',
+            file_name='global.ini',
+            layer='SYSTEM',
+            layer_name=None,
+            reconfig=True,
+            user_name='key_user',
+            user_password='key_password',
+            sid='prd',
+            inst='00',
+            password='pass')
+        mock_stop.assert_not_called()
+        mock_start.assert_not_called()
+
+    def test_ini_parameters_diff(self):
+        ini_parameter_values = [
+            {'section_name': 'memorymanager', 'parameter_name': 'global_allocation_limit',
+             'parameter_value': 25000},
+            {'section_name': 'system_replication', 'parameter_name': 'preload_column_tables',
+             'parameter_value': True},
+            {'section_name': 'persistence', 'parameter_name': 'log_mode',
+             'parameter_value': 'normal'}]
+        current_values = {
+            'memorymanager': {'global_allocation_limit': '25000'},
+            'system_replication': {'preload_column_tables': 'false'}}
+
+        assert hanamod._ini_parameters_diff(ini_parameter_values, current_values) == {
+            'system_replication/preload_column_tables': {'old': 'false', 'new': True},
+            'persistence/log_mode': {'old': None, 'new': 'normal'}}
+
     def test_memory_resources_updated_basic(self):
         '''
         Test to check memory_resources_updated with basic setup
@@ -945,13 +1332,15 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'changes': {
                    'sid': 'prd',
                    'global_allocation_limit': '25000',
-                   'preload_column_tables': False
+                   'preload_column_tables': False,
+                   'restarted': True
                },
                'result': True,
                'comment': 'Memory resources updated on {}-{}'.format(name, 'prd')}
 
-        mock_installed = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=True)
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': 'PRIMARY'})
+        mock_get_ini = MagicMock(
+            side_effect=exceptions.CommandExecutionError('hdbcli not available'))
         mock_stop = MagicMock()
         mock_start = MagicMock()
         mock_set_ini_parameter = MagicMock()
@@ -963,15 +1352,15 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                                  'parameter_value': '25000'}]
 
         with patch.dict(hanamod.__salt__,
-                        {'hana.is_installed': mock_installed,
-                         'hana.is_running': mock_running,
+                        {'hana.status_snapshot': mock_status,
+                         'hana.get_ini_parameters': mock_get_ini,
                          'hana.set_ini_parameter': mock_set_ini_parameter,
                          'hana.stop': mock_stop,
                          'hana.start': mock_start}):
             assert hanamod.memory_resources_updated(
                     name=name, sid='prd', inst='00', password='pass',
                     global_allocation_limit='25000', preload_column_tables=False,
-                    user_name='key_user', user_password='key_password') == ret
+                    user_name='key_user', user_password='key_password', restart=True) == ret
             mock_stop.assert_called_once_with(
                 sid='prd',
                 inst='00',
@@ -1004,8 +1393,8 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                'result': False,
                'comment': 'hana command error'}
 
-        mock_installed = MagicMock(return_value=True)
-        mock_running = MagicMock(return_value=False)
+        mock_status = MagicMock(return_value={'installed': True, 'running': False, 'sr_state': 'PRIMARY'})
+        mock_get_ini = MagicMock(return_value={})
         mock_stop = MagicMock()
         mock_start = MagicMock()
         mock_set_ini_parameter = MagicMock(
@@ -1018,8 +1407,8 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                                  'parameter_value': '25000'}]
 
         with patch.dict(hanamod.__salt__,
-                        {'hana.is_installed': mock_installed,
-                         'hana.is_running': mock_running,
+                        {'hana.status_snapshot': mock_status,
+                         'hana.get_ini_parameters': mock_get_ini,
                          'hana.set_ini_parameter': mock_set_ini_parameter,
                          'hana.stop': mock_stop,
                          'hana.start': mock_start}):
@@ -1040,19 +1429,340 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
                 inst='00',
                 password='pass')
 
+    # 'ini_parameters_present' function tests
+
+    def _ini_parameters_present(self, mock_salt, **kwargs):
+        ini_parameters = {
+            'global.ini': {
+                'memorymanager': {'global_allocation_limit': 25000},
+                'system_replication': {'preload_column_tables': False}},
+            'indexserver.ini': {'sql': {'plan_cache_size': 2048}}
+        }
+        mock_salt.setdefault('hana.status_snapshot', MagicMock(
+            return_value={'installed': True, 'running': True, 'sr_state': 'PRIMARY'}))
+        with patch.dict(hanamod.__salt__, mock_salt):
+            return hanamod.ini_parameters_present(
+                'hana01', ini_parameters, user_name='SYSTEM', user_password='pass',
+                sid='prd', inst='00', password='pass', **kwargs)
+
+    def test_ini_parameters_present_not_running(self):
+        ret = {'name': 'hana01',
+               'changes': {},
+               'result': False,
+               'comment': 'HANA must be running to update the ini parameters'}
+        mock_status = MagicMock(
+            return_value={'installed': True, 'running': False, 'sr_state': None})
+        assert self._ini_parameters_present({'hana.status_snapshot': mock_status}) == ret
+
+        ret['comment'] = 'HANA is not installed properly with the provided data'
+        mock_status.return_value = {'installed': False, 'running': False, 'sr_state': None}
+        assert self._ini_parameters_present({'hana.status_snapshot': mock_status}) == ret
+
+    def test_ini_parameters_present_read_error(self):
+        ret = {'name': 'hana01',
+               'changes': {},
+               'result': False,
+               'comment': 'cannot read'}
+        mock_get_ini = MagicMock(side_effect=exceptions.CommandExecutionError('cannot read'))
+        assert self._ini_parameters_present({'hana.get_ini_parameters': mock_get_ini}) == ret
+
+    def test_ini_parameters_present_unchanged(self):
+        ret = {'name': 'hana01',
+               'changes': {},
+               'result': True,
+               'comment': 'HANA ini parameters are already set'}
+        mock_get_ini = MagicMock(return_value={
+            'global.ini': {
+                'memorymanager': {'global_allocation_limit': '25000'},
+                'system_replication': {'preload_column_tables': 'false'}},
+            'indexserver.ini': {'sql': {'plan_cache_size': '2048'}}})
+        mock_set_ini = MagicMock()
+        assert self._ini_parameters_present({
+            'hana.get_ini_parameters': mock_get_ini,
+            'hana.set_ini_parameter': mock_set_ini}, layer='HOST', layer_name='hana01',
+            sql_port='30113') == ret
+
+        mock_get_ini.assert_called_once_with(
+            host='hana01', port='30113', user='SYSTEM', password='pass',
+            file_name=['global.ini', 'indexserver.ini'], layer='HOST', layer_name='hana01')
+        mock_set_ini.assert_not_called()
+
+    def test_ini_parameters_present_test(self):
+        ret = {'name': 'hana01',
+               'changes': {
+                   'global.ini/memorymanager/global_allocation_limit': {
+                       'old': '0', 'new': 25000},
+                   'indexserver.ini/sql/plan_cache_size': {'old': None, 'new': 2048}},
+               'result': None,
+               'comment': '2 HANA ini parameters would be changed'}
+        mock_get_ini = MagicMock(return_value={
+            'global.ini': {
+                'memorymanager': {'global_allocation_limit': '0'},
+                'system_replication': {'preload_column_tables': 'false'}}})
+        mock_set_ini = MagicMock()
+        with patch.dict(hanamod.__opts__, {'test': True}):
+            assert self._ini_parameters_present({
+                'hana.get_ini_parameters': mock_get_ini,
+                'hana.set_ini_parameter': mock_set_ini}) == ret
+        mock_set_ini.assert_not_called()
+
+    def test_ini_parameters_present(self):
+        ret = {'name': 'hana01',
+               'changes': {
+                   'global.ini/memorymanager/global_allocation_limit': {
+                       'old': '0', 'new': 25000},
+                   'indexserver.ini/sql/plan_cache_size': {'old': None, 'new': 2048}},
+               'result': True,
+               'comment': '2 HANA ini parameters changed'}
+        mock_get_ini = MagicMock(return_value={
+            'global.ini': {
+                'memorymanager': {'global_allocation_limit': '0'},
+                'system_replication': {'preload_column_tables': 'false'}}})
+        mock_set_ini = MagicMock()
+        assert self._ini_parameters_present({
+            'hana.get_ini_parameters': mock_get_ini,
+            'hana.set_ini_parameter': mock_set_ini}, reconfig=False) == ret
+
+        mock_set_ini.assert_has_calls([
+            mock.call(
+                ini_parameter_values=[{
+                    'section_name': 'memorymanager',
+                    'parameter_name': 'global_allocation_limit',
+                    'parameter_value': 25000}],
+                database='SYSTEMDB', file_name='global.ini', layer='SYSTEM', layer_name=None,
+                reconfig=False, user_name='SYSTEM', user_password='pass', sid='prd',
+                inst='00', password='pass'),
+            mock.call(
+                ini_parameter_values=[{
+                    'section_name': 'sql',
+                    'parameter_name': 'plan_cache_size',
+                    'parameter_value': 2048}],
+                database='SYSTEMDB', file_name='indexserver.ini', layer='SYSTEM',
+                layer_name=None, reconfig=False, user_name='SYSTEM', user_password='pass',
+                sid='prd', inst='00', password='pass')
+        ])
+
+    def test_ini_parameters_present_error(self):
+        ret = {'name': 'hana01',
+               'changes': {
+                   'global.ini/memorymanager/global_allocation_limit': {
+                       'old': '0', 'new': 25000}},
+               'result': False,
+               'comment': 'set error'}
+        mock_get_ini = MagicMock(return_value={
+            'global.ini': {
+                'memorymanager': {'global_allocation_limit': '0'},
+                'system_replication': {'preload_column_tables': 'false'}}})
+        mock_set_ini = MagicMock(
+            side_effect=[None, exceptions.CommandExecutionError('set error')])
+        assert self._ini_parameters_present({
+            'hana.get_ini_parameters': mock_get_ini,
+            'hana.set_ini_parameter': mock_set_ini}) == ret
+
+    # 'preloaded' function tests
+
+    def test_preloaded_test(self):
+        ret = {'name': 'hana01',
+               'changes': {},
+               'result': None,
+               'comment': 'Column tables preload would be checked on hana01:30015'}
+        with patch.dict(hanamod.__opts__, {'test': True}):
+            assert hanamod.preloaded('hana01', 30015, 'SYSTEM', 'pass') == ret
+
+    def test_preloaded_error(self):
+        ret = {'name': 'hana01',
+               'changes': {},
+               'result': False,
+               'comment': 'timeout'}
+        mock_wait = MagicMock(side_effect=exceptions.CommandExecutionError('timeout'))
+        with patch.dict(hanamod.__salt__, {'hana.wait_for_preload': mock_wait}):
+            assert hanamod.preloaded('hana01', 30015, 'SYSTEM', 'pass') == ret
+
+    def test_preloaded(self):
+        ret = {'name': 'hana01',
+               'changes': {'loaded': ['S1.T1']},
+               'result': True,
+               'comment': 'Column tables preload completed on hana01:30015: 100.0% loaded '
+                          '(1/1) in 12.5 seconds, 2048 bytes/s'}
+        mock_wait = MagicMock(return_value={
+            'loaded': 1, 'total': 1, 'percentage': 100.0, 'elapsed': 12.46,
+            'throughput': 2048})
+        with patch.dict(hanamod.__salt__, {'hana.wait_for_preload': mock_wait}):
+            assert hanamod.preloaded(
+                'hana01', 30015, 'SYSTEM', 'pass', tables=['S1.T1'], load=True,
+                timeout=100) == ret
+        mock_wait.assert_called_once_with(
+            host='hana01', port=30015, user='SYSTEM', password='pass', tables=['S1.T1'],
+            load=True, threshold=100, timeout=100, interval=5, max_interval=60)
+
+    # 'sr_wait_synced' function tests
+
+    def test_sr_wait_synced_test(self):
+        ret = {'name': 'hana01',
+               'changes': {},
+               'result': None,
+               'comment': 'System replication synchronization would be checked on '
+                          'hana01:30013'}
+        with patch.dict(hanamod.__opts__, {'test': True}):
+            assert hanamod.sr_wait_synced('hana01', 30013, 'SYSTEM', 'pass') == ret
+
+    def test_sr_wait_synced_error(self):
+        ret = {'name': 'hana01',
+               'changes': {},
+               'result': False,
+               'comment': 'timeout'}
+        mock_wait = MagicMock(side_effect=exceptions.CommandExecutionError('timeout'))
+        with patch.dict(hanamod.__salt__, {'hana.wait_for_sr_sync': mock_wait}):
+            assert hanamod.sr_wait_synced('hana01', 30013, 'SYSTEM', 'pass') == ret
+
+    def test_sr_wait_synced(self):
+        ret = {'name': 'hana01',
+               'changes': {},
+               'result': True,
+               'comment': 'System replication synchronized on hana01:30013: 3 services '
+                          'active, 1000 bytes shipped in 20.0 seconds (50 bytes/s)'}
+        mock_wait = MagicMock(return_value={
+            'total': 3, 'shipped_bytes': 1000, 'elapsed': 20, 'throughput': 50})
+        with patch.dict(hanamod.__salt__, {'hana.wait_for_sr_sync': mock_wait}):
+            assert hanamod.sr_wait_synced(
+                'hana01', 30013, 'SYSTEM', 'pass', secondary='hana02', timeout=60) == ret
+        mock_wait.assert_called_once_with(
+            host='hana01', port=30013, user='SYSTEM', password='pass', secondary='hana02',
+            timeout=60, interval=10, max_interval=300)
+
+    # 'instances_started' and 'instances_stopped' functions tests
+
+    def test_instances_started_invalid(self):
+        ret = {'name': 'hana-instances',
+               'changes': {},
+               'result': False,
+               'comment': 'instances must be a list of dictionaries with sid, inst and '
+                          'optionally password values'}
+        assert hanamod.instances_started('hana-instances', ['prd']) == ret
+
+    def test_instances_started_not_installed(self):
+        ret = {'name': 'hana-instances',
+               'changes': {},
+               'result': False,
+               'comment': 'HANA qas-01 is not installed properly with the provided data'}
+        mock_status = MagicMock(side_effect=[
+            {'installed': True, 'running': False, 'sr_state': None},
+            {'installed': False, 'running': False, 'sr_state': None}])
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
+            assert hanamod.instances_started(
+                'hana-instances', [{'sid': 'prd', 'inst': '00'}, {'sid': 'qas', 'inst': '01'}],
+                password='pass') == ret
+
+    def test_instances_started_already(self):
+        ret = {'name': 'hana-instances',
+               'changes': {},
+               'result': True,
+               'comment': 'HANA instances are already started'}
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': None})
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
+            assert hanamod.instances_started(
+                'hana-instances', [{'sid': 'prd', 'inst': '00', 'password': 'prd'}],
+                password='pass') == ret
+        mock_status.assert_called_once_with(sid='prd', inst='00', password='prd')
+
+    def test_instances_started_test(self):
+        ret = {'name': 'hana-instances',
+               'changes': {'qas-01': 'started'},
+               'result': None,
+               'comment': 'HANA instances would be started'}
+        mock_status = MagicMock(side_effect=[
+            {'installed': True, 'running': True, 'sr_state': None},
+            {'installed': True, 'running': False, 'sr_state': None}])
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status}):
+            with patch.dict(hanamod.__opts__, {'test': True}):
+                assert hanamod.instances_started(
+                    'hana-instances',
+                    [{'sid': 'prd', 'inst': '00'}, {'sid': 'qas', 'inst': '01'}],
+                    password='pass') == ret
+
+    def test_instances_started(self):
+        ret = {'name': 'hana-instances',
+               'changes': {'prd-00': 'started', 'qas-01': 'started'},
+               'result': True,
+               'comment': 'HANA instances started: prd-00 (300.0s), qas-01 (250.5s)'}
+        mock_status = MagicMock(return_value={'installed': True, 'running': False, 'sr_state': None})
+        mock_start_many = MagicMock(return_value={
+            'prd-00': {'result': True, 'duration': 300},
+            'qas-01': {'result': True, 'duration': 250.5}})
+        instances = [{'sid': 'prd', 'inst': '00'}, {'sid': 'qas', 'inst': '01'}]
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status,
+                                           'hana.start_many': mock_start_many}):
+            assert hanamod.instances_started(
+                'hana-instances', instances, password='pass', parallel=2) == ret
+        mock_start_many.assert_called_once_with(
+            instances=instances, password='pass', parallel=2)
+
+    def test_instances_stopped_error(self):
+        ret = {'name': 'hana-instances',
+               'changes': {'prd-00': 'stopped'},
+               'result': False,
+               'comment': 'HANA instances not stopped: qas-01: stop error'}
+        mock_status = MagicMock(return_value={'installed': True, 'running': True, 'sr_state': None})
+        mock_stop_many = MagicMock(return_value={
+            'prd-00': {'result': True, 'duration': 30},
+            'qas-01': {'result': False, 'duration': 10, 'comment': 'stop error'}})
+        instances = [{'sid': 'prd', 'inst': '00'}, {'sid': 'qas', 'inst': '01'}]
+        with patch.dict(hanamod.__salt__, {'hana.status_snapshot': mock_status,
+                                           'hana.stop_many': mock_stop_many}):
+            assert hanamod.instances_stopped('hana-instances', instances) == ret
+        mock_stop_many.assert_called_once_with(
+            instances=instances, password=None, parallel=None)
+
     def test_pydbapi_extracted_already_exists(self):
         ret = {'name': 'PYDBAPI.tar',
                'changes': {},
                'result': True,
-               'comment': '/tmp/output already exists. Skipping extraction (set force to True to force the extraction)'}
+               'comment': '/tmp/output is already extracted from the current archive. Skipping extraction (set force to True to force the extraction)'}
 
         mock_dir_exists = MagicMock(return_value=True)
+        mock_is_extracted = MagicMock(return_value=True)
 
-        with patch.dict(hanamod.__salt__, {'file.directory_exists': mock_dir_exists}):
+        with patch.dict(hanamod.__salt__, {'file.directory_exists': mock_dir_exists,
+                                           'hana.is_pydbapi_extracted': mock_is_extracted}):
             assert hanamod.pydbapi_extracted(
                 'PYDBAPI.tar', ['1234', '5678'], '/tmp/output') == ret
 
         mock_dir_exists.assert_called_once_with('/tmp/output')
+        mock_is_extracted.assert_called_once_with(
+            'PYDBAPI.tar', ['1234', '5678'], '/tmp/output', '20')
+
+    def test_pydbapi_extracted_archive_changed(self):
+        ret = {'name': 'PYDBAPI.tar',
+               'changes': {'pydbapi': 'py_client', 'output_dir': '/tmp/output'},
+               'result': True,
+               'comment': 'py_client correctly extracted'}
+
+        mock_is_extracted = MagicMock(return_value=False)
+        mock_extract_pydbapi = MagicMock(return_value='py_client')
+
+        with patch.dict(hanamod.__salt__, {'file.directory_exists': MagicMock(return_value=True),
+                                           'hana.is_pydbapi_extracted': mock_is_extracted,
+                                           'file.mkdir': MagicMock(),
+                                           'hana.extract_pydbapi': mock_extract_pydbapi}):
+            assert hanamod.pydbapi_extracted(
+                'PYDBAPI.tar', ['1234', '5678'], '/tmp/output') == ret
+
+        mock_extract_pydbapi.assert_called_once_with(
+            'PYDBAPI.tar', ['1234', '5678'], '/tmp/output', '20', None)
+
+    def test_pydbapi_extracted_check_error(self):
+        ret = {'name': 'PYDBAPI.tar',
+               'changes': {},
+               'result': False,
+               'comment': 'HANA client not found'}
+
+        mock_is_extracted = MagicMock(
+            side_effect=exceptions.CommandExecutionError('HANA client not found'))
+
+        with patch.dict(hanamod.__salt__, {'file.directory_exists': MagicMock(return_value=True),
+                                           'hana.is_pydbapi_extracted': mock_is_extracted}):
+            assert hanamod.pydbapi_extracted(
+                'PYDBAPI.tar', ['1234', '5678'], '/tmp/output') == ret
 
     def test_pydbapi_extracted_test(self):
         ret = {'name': 'PYDBAPI.tar',
@@ -1102,3 +1812,40 @@ class HanamodTestCase(TestCase, LoaderModuleMockMixin):
         mock_mkdir.assert_called_once_with('/tmp/output')
         mock_extract_pydbapi.assert_called_once_with(
             'PYDBAPI.tar', ['1234', '5678'], '/tmp/output', '20', '-l')
+
+    def test_pydbapi_extracted_native(self):
+        ret = {'name': 'PYDBAPI.tar',
+               'changes': {'pydbapi': 'py_client', 'output_dir': '/tmp/output'},
+               'result': True,
+               'comment': 'py_client correctly extracted (2 files, 1 unchanged files skipped, '
+                          '100 bytes/s)'}
+
+        mock_mkdir = MagicMock()
+        mock_extract_pydbapi = MagicMock(return_value={
+            'pydbapi': 'py_client', 'extracted': ['a', 'b'], 'skipped': ['c'],
+            'bytes_per_second': 100})
+
+        with patch.dict(hanamod.__salt__, {'file.mkdir': mock_mkdir,
+                                           'hana.extract_pydbapi': mock_extract_pydbapi}):
+            assert hanamod.pydbapi_extracted(
+                'PYDBAPI.tar', ['1234', '5678'], '/tmp/output',
+                force=True, native=True, members=['hdbcli*']) == ret
+
+        mock_extract_pydbapi.assert_called_once_with(
+            'PYDBAPI.tar', ['1234', '5678'], '/tmp/output', '20',
+            native=True, members=['hdbcli*'], details=True)
+
+    def test_pydbapi_extracted_native_unchanged(self):
+        ret = {'name': 'PYDBAPI.tar',
+               'changes': {},
+               'result': True,
+               'comment': 'py_client already extracted in /tmp/output'}
+
+        mock_extract_pydbapi = MagicMock(return_value={
+            'pydbapi': 'py_client', 'extracted': [], 'skipped': ['a', 'b'],
+            'bytes_per_second': 0})
+
+        with patch.dict(hanamod.__salt__, {'file.mkdir': MagicMock(),
+                                           'hana.extract_pydbapi': mock_extract_pydbapi}):
+            assert hanamod.pydbapi_extracted(
+                'PYDBAPI.tar', ['1234', '5678'], '/tmp/output', force=True, native=True) == ret